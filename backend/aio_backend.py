@@ -0,0 +1,264 @@
+import asyncio
+from typing import AsyncIterator, Dict, List
+import kubernetes as k8s
+import k8s_config, app_mode_backend as amb, errors_backend as eb
+from aio_k8s_api import get, gather, list_all, list_pages, run
+from k8s_api import PAGE_SIZE
+from ownership import OwnershipResolver
+from cluster_mode_backend import V1Namespace, V1Deployment, V1Service, V1StatefulSet, V1DaemonSet, V1ReplicaSet, V1Pod
+
+# Async versions of the list functions of cluster_mode_backend, app_mode_backend, errors_backend and metrics,
+# going through aio_k8s_api's pooled connections instead of one python k8s client (and thread) per request,
+# so that callers can have thousands of requests in flight with asyncio.gather().
+# From synchronous code, use run(), e.g. run(cluster_pods("my-cluster")) or run(gather(cluster_pods("a"), cluster_pods("b"))).
+#
+# Note: call k8s_config.update_available_clusters() before use!
+
+async def cluster_namespaces(cluster_name: str, raw: bool = False) -> List[V1Namespace]:
+	"""
+	Returns all the Namespaces that exist under the given cluster.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts
+	:return: (List[V1Namespace]) list of namespace objects
+	"""
+	return await list_all(cluster_name, "/api/v1/namespaces", None if raw else "V1NamespaceList")
+
+async def namespace_deployments(namespace: str, cluster_name: str) -> List[V1Deployment]:
+	"""
+	Returns the Deployments that exist under the given cluster and namespace.
+
+	:param (str) namespace
+	:param (str) cluster_name: cluster that the namespace of interest is in
+	:return: (List[V1Deployment]) list of deployment objects
+	"""
+	return await list_all(cluster_name, "/apis/apps/v1/namespaces/{}/deployments".format(namespace), "V1DeploymentList")
+
+async def namespace_services(namespace: str, cluster_name: str) -> List[V1Service]:
+	"""
+	Returns the Services that exist under the given cluster and namespace.
+
+	:param (str) namespace
+	:param (str) cluster_name: cluster that the namespace of interest is in
+	:return: (List[V1Service]) list of service objects
+	"""
+	return await list_all(cluster_name, "/api/v1/namespaces/{}/services".format(namespace), "V1ServiceList")
+
+async def namespace_stateful_sets(namespace: str, cluster_name: str) -> List[V1StatefulSet]:
+	"""
+	Returns the Stateful Sets that exist under the given cluster and namespace.
+
+	:param (str) namespace
+	:param (str) cluster_name: cluster that the namespace of interest is in
+	:return: (List[V1StatefulSet]) list of stateful set objects
+	"""
+	return await list_all(cluster_name, "/apis/apps/v1/namespaces/{}/statefulsets".format(namespace), "V1StatefulSetList")
+
+async def namespace_daemon_sets(namespace: str, cluster_name: str) -> List[V1DaemonSet]:
+	"""
+	Returns the Daemon Sets that exist under the given cluster and namespace.
+
+	:param (str) namespace
+	:param (str) cluster_name: cluster that the namespace of interest is in
+	:return: (List[V1DaemonSet]) list of daemon set objects
+	"""
+	return await list_all(cluster_name, "/apis/apps/v1/namespaces/{}/daemonsets".format(namespace), "V1DaemonSetList")
+
+async def cluster_deployments(cluster_name: str, raw: bool = False) -> List[V1Deployment]:
+	"""
+	Returns the Deployments in every namespace of the given cluster.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts
+	:return: (List[V1Deployment]) list of deployment objects
+	"""
+	return await list_all(cluster_name, "/apis/apps/v1/deployments", None if raw else "V1DeploymentList")
+
+async def cluster_services(cluster_name: str, raw: bool = False) -> List[V1Service]:
+	"""
+	Returns the Services in every namespace of the given cluster.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts
+	:return: (List[V1Service]) list of service objects
+	"""
+	return await list_all(cluster_name, "/api/v1/services", None if raw else "V1ServiceList")
+
+async def cluster_stateful_sets(cluster_name: str, raw: bool = False) -> List[V1StatefulSet]:
+	"""
+	Returns the Stateful Sets in every namespace of the given cluster.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts
+	:return: (List[V1StatefulSet]) list of stateful set objects
+	"""
+	return await list_all(cluster_name, "/apis/apps/v1/statefulsets", None if raw else "V1StatefulSetList")
+
+async def cluster_daemon_sets(cluster_name: str, raw: bool = False) -> List[V1DaemonSet]:
+	"""
+	Returns the Daemon Sets in every namespace of the given cluster.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts
+	:return: (List[V1DaemonSet]) list of daemon set objects
+	"""
+	return await list_all(cluster_name, "/apis/apps/v1/daemonsets", None if raw else "V1DaemonSetList")
+
+async def cluster_replica_sets(cluster_name: str, raw: bool = False) -> List[V1ReplicaSet]:
+	"""
+	Returns the Replica Sets in every namespace of the given cluster.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts
+	:return: (List[V1ReplicaSet]) list of replica set objects
+	"""
+	return await list_all(cluster_name, "/apis/apps/v1/replicasets", None if raw else "V1ReplicaSetList")
+
+async def cluster_pods(cluster_name: str, raw: bool = False) -> List[V1Pod]:
+	"""
+	Returns the Pods in every namespace of the given cluster.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts
+	:return: (List[V1Pod]) list of pod objects
+	"""
+	return await list_all(cluster_name, "/api/v1/pods", None if raw else "V1PodList")
+
+def cluster_pod_pages(cluster_name: str, page_size: int = PAGE_SIZE, raw: bool = False) -> AsyncIterator[List[V1Pod]]:
+	"""
+	Yields the Pods in every namespace of the given cluster one page at a time.
+
+	:param (str) cluster_name
+	:param (int) page_size: most pods per page
+	:param (bool) raw: return the pods as the api serves them, as dicts
+	:return: (AsyncIterator[List[V1Pod]]) pages of pod objects
+	"""
+	return list_pages(cluster_name, "/api/v1/pods", None if raw else "V1PodList", page_size)
+
+async def owned_pods(owner_uid: str, namespace: str, cluster_name: str) -> List[V1Pod]:
+	"""
+	Returns the Pods that belong to the Deployment, Daemon Set or Stateful Set with the given uid,
+	listing the namespace's replica sets and pods at the same time.
+
+	:param (str) owner_uid: k8s uid of the owning workload
+	:param (str) namespace: namespace the owning workload is in
+	:param (str) cluster_name: cluster that the namespace of interest is in
+	:return: (List[V1Pod]) list of pod objects
+	"""
+	rsets, pods = await asyncio.gather(
+		list_all(cluster_name, "/apis/apps/v1/namespaces/{}/replicasets".format(namespace), "V1ReplicaSetList"),
+		list_all(cluster_name, "/api/v1/namespaces/{}/pods".format(namespace), "V1PodList"))
+	resolver = OwnershipResolver(rsets)
+	owned = []
+	for pod in pods:
+		owner = resolver.workload_owner(pod)
+		if owner is not None and owner[1] == owner_uid:
+			owned.append(pod)
+	return owned
+
+async def service_pods(svc_name: str, namespace: str, cluster_name: str) -> List[V1Pod]:
+	"""
+	Returns the Pods that exist under the given cluster and namespace, and are selected by the given service.
+
+	:param (str) namespace
+	:param (str) cluster_name: cluster that the namespace of interest is in
+	:param (str) svc_name: name of service of interest
+	:return: (List[V1Pod]) list of pod objects
+	"""
+	svc = await get(cluster_name, "/api/v1/namespaces/{}/services/{}".format(namespace, svc_name), model="V1Service")
+	selector_labels = svc.spec.selector # dict
+	if selector_labels == None:
+		return []
+	selector_str = ",".join([ key + "=" + val for key,val in selector_labels.items() ])
+	return await list_all(cluster_name, "/api/v1/namespaces/{}/pods".format(namespace), "V1PodList", labelSelector=selector_str)
+
+async def custom_objects(cluster_name: str, group: str, version: str, plural: str) -> List[Dict]:
+	"""
+	Returns the custom objects of a kind in every namespace of the given cluster, with the cluster name
+	inserted into their metadata, or an empty list if the cluster doesn't have the kind.
+
+	:param (str) cluster_name
+	:param (str) group: the custom resource's group name
+	:param (str) version: the custom resource's version
+	:param (str) plural: the custom resource's plural name
+	:return: (List[Dict]) list of dicts, where each dict represents a custom object
+	"""
+	try:
+		objects = await list_all(cluster_name, "/apis/{}/{}/{}".format(group, version, plural))
+	except k8s.client.rest.ApiException:
+		return []
+	for obj in objects:
+		obj["metadata"]["cluster_name"] = cluster_name
+	return objects
+
+async def cluster_applications(cluster_name: str) -> List[Dict]:
+	"""
+	Returns all the applications that belong to the given cluster.
+
+	:param (str) cluster_name
+	:return: (List[Dict]) list of dicts, where each dict represents an Application
+	"""
+	return await custom_objects(cluster_name, amb.APP_CRD_GROUP, amb.APP_CRD_VERSION, amb.APP_CRD_PLURAL)
+
+async def cluster_deployables(cluster_name: str) -> List[Dict]:
+	"""
+	Returns a list of all the Deployables that belong to the given cluster.
+
+	:param (str) cluster_name
+	:return: (List[Dict]) list of dicts, where each dict represents a Deployable
+	"""
+	return await custom_objects(cluster_name, amb.DPB_CRD_GROUP, amb.DPB_CRD_VERSION, amb.DPB_CRD_PLURAL)
+
+async def application_deployables(cluster_name: str, namespace: str, app_name: str) -> List[Dict]:
+	"""
+	Returns the Deployables that belong to the specified Application, listing the Deployables of every
+	cluster at the same time.
+
+	:param (str) cluster_name: name of cluster where the Application resides
+	:param (str) namespace: namespace where the Application resides
+	:param (str) app_name
+	:return: (List[str]) list of dicts, where each dict represents a Deployable
+	"""
+	path = "/apis/{}/{}/namespaces/{}/{}".format(amb.APP_CRD_GROUP, amb.APP_CRD_VERSION, namespace, amb.APP_CRD_PLURAL)
+	results = await list_all(cluster_name, path, fieldSelector="metadata.name=" + app_name)
+	if len(results) == 0:
+		print("No application found with name", app_name, "in cluster", cluster_name, "and ns", namespace + ".")
+		return []
+	dpb_names = results[0]["metadata"]["annotations"]["apps.ibm.com/deployables"].split(",")
+
+	per_cluster = await asyncio.gather(*[ cluster_deployables(cname) for cname in k8s_config.all_cluster_names() ])
+	return [ dpb for deployables in per_cluster for dpb in deployables if dpb["metadata"]["name"] in dpb_names ]
+
+async def get_unhealthy_pods():
+	"""
+	Same as errors_backend.get_unhealthy_pods(), but lists the pods of every cluster at the same time.
+
+	:return: ((List(tuple)) skipper_uid, rtype, name, reason, message,
+			  (List(V1Pod)) pod object)
+	"""
+	clusters = k8s_config.all_cluster_names()
+	per_cluster = await asyncio.gather(*[ cluster_pods(cluster, raw=True) for cluster in clusters ])
+	return eb.unhealthy_pods([ (pod, cluster) for cluster, pods in zip(clusters, per_cluster) for pod in pods ])
+
+async def aggregate_pod_metrics(cluster_name: str, namespace: str, pod_name: str):
+	"""
+	Same as metrics.aggregate_pod_metrics(), but fetches the pod and its usage at the same time.
+
+	:param (str) cluster_name: cluster the pod is in
+	:param (str) namespace: namespace the pod is in
+	:param (str) pod_name
+	:return: see metrics.aggregate_pod_metrics()
+	"""
+	# imported here since importing metrics looks up the accessible clusters
+	import metrics
+
+	async def usage():
+		try:
+			pod_metrics = await get(cluster_name, "/apis/metrics.k8s.io/v1beta1/namespaces/{}/pods/{}".format(namespace, pod_name))
+		except k8s.client.rest.ApiException:
+			return None
+		return metrics.parse_container_usage(pod_metrics)
+
+	pod, container_usage = await asyncio.gather(
+		get(cluster_name, "/api/v1/namespaces/{}/pods/{}".format(namespace, pod_name), model="V1Pod"), usage())
+	return metrics.combine_pod_metrics(metrics.parse_container_limits(pod), container_usage)
@@ -0,0 +1,173 @@
+import asyncio, json, os, ssl, threading, time
+import aiohttp
+import kubernetes as k8s
+from kubernetes import client, config
+from typing import Dict, List
+import k8s_config, rate_limits
+from k8s_api import API_REQUESTS, API_LATENCY, API_BYTES, API_THROTTLED, API_RETRIES, PAGE_SIZE, request_verb_kind, serializer
+
+class RawResponse:
+	"""
+	What ApiClient.deserialize() expects a response to look like.
+	"""
+	def __init__(self, data: bytes):
+		self.data = data
+
+class ClusterSession:
+	"""
+	Pooled connections to the api server of one cluster, set up from the same kube-config context
+	that k8s_api.api_client() uses for the cluster. Requests go through the context's rate limiter, shared with
+	the process's other clients of the cluster: one connection is kept per in-flight slot, and requests answered
+	with 429 or 5xx are retried with jittered backoff (see k8s_api.limit()).
+	"""
+
+	def __init__(self, cluster_name: str):
+		"""
+		:param (str) cluster_name
+		"""
+		context = k8s_config.context_for_cluster(cluster_name)
+		if context is None:
+			raise ValueError("No valid context could be found for cluster with name " + cluster_name + ".")
+		configuration = client.Configuration()
+		config.load_kube_config(context=context, client_configuration=configuration)
+
+		self.cluster_name = cluster_name
+		self.limiter = rate_limits.limiter(context)
+		self.host = configuration.host
+		self.headers = dict(configuration.api_key)
+		self.headers["Accept"] = "application/json"
+		if configuration.verify_ssl:
+			ssl_context = ssl.create_default_context(cafile=configuration.ssl_ca_cert)
+		else:
+			ssl_context = ssl.create_default_context()
+			ssl_context.check_hostname = False
+			ssl_context.verify_mode = ssl.CERT_NONE
+		if configuration.cert_file:
+			ssl_context.load_cert_chain(configuration.cert_file, configuration.key_file)
+		self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limiter.max_in_flight, ssl=ssl_context),
+											headers=self.headers, timeout=aiohttp.ClientTimeout(total=self.limiter.timeout))
+
+	async def get(self, path: str, params: Dict = None) -> bytes:
+		"""
+		Makes a GET request to the api server, counted and timed like the requests of k8s_api.api_client() clients.
+
+		:param (str) path: e.g. "/api/v1/pods"
+		:param (Dict) params: query parameters
+		:return: (bytes) response body
+		"""
+		params = { name: value for name, value in (params or {}).items() if value is not None }
+		verb, kind = request_verb_kind("GET", path, list(params.items()))
+		attempt = 0
+		while True:
+			wait = self.limiter.reserve()
+			if wait > 0:
+				API_THROTTLED.inc(wait, cluster=self.cluster_name)
+				await asyncio.sleep(wait)
+
+			code = "error"
+			start = time.time()
+			try:
+				async with self.session.get(self.host + path, params=params) as response:
+					code = response.status
+					data = await response.read()
+				API_BYTES.inc(len(data), cluster=self.cluster_name, verb=verb, kind=kind)
+			finally:
+				API_LATENCY.observe(time.time() - start, cluster=self.cluster_name, verb=verb, kind=kind)
+				API_REQUESTS.inc(cluster=self.cluster_name, verb=verb, kind=kind, code=code)
+
+			if code < 400:
+				return data
+			if not self.limiter.should_retry("GET", code, attempt):
+				error = k8s.client.rest.ApiException(status=code, reason=response.reason)
+				error.body = data
+				raise error
+			API_RETRIES.inc(cluster=self.cluster_name, code=code)
+			await asyncio.sleep(self.limiter.retry_delay(attempt, response.headers.get("Retry-After")))
+			attempt += 1
+
+sessions = {}	# cluster name : ClusterSession, only used from the event loop's thread
+loop = None
+loop_pid = None	# process the loop was started in, a forked process (e.g. a crawl shard) starts its own
+loop_lock = threading.Lock()
+
+def session(cluster_name: str) -> ClusterSession:
+	"""
+	Returns the session of a cluster, creating it on first use. Call from the event loop.
+	:param (str) cluster_name
+	:return: (ClusterSession)
+	"""
+	if cluster_name not in sessions:
+		sessions[cluster_name] = ClusterSession(cluster_name)
+	return sessions[cluster_name]
+
+async def get(cluster_name: str, path: str, params: Dict = None, model: str = None):
+	"""
+	Makes a GET request to a cluster's api server.
+
+	:param (str) cluster_name
+	:param (str) path: e.g. "/api/v1/namespaces/default/pods/my-pod"
+	:param (Dict) params: query parameters
+	:param (str) model: python k8s client model to return, e.g. "V1Pod", or None for the json as dicts
+	:return: the response as a model or as dicts
+	"""
+	data = await session(cluster_name).get(path, params)
+	if model is None:
+		return json.loads(data)
+	return serializer.deserialize(RawResponse(data), model)
+
+async def list_pages(cluster_name: str, path: str, model: str = None, page_size: int = PAGE_SIZE, **params):
+	"""
+	Async version of k8s_api.list_pages(): lists the objects at a path one page at a time, following the
+	continue token of each response.
+
+	Usage:	async for page in list_pages("my-cluster", "/api/v1/pods", "V1PodList"): ...
+
+	:param (str) cluster_name
+	:param (str) path: e.g. "/apis/apps/v1/deployments"
+	:param (str) model: python k8s client list model, e.g. "V1PodList", or None for dicts (e.g. custom objects)
+	:param (int) page_size: most objects per page
+	:param params: other query parameters, e.g. labelSelector="app=web"
+	:return: async generator of (List) the objects of each page, models or dicts depending on model
+	"""
+	params["limit"] = page_size
+	while True:
+		result = await get(cluster_name, path, params, model)
+		if model is None:
+			yield result.get("items") or []
+			params["continue"] = (result.get("metadata") or {}).get("continue")
+		else:
+			yield result.items
+			params["continue"] = result.metadata._continue
+		if not params["continue"]:
+			return
+
+async def list_all(cluster_name: str, path: str, model: str = None, page_size: int = PAGE_SIZE, **params) -> List:
+	"""
+	Same as list_pages(), but returns the objects of every page in one list.
+	:return: (List) objects, models or dicts depending on model
+	"""
+	return [ obj async for page in list_pages(cluster_name, path, model, page_size, **params) for obj in page ]
+
+async def gather(*coroutines, return_exceptions: bool = False) -> List:
+	"""
+	asyncio.gather() as a coroutine, so that it can be handed to run() from outside the event loop.
+	:return: (List) results of the coroutines, in order
+	"""
+	return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+
+def run(coroutine):
+	"""
+	Runs a coroutine on the backend's event loop and waits for its result, so that synchronous code (e.g. the
+	crawler's threads) can use this module. The loop runs in a background thread started on first use, and its
+	sessions are reused by every call.
+
+	:param coroutine: e.g. aio_backend.cluster_pods("my-cluster")
+	:return: what the coroutine returns, or raises what it raises
+	"""
+	global loop, loop_pid
+	with loop_lock:
+		if loop is None or loop_pid != os.getpid():
+			sessions.clear()
+			loop, loop_pid = asyncio.new_event_loop(), os.getpid()
+			threading.Thread(target=loop.run_forever, name="aio backend", daemon=True).start()
+	return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
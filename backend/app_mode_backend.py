@@ -23,10 +23,10 @@ def cluster_applications(cluster_name: str) -> List[Dict]:
 	# retrieve the cluster's Applications
 	api_client = k8s_api.api_client(cluster_name, "CustomObjectsApi")
 	try:
-		apps = api_client.list_cluster_custom_object(
+		apps = k8s_api.list_all(k8s_api.list_custom_objects, api_client,
 			group = APP_CRD_GROUP,
 			version = APP_CRD_VERSION,
-			plural = APP_CRD_PLURAL)["items"]
+			plural = APP_CRD_PLURAL)
 	except k8s.client.rest.ApiException:
 		return []
 	
@@ -59,9 +59,10 @@ def cluster_deployables(cluster_name: str) -> List[Dict]:
 	# retrieve the cluster's Deployables
 	api_client = k8s_api.api_client(cluster_name, "CustomObjectsApi")
 	try:
-		results = api_client.list_cluster_custom_object(group = DPB_CRD_GROUP,
+		results = k8s_api.list_all(k8s_api.list_custom_objects, api_client,
+			group = DPB_CRD_GROUP,
 			version = DPB_CRD_VERSION,
-			plural = DPB_CRD_PLURAL)["items"]
+			plural = DPB_CRD_PLURAL)
 	except k8s.client.rest.ApiException as e:
 		return []
 
@@ -170,7 +171,7 @@ def deployable_resource(cluster_name: str, namespace: str, deployable_name: str)
 			candidates = cmb.namespace_services(deployer_namespace, cluster_name)
 		for res in candidates:
 			if res.metadata.name == deployer_name:
-				deployer_dict = res.to_dict()
+				deployer_dict = k8s_api.to_raw(res)
 				deployer_dict["metadata"]["cluster_name"] = cluster_name
 				deployer_dict["kind"] = kind
 				break
@@ -1,4 +1,4 @@
-import k8s_config
+import k8s_api, k8s_config
 from kubernetes import client, config
 
 def get_clients():
@@ -13,14 +13,13 @@ def get_clients():
 	active_cluster = active_context["context"]["cluster"]
 	clients = {}
 	for cluster in clusters:
-		context = clusters[cluster]
-		# building all clients for all clusters
+		# building all clients for all clusters, rate limited like every other client (see k8s_api.limit())
 		clients[cluster] = {}
-		clients[cluster]["apps_client"] = client.AppsV1Api(api_client=config.new_client_from_config(context=context))
-		clients[cluster]["batch_client"] = client.BatchV1Api(api_client=config.new_client_from_config(context=context))
-		clients[cluster]["core_client"] = client.CoreV1Api(api_client=config.new_client_from_config(context=context))
-		clients[cluster]["ext_client"] = client.ExtensionsV1beta1Api(api_client=config.new_client_from_config(context=context))
-		clients[cluster]["api_client"] = client.ApiextensionsV1beta1Api(api_client=config.new_client_from_config(context=context))
-		clients[cluster]["customs_client"] = client.CustomObjectsApi(api_client=config.new_client_from_config(context=context))
+		clients[cluster]["apps_client"] = client.AppsV1Api(api_client=k8s_api.cluster_client(cluster))
+		clients[cluster]["batch_client"] = client.BatchV1Api(api_client=k8s_api.cluster_client(cluster))
+		clients[cluster]["core_client"] = client.CoreV1Api(api_client=k8s_api.cluster_client(cluster))
+		clients[cluster]["ext_client"] = client.ExtensionsV1beta1Api(api_client=k8s_api.cluster_client(cluster))
+		clients[cluster]["api_client"] = client.ApiextensionsV1beta1Api(api_client=k8s_api.cluster_client(cluster))
+		clients[cluster]["customs_client"] = client.CustomObjectsApi(api_client=k8s_api.cluster_client(cluster))
 
 	return clusters, clients, active_cluster
\ No newline at end of file
@@ -1,5 +1,6 @@
-from typing import List
-import k8s_api, k8s_config, requests
+from typing import Iterator, List
+import k8s_api, k8s_config
+from ownership import OwnershipResolver
 import kubernetes as k8s
 from kubernetes import client, config
 from kubernetes.client.rest import ApiException
@@ -11,6 +12,7 @@ V1Deployment = k8s.client.models.v1_deployment.V1Deployment
 V1Service = k8s.client.models.v1_service.V1Service
 V1StatefulSet = k8s.client.models.v1_stateful_set.V1StatefulSet
 V1DaemonSet = k8s.client.models.v1_daemon_set.V1DaemonSet
+V1ReplicaSet = k8s.client.models.v1_replica_set.V1ReplicaSet
 V1Pod = k8s.client.models.v1_pod.V1Pod
 V1Container = k8s.client.models.v1_container.V1Container
 
@@ -32,16 +34,19 @@ def mcm_clusters(cluster_names):
 
 		# getting local address for cluster
 		host = myconfig.host
-		token = myconfig.api_key
 		locals[cluster] = host
 
-		response = requests.get(host+'/api', headers=token, verify=False)
+		# through the cluster's client, so that it is rate limited like every other request (see k8s_api.limit())
+		try:
+			api_versions = k8s_api.api_client(cluster, "CoreApi").get_api_versions()
+		except ApiException:
+			api_versions = None
 
-		if response.status_code == 200:
+		if api_versions is not None:
 			remotes[cluster] = []
-			for server in response.json()["serverAddressByClientCIDRs"]:
+			for server in api_versions.server_address_by_client_cid_rs or []:
 				# getting remote addresses for cluster
-				address = server["serverAddress"]
+				address = server.server_address
 				remotes[cluster].append(address)
 			api_client = k8s_api.api_client(cluster, "CustomObjectsApi")
 			try:
@@ -73,16 +78,16 @@ def mcm_clusters(cluster_names):
 				clusters[cluster] = cluster_objects[uid]
 	return clusters
 
-def cluster_namespaces(cluster_name: str) -> List[V1Namespace]:
+def cluster_namespaces(cluster_name: str, raw: bool = False) -> List[V1Namespace]:
 	"""
 	Returns all the Namespaces that exist under the given cluster.
 
 	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts, see k8s_api.list_pages()
 	:return: (List[V1Namespace]) list of namespace objects
 	"""
 	api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
-	namespaces = api_client.list_namespace()
-	return namespaces.items
+	return k8s_api.list_all(api_client.list_namespace, raw=raw)
 
 def namespace_deployments(namespace: str, cluster_name: str) -> List[V1Deployment]:
 	"""
@@ -96,8 +101,7 @@ def namespace_deployments(namespace: str, cluster_name: str) -> List[V1Deploymen
 	if api_client == None:
 		print("Cluster", cluster_name, "could not be accessed using your kube-config credentials.")
 		return
-	deploys = api_client.list_namespaced_deployment(namespace)
-	return deploys.items
+	return k8s_api.list_all(api_client.list_namespaced_deployment, namespace)
 
 def namespace_services(namespace: str, cluster_name: str) -> List[V1Service]:
 	"""
@@ -111,8 +115,7 @@ def namespace_services(namespace: str, cluster_name: str) -> List[V1Service]:
 	if api_client == None:
 		print("Cluster", cluster_name, "could not be accessed using your kube-config credentials.")
 		return
-	svcs = api_client.list_namespaced_service(namespace)
-	return svcs.items
+	return k8s_api.list_all(api_client.list_namespaced_service, namespace)
 
 def namespace_stateful_sets(namespace: str, cluster_name: str) -> List[V1StatefulSet]:
 	"""
@@ -126,8 +129,7 @@ def namespace_stateful_sets(namespace: str, cluster_name: str) -> List[V1Statefu
 	if api_client == None:
 		print("Cluster", cluster_name, "could not be accessed using your kube-config credentials.")
 		return
-	ssets = api_client.list_namespaced_stateful_set(namespace)
-	return ssets.items
+	return k8s_api.list_all(api_client.list_namespaced_stateful_set, namespace)
 
 def namespace_daemon_sets(namespace: str, cluster_name: str) -> List[V1DaemonSet]:
 	"""
@@ -141,8 +143,109 @@ def namespace_daemon_sets(namespace: str, cluster_name: str) -> List[V1DaemonSet
 	if api_client == None:
 		print("Cluster", cluster_name, "could not be accessed using your kube-config credentials.")
 		return
-	dsets = api_client.list_namespaced_daemon_set(namespace)
-	return dsets.items
+	return k8s_api.list_all(api_client.list_namespaced_daemon_set, namespace)
+
+def cluster_deployments(cluster_name: str, raw: bool = False) -> List[V1Deployment]:
+	"""
+	Returns the Deployments in every namespace of the given cluster, using a single list call.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts, see k8s_api.list_pages()
+	:return: (List[V1Deployment]) list of deployment objects
+	"""
+	api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
+	return k8s_api.list_all(api_client.list_deployment_for_all_namespaces, raw=raw)
+
+def cluster_services(cluster_name: str, raw: bool = False) -> List[V1Service]:
+	"""
+	Returns the Services in every namespace of the given cluster, using a single list call.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts, see k8s_api.list_pages()
+	:return: (List[V1Service]) list of service objects
+	"""
+	api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
+	return k8s_api.list_all(api_client.list_service_for_all_namespaces, raw=raw)
+
+def cluster_stateful_sets(cluster_name: str, raw: bool = False) -> List[V1StatefulSet]:
+	"""
+	Returns the Stateful Sets in every namespace of the given cluster, using a single list call.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts, see k8s_api.list_pages()
+	:return: (List[V1StatefulSet]) list of stateful set objects
+	"""
+	api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
+	return k8s_api.list_all(api_client.list_stateful_set_for_all_namespaces, raw=raw)
+
+def cluster_daemon_sets(cluster_name: str, raw: bool = False) -> List[V1DaemonSet]:
+	"""
+	Returns the Daemon Sets in every namespace of the given cluster, using a single list call.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts, see k8s_api.list_pages()
+	:return: (List[V1DaemonSet]) list of daemon set objects
+	"""
+	api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
+	return k8s_api.list_all(api_client.list_daemon_set_for_all_namespaces, raw=raw)
+
+def cluster_replica_sets(cluster_name: str, raw: bool = False) -> List[V1ReplicaSet]:
+	"""
+	Returns the Replica Sets in every namespace of the given cluster, using a single list call.
+	Only needed to link pods to their deployments (see ownership.OwnershipResolver).
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts, see k8s_api.list_pages()
+	:return: (List[V1ReplicaSet]) list of replica set objects
+	"""
+	api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
+	return k8s_api.list_all(api_client.list_replica_set_for_all_namespaces, raw=raw)
+
+def cluster_pods(cluster_name: str, raw: bool = False) -> List[V1Pod]:
+	"""
+	Returns the Pods in every namespace of the given cluster, using a single list call.
+	Use label_selectors.LabelIndex to work out which of them a workload or service selects.
+
+	:param (str) cluster_name
+	:param (bool) raw: return the objects as the api serves them, as dicts, see k8s_api.list_pages()
+	:return: (List[V1Pod]) list of pod objects
+	"""
+	api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
+	return k8s_api.list_all(api_client.list_pod_for_all_namespaces, raw=raw)
+
+def cluster_pod_pages(cluster_name: str, page_size: int = k8s_api.PAGE_SIZE, raw: bool = False) -> Iterator[List[V1Pod]]:
+	"""
+	Yields the Pods in every namespace of the given cluster one page at a time, so that a caller can process
+	and drop each page before the next one is fetched.
+
+	:param (str) cluster_name
+	:param (int) page_size: most pods per page
+	:param (bool) raw: return the pods as the api serves them, as dicts, see k8s_api.list_pages()
+	:return: (Iterator[List[V1Pod]]) pages of pod objects
+	"""
+	api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
+	return k8s_api.list_pages(api_client.list_pod_for_all_namespaces, page_size=page_size, raw=raw)
+
+def owned_pods(owner_uid: str, namespace: str, cluster_name: str) -> List[V1Pod]:
+	"""
+	Returns the Pods that belong to the Deployment, Daemon Set or Stateful Set with the given uid,
+	following the pods' owner references (through their Replica Sets for deployments).
+
+	:param (str) owner_uid: k8s uid of the owning workload
+	:param (str) namespace: namespace the owning workload is in
+	:param (str) cluster_name: cluster that the namespace of interest is in
+	:return: (List[V1Pod]) list of pod objects
+	"""
+	AppsV1Api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
+	CoreV1Api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
+	resolver = OwnershipResolver(k8s_api.list_all(AppsV1Api_client.list_namespaced_replica_set, namespace))
+	pods = k8s_api.list_all(CoreV1Api_client.list_namespaced_pod, namespace)
+	owned = []
+	for pod in pods:
+		owner = resolver.workload_owner(pod)
+		if owner is not None and owner[1] == owner_uid:
+			owned.append(pod)
+	return owned
 
 def deployment_pods(deploy_name: str, namespace: str, cluster_name: str) -> List[V1Pod]:
 	"""
@@ -154,12 +257,8 @@ def deployment_pods(deploy_name: str, namespace: str, cluster_name: str) -> List
 	:return: (List[V1Pod]) list of pod objects
 	"""
 	AppsV1Api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
-	CoreV1Api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
 	deploy = AppsV1Api_client.list_namespaced_deployment(namespace, field_selector = "metadata.name=" + deploy_name).items[0]
-	selector_labels = deploy.spec.selector.match_labels	# dict
-	selector_str = ",".join([ key + "=" + val for key,val in selector_labels.items() ])
-	selected_pods = CoreV1Api_client.list_namespaced_pod(namespace, label_selector = selector_str)
-	return selected_pods.items
+	return owned_pods(deploy.metadata.uid, namespace, cluster_name)
 
 def daemon_set_pods(dset_name: str, namespace: str, cluster_name: str) -> List[V1Pod]:
 	"""
@@ -171,12 +270,8 @@ def daemon_set_pods(dset_name: str, namespace: str, cluster_name: str) -> List[V
 	:return: (List[V1Pod]) list of pod objects
 	"""
 	AppsV1Api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
-	CoreV1Api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
 	dset = AppsV1Api_client.list_namespaced_daemon_set(namespace, field_selector = "metadata.name=" + dset_name).items[0]
-	selector_labels = dset.spec.selector.match_labels # dict
-	selector_str = ",".join([ key + "=" + val for key,val in selector_labels.items() ])
-	selected_pods = CoreV1Api_client.list_namespaced_pod(namespace, label_selector = selector_str)
-	return selected_pods.items
+	return owned_pods(dset.metadata.uid, namespace, cluster_name)
 
 def stateful_set_pods(sset_name: str, namespace: str, cluster_name: str) -> List[V1Pod]:
 	"""
@@ -188,12 +283,8 @@ def stateful_set_pods(sset_name: str, namespace: str, cluster_name: str) -> List
 	:return: (List[V1Pod]) list of pod objects
 	"""
 	AppsV1Api_client = k8s_api.api_client(cluster_name, "AppsV1Api")
-	CoreV1Api_client = k8s_api.api_client(cluster_name, "CoreV1Api")
 	sset = AppsV1Api_client.list_namespaced_stateful_set(namespace, field_selector = "metadata.name=" + sset_name).items[0]
-	selector_labels = sset.spec.selector.match_labels # dict
-	selector_str = ",".join([ key + "=" + val for key,val in selector_labels.items() ])
-	selected_pods = CoreV1Api_client.list_namespaced_pod(namespace, label_selector = selector_str)
-	return selected_pods.items
+	return owned_pods(sset.metadata.uid, namespace, cluster_name)
 
 def service_pods(svc_name: str, namespace: str, cluster_name: str) -> List[V1Pod]:
 	"""
@@ -210,5 +301,4 @@ def service_pods(svc_name: str, namespace: str, cluster_name: str) -> List[V1Pod
 	if selector_labels == None:
 		return []
 	selector_str = ",".join([ key + "=" + val for key,val in selector_labels.items() ])
-	selected_pods = CoreV1Api_client.list_namespaced_pod(namespace, label_selector = selector_str)
-	return selected_pods.items
\ No newline at end of file
+	return k8s_api.list_all(CoreV1Api_client.list_namespaced_pod, namespace, label_selector = selector_str)
\ No newline at end of file
@@ -0,0 +1,47 @@
+from typing import Dict, List, Tuple
+
+def deployer_key(dpb: Dict) -> Tuple[str, str, str]:
+	"""
+	Reads which resource a Deployable deploys out of its spec.
+
+	:param (Dict) dpb: Deployable, as returned by the custom objects api
+	:return: (Tuple[str, str, str]) (kind, namespace, name) of the deployer, or None if the deployer isn't a
+			kube resource (e.g. a helm chart)
+	"""
+	deployer = (dpb.get("spec") or {}).get("deployer") or {}
+	kube = deployer.get("kube") or {}
+	name = ((kube.get("template") or {}).get("metadata") or {}).get("name")
+	if deployer.get("kind") in (None, "helm") or name is None:
+		return None
+	return (deployer["kind"], kube.get("namespace"), name)
+
+class DeployerIndex:
+	"""
+	Resources keyed by (kind, namespace, name), the way Deployables refer to what they deploy, so that a Deployable
+	and its deployer can be matched with a dict lookup instead of listing every namespace of every cluster.
+	The same name can exist in several clusters, so every key holds a list, in the order the entries were added.
+	"""
+
+	def __init__(self):
+		self.entries = {}	# (kind, namespace, name) : [ values ]
+
+	def add(self, kind: str, namespace: str, name: str, value) -> None:
+		"""
+		:param (str) kind: e.g. "Deployment"
+		:param (str) namespace
+		:param (str) name
+		:param value: what to return for the key, e.g. the resource's skipper uid
+		"""
+		self.entries.setdefault((kind, namespace, name), []).append(value)
+
+	def lookup(self, kind: str, namespace: str, name: str) -> List:
+		"""
+		:param (str) kind
+		:param (str) namespace
+		:param (str) name
+		:return: (List) values added under the key, empty if there are none
+		"""
+		return self.entries.get((kind, namespace, name), [])
+
+	def __len__(self) -> int:
+		return sum(len(values) for values in self.entries.values())
@@ -0,0 +1,186 @@
+import threading, time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import List, Tuple
+
+# Counters and histograms kept in memory and rendered in the Prometheus text format,
+# so that a process (the crawler or the webserver) can show where its time goes on a /metrics endpoint.
+
+# upper bounds (in seconds) of the default histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+	"""
+	:param (Tuple[str, ...]) names: label names
+	:param (Tuple[str, ...]) values: label values, in the same order
+	:param (str) extra: already formatted label to add at the end, e.g. 'le="0.5"'
+	:return: (str) labels as they appear after a metric name, e.g. '{cluster="a",kind="pods"}', or "" if there are none
+	"""
+	pairs = [ '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+				for name, value in zip(names, values) ]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if len(pairs) > 0 else ""
+
+class Counter:
+	"""
+	A value per set of labels that only goes up, e.g. number of api requests made.
+	"""
+
+	def __init__(self, name: str, documentation: str, labels: List[str] = ()):
+		"""
+		:param (str) name: metric name
+		:param (str) documentation: help text
+		:param (List[str]) labels: label names, whose values are passed to inc() as keyword arguments
+		"""
+		self.name = name
+		self.documentation = documentation
+		self.labels = tuple(labels)
+		self.values = {}	# label values : count
+		self.lock = threading.Lock()
+
+	def inc(self, amount: float = 1, **labels) -> None:
+		"""
+		:param (float) amount: amount to add
+		:param labels: label values
+		"""
+		key = tuple(str(labels[name]) for name in self.labels)
+		with self.lock:
+			self.values[key] = self.values.get(key, 0) + amount
+
+	def render(self) -> List[str]:
+		"""
+		:return: (List[str]) lines of the metric in the Prometheus text format
+		"""
+		lines = [ "# HELP {} {}".format(self.name, self.documentation), "# TYPE {} counter".format(self.name) ]
+		with self.lock:
+			for key, value in sorted(self.values.items()):
+				lines.append("{}{} {}".format(self.name, format_labels(self.labels, key), value))
+		return lines
+
+class Histogram:
+	"""
+	Distribution of observed values per set of labels, e.g. latency of api requests, counted in buckets.
+	"""
+
+	def __init__(self, name: str, documentation: str, labels: List[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+		"""
+		:param (str) name: metric name
+		:param (str) documentation: help text
+		:param (List[str]) labels: label names, whose values are passed to observe() as keyword arguments
+		:param (Tuple[float, ...]) buckets: upper bounds of the buckets, in increasing order
+		"""
+		self.name = name
+		self.documentation = documentation
+		self.labels = tuple(labels)
+		self.buckets = tuple(buckets)
+		self.values = {}	# label values : ([ count per bucket ], total count, sum)
+		self.lock = threading.Lock()
+
+	def observe(self, value: float, **labels) -> None:
+		"""
+		:param (float) value: observed value
+		:param labels: label values
+		"""
+		key = tuple(str(labels[name]) for name in self.labels)
+		with self.lock:
+			counts, count, total = self.values.get(key, ([ 0 ] * len(self.buckets), 0, 0))
+			for i, bound in enumerate(self.buckets):
+				if value <= bound:
+					counts[i] += 1
+			self.values[key] = (counts, count + 1, total + value)
+
+	@contextmanager
+	def time(self, **labels):
+		"""
+		Observes how many seconds the body of a with block takes, even if it raises.
+		:param labels: label values
+		"""
+		start = time.time()
+		try:
+			yield
+		finally:
+			self.observe(time.time() - start, **labels)
+
+	def render(self) -> List[str]:
+		"""
+		:return: (List[str]) lines of the metric in the Prometheus text format
+		"""
+		lines = [ "# HELP {} {}".format(self.name, self.documentation), "# TYPE {} histogram".format(self.name) ]
+		with self.lock:
+			for key, (counts, count, total) in sorted(self.values.items()):
+				for bound, bucket_count in zip(self.buckets, counts):
+					lines.append("{}_bucket{} {}".format(self.name, format_labels(self.labels, key, 'le="{}"'.format(bound)), bucket_count))
+				lines.append("{}_bucket{} {}".format(self.name, format_labels(self.labels, key, 'le="+Inf"'), count))
+				lines.append("{}_sum{} {}".format(self.name, format_labels(self.labels, key), total))
+				lines.append("{}_count{} {}".format(self.name, format_labels(self.labels, key), count))
+		return lines
+
+class Registry:
+	"""
+	The metrics of a process, by name. Registering a name twice returns the metric registered first.
+	"""
+
+	def __init__(self):
+		self.metrics = {}	# name : Counter or Histogram
+		self.lock = threading.Lock()
+
+	def register(self, metric):
+		"""
+		:param metric: Counter or Histogram
+		:return: the metric registered under its name
+		"""
+		with self.lock:
+			return self.metrics.setdefault(metric.name, metric)
+
+	def counter(self, name: str, documentation: str, labels: List[str] = ()) -> Counter:
+		"""
+		Registers a Counter, see Counter.__init__() for the arguments.
+		"""
+		return self.register(Counter(name, documentation, labels))
+
+	def histogram(self, name: str, documentation: str, labels: List[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+		"""
+		Registers a Histogram, see Histogram.__init__() for the arguments.
+		"""
+		return self.register(Histogram(name, documentation, labels, buckets))
+
+	def render(self) -> str:
+		"""
+		:return: (str) every metric in the Prometheus text format
+		"""
+		with self.lock:
+			metrics = list(self.metrics.values())
+		return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+# metrics of this process
+REGISTRY = Registry()
+
+# content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def start_http_server(port: int, registry: Registry = REGISTRY) -> None:
+	"""
+	Serves the registry's metrics on http://127.0.0.1:<port>/metrics from a background thread.
+	:param (int) port
+	:param (Registry) registry
+	"""
+
+	class MetricsHandler(BaseHTTPRequestHandler):
+		def do_GET(self):
+			body = registry.render().encode()
+			self.send_response(200)
+			self.send_header("Content-Type", CONTENT_TYPE)
+			self.send_header("Content-Length", str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, format, *args):
+			pass	# scrapes would flood the log
+
+	class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+		daemon_threads = True
+
+	server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+	threading.Thread(target=server.serve_forever, name="metrics server", daemon=True).start()
@@ -1,6 +1,134 @@
+import json, time
 import kubernetes as k8s
 from kubernetes import client, config
-import k8s_config
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+import k8s_config, rate_limits
+from instrumentation import REGISTRY
+
+API_REQUESTS = REGISTRY.counter("skipper_api_requests_total", "Requests made to k8s api servers.", [ "cluster", "verb", "kind", "code" ])
+API_LATENCY = REGISTRY.histogram("skipper_api_request_duration_seconds", "Time until k8s api servers answered.", [ "cluster", "verb", "kind" ])
+API_BYTES = REGISTRY.counter("skipper_api_response_bytes_total", "Bytes received from k8s api servers (watch streams aren't counted).", [ "cluster", "verb", "kind" ])
+API_THROTTLED = REGISTRY.counter("skipper_api_throttled_seconds_total", "Time requests waited for the rate limit of their api server.", [ "cluster" ])
+API_RETRIES = REGISTRY.counter("skipper_api_retries_total", "Requests made again after a 429 or 5xx answer.", [ "cluster", "code" ])
+
+# objects fetched per request by list_pages()
+PAGE_SIZE = 500
+
+# only used to convert between python k8s client models and the json the api serves, never makes requests
+serializer = client.ApiClient()
+
+def request_verb_kind(method: str, url: str, query_params: List[Tuple], host_path: str = "") -> Tuple[str, str]:
+	"""
+	Works out what an api request does, e.g. ("list", "pods") for GET /api/v1/namespaces/default/pods.
+
+	:param (str) method: http method
+	:param (str) url: request url
+	:param (List[Tuple]) query_params: (name, value) query parameters
+	:param (str) host_path: path of the api server's url (e.g. /clusters/dev behind a proxy), which every request path starts with
+	:return: ((str) k8s verb, (str) resource kind, plural as it appears in the url)
+	"""
+	path = urlparse(url).path
+	host_path = host_path.rstrip("/")
+	if host_path and path.startswith(host_path + "/"):
+		path = path[len(host_path):]
+	parts = [ part for part in path.split("/") if part ]
+	# drop the /api/<version> or /apis/<group>/<version> prefix, and the namespace the request is scoped to
+	parts = parts[2:] if len(parts) > 0 and parts[0] == "api" else parts[3:]
+	if len(parts) > 2 and parts[0] == "namespaces":
+		parts = parts[2:]
+	kind = parts[0] if len(parts) > 0 else "unknown"
+
+	if method == "GET":
+		if len(parts) > 1:
+			return "get", kind
+		return ("watch" if ("watch", True) in (query_params or []) else "list"), kind
+	verbs = { "POST": "create", "PUT": "update", "PATCH": "patch", "DELETE": "delete" }
+	return verbs.get(method, method.lower()), kind
+
+def instrument(api_client: k8s.client.ApiClient, cluster_name: str) -> None:
+	"""
+	Makes the api client count and time its requests, see API_REQUESTS, API_LATENCY and API_BYTES.
+	:param (k8s.client.ApiClient) api_client
+	:param (str) cluster_name: cluster the client points to
+	"""
+	request = api_client.request
+	host_path = urlparse(api_client.configuration.host).path
+
+	def timed_request(method, url, *args, **kwargs):
+		verb, kind = request_verb_kind(method, url, kwargs.get("query_params"), host_path)
+		code = "error"
+		start = time.time()
+		try:
+			response = request(method, url, *args, **kwargs)
+			code = response.status
+			# reading .data of a response that wasn't preloaded reads (and keeps) the whole body, so only skip watch streams
+			if kwargs.get("_preload_content", True) or verb != "watch":
+				API_BYTES.inc(len(response.data or b""), cluster=cluster_name, verb=verb, kind=kind)
+			return response
+		except k8s.client.rest.ApiException as e:
+			code = e.status
+			raise
+		finally:
+			API_LATENCY.observe(time.time() - start, cluster=cluster_name, verb=verb, kind=kind)
+			API_REQUESTS.inc(cluster=cluster_name, verb=verb, kind=kind, code=code)
+
+	api_client.request = timed_request
+
+def limit(api_client: k8s.client.ApiClient, cluster_name: str, context: str) -> None:
+	"""
+	Makes the api client go through the rate limiter of its api server (see rate_limits.py): every request waits for a
+	token and a free in-flight slot, gets the limiter's timeout unless it has one, and is retried with jittered backoff
+	when answered with 429 (or 5xx, for GETs). Watches only wait for a token, they stay open for minutes and would
+	hold their slot all that time. Call after instrument(), so that every attempt is counted.
+
+	:param (k8s.client.ApiClient) api_client
+	:param (str) cluster_name: cluster the client points to
+	:param (str) context: kube-config context the client was made from, which picks the limiter
+	"""
+	request = api_client.request
+	limiter = rate_limits.limiter(context)
+	host_path = urlparse(api_client.configuration.host).path
+
+	def limited_request(method, url, *args, **kwargs):
+		watch = request_verb_kind(method, url, kwargs.get("query_params"), host_path)[0] == "watch"
+		if not watch and kwargs.get("_request_timeout") is None:
+			kwargs["_request_timeout"] = (limiter.timeout, limiter.timeout)
+		attempt = 0
+		while True:
+			wait = limiter.reserve()
+			if wait > 0:
+				API_THROTTLED.inc(wait, cluster=cluster_name)
+				time.sleep(wait)
+			try:
+				if watch:
+					return request(method, url, *args, **kwargs)
+				with limiter.in_flight:
+					return request(method, url, *args, **kwargs)
+			except k8s.client.rest.ApiException as e:
+				if not limiter.should_retry(method, e.status, attempt):
+					raise
+				API_RETRIES.inc(cluster=cluster_name, code=e.status)
+				time.sleep(limiter.retry_delay(attempt, (e.headers or {}).get("Retry-After")))
+				attempt += 1
+
+	api_client.request = limited_request
+
+def cluster_client(cluster_name: str) -> k8s.client.ApiClient:
+	"""
+	Creates a python k8s ApiClient pointing to the given cluster, instrumented (see instrument()) and rate limited
+	(see limit()). Every client the backend makes goes through here.
+
+	:param (str) cluster_name
+	:return: (k8s.client.ApiClient) client, or None if no context points to the cluster
+	"""
+	context = k8s_config.context_for_cluster(cluster_name)
+	if context is None:
+		return None
+	new_client = config.new_client_from_config(context=context)
+	instrument(new_client, cluster_name)
+	limit(new_client, cluster_name, context)
+	return new_client
 
 def api_client(cluster_name: str, api_class: str) -> k8s.client.apis:
 	"""
@@ -14,15 +142,13 @@ def api_client(cluster_name: str, api_class: str) -> k8s.client.apis:
 	:return: (k8s.client.apis object) python k8s api client object
 	"""
 
-	# retrieve name of context that points to the given cluster
-	target_context = k8s_config.context_for_cluster(cluster_name)
-	if target_context == None:
+	# create a client from the context that points to the given cluster
+	new_client = cluster_client(cluster_name)
+	if new_client == None:
 		print("No valid context could be found for cluster with name", cluster_name + ".")
 		print("As of most recent update, you have access to the following clusters:", k8s_config.all_cluster_names())
 		return
 
-	new_client = config.new_client_from_config(context=target_context)
-
 	# check if given api_class is a valid k8s api class
 	try:
 		api_client = eval("client." + api_class + "(api_client = new_client)")
@@ -30,4 +156,98 @@ def api_client(cluster_name: str, api_class: str) -> k8s.client.apis:
 		print("No known API class could be found with name", api_class + ".")
 		print("API classes can be found here: https://github.com/kubernetes-client/python/blob/master/kubernetes/README.md")
 		return
-	return api_client
\ No newline at end of file
+	return api_client
+
+def to_raw(k8s_obj) -> Dict:
+	"""
+	Returns an object the way the api serves it, e.g. {"metadata": {"creationTimestamp": ...}} instead of the
+	snake_case keys of to_dict(). Raw objects (as returned with raw=True) are returned as they are.
+
+	:param k8s_obj: python k8s client model or raw dict
+	:return: (Dict) raw object
+	"""
+	if isinstance(k8s_obj, dict):
+		return k8s_obj
+	return serializer.sanitize_for_serialization(k8s_obj)
+
+def to_json(k8s_obj) -> str:
+	"""
+	:param k8s_obj: python k8s client model or raw dict
+	:return: (str) the object as json, the way the api serves it (see to_raw()). This is what the "info" of resources holds.
+	"""
+	return json.dumps(to_raw(k8s_obj), default=str)
+
+def list_pages(list_function, *args, page_size: int = PAGE_SIZE, raw: bool = False, with_version: bool = False, **kwargs):
+	"""
+	Calls a list function of a python k8s api client one page at a time, following the continue token
+	of each response, so that no single response has to hold every object.
+
+	Usage:	for page in list_pages(api_client.list_pod_for_all_namespaces, page_size=500): ...
+
+	:param list_function: list function of a python k8s api client, e.g. CoreV1Api.list_namespaced_pod or
+						CustomObjectsApi.list_cluster_custom_object
+	:param args: positional arguments of the list function
+	:param (int) page_size: most objects per page
+	:param (bool) raw: return the objects as the dicts parsed from the response (_preload_content=False), instead of
+						building python k8s client models out of them. Much cheaper for callers that only read a few fields
+	:param (bool) with_version: yield the resourceVersion of each page along with its objects. Every page of a list is
+						served from the same snapshot, so the last one's is where a watch of the listed objects starts from
+	:param kwargs: keyword arguments of the list function
+	:return: generator of (List) the objects of each page, models or dicts depending on the list function and raw,
+			or of ((List) objects, (str) resourceVersion) if with_version
+	"""
+	_continue = None
+	while True:
+		if _continue:
+			kwargs["_continue"] = _continue
+		if raw:
+			response = list_function(*args, limit=page_size, _preload_content=False, **kwargs)
+			result = json.loads(response.data)
+		else:
+			result = list_function(*args, limit=page_size, **kwargs)
+
+		# custom object lists (and raw lists) come back as dicts
+		if isinstance(result, dict):
+			items, metadata = result.get("items") or [], result.get("metadata") or {}
+			_continue, resource_version = metadata.get("continue"), metadata.get("resourceVersion")
+		else:
+			items, _continue, resource_version = result.items, result.metadata._continue, result.metadata.resource_version
+		yield (items, resource_version) if with_version else items
+		if not _continue:
+			return
+
+def list_all(list_function, *args, page_size: int = PAGE_SIZE, raw: bool = False, **kwargs) -> List:
+	"""
+	Same as list_pages(), but returns the objects of every page in one list.
+	:return: (List) objects, models or dicts depending on the list function and raw
+	"""
+	return [ obj for page in list_pages(list_function, *args, page_size=page_size, raw=raw, **kwargs) for obj in page ]
+
+def list_custom_objects(api_client: k8s.client.CustomObjectsApi, group: str, version: str, plural: str, namespace: str = None,
+						field_selector: str = None, label_selector: str = None, limit: int = None, _continue: str = None) -> Dict:
+	"""
+	Lists custom objects like CustomObjectsApi.list_cluster_custom_object() (or list_namespaced_custom_object()
+	if a namespace is given) does, but also passes on limit and continue, which version 10.0 of the python client
+	doesn't accept for custom objects. Can be given to list_pages().
+
+	:param (k8s.client.CustomObjectsApi) api_client
+	:param (str) group: the custom resource's group name
+	:param (str) version: the custom resource's version
+	:param (str) plural: the custom resource's plural name
+	:param (str) namespace: namespace to list in, or None for every namespace
+	:param (str) field_selector
+	:param (str) label_selector
+	:param (int) limit: most objects to return
+	:param (str) _continue: continue token of the previous page
+	:return: (Dict) list object, with the custom objects under "items"
+	"""
+	path_params = { "group": group, "version": version, "plural": plural }
+	path = "/apis/{group}/{version}/{plural}"
+	if namespace is not None:
+		path_params["namespace"] = namespace
+		path = "/apis/{group}/{version}/namespaces/{namespace}/{plural}"
+
+	query_params = [ (name, value) for name, value in (("fieldSelector", field_selector), ("labelSelector", label_selector),
+						("limit", limit), ("continue", _continue)) if value is not None ]
+	return api_client.api_client.call_api(path, "GET", path_params, query_params, { "Accept": "application/json" },
+										response_type="object", auth_settings=[ "BearerToken" ], _return_http_data_only=True)
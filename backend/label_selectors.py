@@ -0,0 +1,102 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+
+def selector_parts(selector) -> Tuple[Dict, List[Tuple]]:
+	"""
+	Splits a label selector into its matchLabels and matchExpressions.
+
+	:param selector: V1LabelSelector (deployments, daemonsets, statefulsets), Dict of labels (services),
+					or a raw {"matchLabels": ..., "matchExpressions": ...} dict. None selects nothing.
+	:return: ((Dict) labels that must match exactly, (List[Tuple]) (key, operator, values) expressions)
+	"""
+	if selector is None:
+		return {}, []
+	if isinstance(selector, dict):
+		if "matchLabels" in selector or "matchExpressions" in selector:
+			expressions = [ (e["key"], e["operator"], e.get("values") or []) for e in selector.get("matchExpressions") or [] ]
+			return selector.get("matchLabels") or {}, expressions
+		return selector, []
+	expressions = [ (e.key, e.operator, e.values or []) for e in selector.match_expressions or [] ]
+	return selector.match_labels or {}, expressions
+
+def expressions_match(expressions: List[Tuple], labels: Dict) -> bool:
+	"""
+	:param (List[Tuple]) expressions: (key, operator, values) expressions, as returned by selector_parts()
+	:param (Dict) labels: labels of the object being matched
+	:return: (bool) whether the labels satisfy every expression
+	"""
+	for key, operator, values in expressions:
+		if operator == "In" and labels.get(key) not in values:
+			return False
+		if operator == "NotIn" and key in labels and labels[key] in values:
+			return False
+		if operator == "Exists" and key not in labels:
+			return False
+		if operator == "DoesNotExist" and key in labels:
+			return False
+	return True
+
+def matches(selector, labels: Dict) -> bool:
+	"""
+	Checks whether a label selector selects an object with the given labels.
+	An empty selector selects nothing, same as a service without a selector.
+
+	:param selector: any selector accepted by selector_parts()
+	:param (Dict) labels: labels of the object being matched, or None
+	:return: (bool)
+	"""
+	match_labels, expressions = selector_parts(selector)
+	if len(match_labels) == 0 and len(expressions) == 0:
+		return False
+	labels = labels or {}
+	if any(labels.get(key) != value for key, value in match_labels.items()):
+		return False
+	return expressions_match(expressions, labels)
+
+class LabelIndex:
+	"""
+	Index of k8s objects (usually pods) by namespace and label, used to find the objects a selector
+	selects in memory, instead of making a label-selector list call per selector.
+	"""
+
+	def __init__(self, objs: Iterable, namespace_of: Callable = None, labels_of: Callable = None):
+		"""
+		:param (Iterable) objs: objects to index
+		:param (Callable) namespace_of: returns an object's namespace, defaults to obj.metadata.namespace
+		:param (Callable) labels_of: returns an object's labels, defaults to obj.metadata.labels
+		"""
+		namespace_of = namespace_of or (lambda obj: obj.metadata.namespace)
+		labels_of = labels_of or (lambda obj: obj.metadata.labels)
+
+		self.entries = {}	# namespace : [ (obj, labels) ]
+		self.postings = {}	# (namespace, label key, label value) : set of positions in self.entries[namespace]
+		for obj in objs:
+			namespace = namespace_of(obj)
+			labels = labels_of(obj) or {}
+			entries = self.entries.setdefault(namespace, [])
+			for key, value in labels.items():
+				self.postings.setdefault((namespace, key, value), set()).add(len(entries))
+			entries.append((obj, labels))
+
+	def select(self, namespace: str, selector) -> List:
+		"""
+		Returns the indexed objects in the given namespace that the selector selects.
+
+		:param (str) namespace
+		:param selector: any selector accepted by selector_parts()
+		:return: (List) selected objects, in the order they were indexed
+		"""
+		match_labels, expressions = selector_parts(selector)
+		if len(match_labels) == 0 and len(expressions) == 0:
+			return []
+		entries = self.entries.get(namespace, [])
+
+		if len(match_labels) > 0:
+			# intersect the postings of every matchLabels pair, smallest first
+			postings = sorted((self.postings.get((namespace, key, value), set()) for key, value in match_labels.items()), key=len)
+			positions = set(postings[0])
+			for posting in postings[1:]:
+				positions &= posting
+		else:
+			positions = range(len(entries))
+
+		return [ entries[i][0] for i in sorted(positions) if expressions_match(expressions, entries[i][1]) ]
@@ -1,5 +1,4 @@
-import requests
-from kubernetes import client, config
+from kubernetes.client.rest import ApiException
 from hurry.filesize import size, iec
 from si_prefix import si_format
 import k8s_api, k8s_config
@@ -46,57 +45,41 @@ def convert_to_base_unit(value, unit):
         base = 1024
     return value * (base ** POWERS_BY_UNIT[unit])
 
-def aggregate_pod_metrics(cluster_name, namespace, pod_name):
+def parse_container_usage(pod_metrics):
     """
-    Get the pod and container compute resources
-    :param (str) cluster_name: cluster the pod is in
-    :param (str) namespace: namespace the pod is in
-    :param (str) pod_name
-    :return: ((Dict) pod_final, (Dict) containers_final)
-                where if resource_metric_dict = {'cpu': (str) current_cpu, 'cpu_limit': (str) cpu_limit or 'N/A',
-                                                'mem': (str) current_mem, 'mem_limit': (str) mem_limit or 'N/A'},
-                then pod_final = resource_metric_dict (for pod),
-                and containers_final = Dict('init_containers': Dict(<container_name>, resource_metric_dict),
-                                            'containers': Dict(<container_name>, resource_metric_dict)), or None if no container info
+    Reads current usage for containers out of a pod's metrics.k8s.io PodMetrics object
+    :param (Dict) pod_metrics: PodMetrics object as json
+    :return: Dict(container_name : (cpu, mem))
     """
+    usage_by_container = {}
+    if pod_metrics.get('containers'):
+        for ct in pod_metrics['containers']:
+            usage_by_container[ct['name']] = (ct['usage']['cpu'], ct['usage']['memory'])
+    return usage_by_container
 
-    def get_pod_container_usage(cluster_name, namespace, pod_name):
-        """
-        Helper method for getting current usage for containers in a pod
-        :return: Dict(container_name : (cpu, mem)), or None if http request failed
-        """
-        # load configuration for the desired context to get host and api key
-        myconfig = client.Configuration()
-        desired_context = k8s_config.context_for_cluster(cluster_name)
-        config.load_kube_config(context=desired_context, client_configuration=myconfig)
-
-        # request to get pod
-        server = myconfig.host
-        headers = myconfig.api_key
-        url = server + "/apis/metrics.k8s.io/v1beta1/namespaces/{}/pods/{}".format(namespace, pod_name)
-        response = requests.get(url, headers=headers, verify=False)
-
-        if response.status_code == 200:
-            pod_metrics = response.json()
-            usage_by_container = {}
-            if pod_metrics.get('containers'):
-                for ct in pod_metrics['containers']:
-                    usage_by_container[ct['name']] = (ct['usage']['cpu'], ct['usage']['memory'])
-            return usage_by_container
-        else:
-            return None
-
-    def get_pod_container_limits(cluster_name, namespace, pod_name):
-        """
-        Helper method for getting limits for containers in a pod
-        :return: Dict(container_name : (cpu, mem, (bool) is_init_container))), where None for cpu and mem mean no limits specified
-        """
-        api_client = k8s_api.api_client(cluster_name=cluster_name, api_class="CoreV1Api")
-        pod_object = api_client.read_namespaced_pod(pod_name, namespace)
-
-        limits_by_container = {}
-        containers = pod_object.spec.containers
-        for ct in containers:
+def parse_container_limits(pod_object):
+    """
+    Reads limits for containers out of a pod
+    :param (V1Pod) pod_object
+    :return: Dict(container_name : (cpu, mem, (bool) is_init_container))), where None for cpu and mem mean no limits specified
+    """
+    limits_by_container = {}
+    containers = pod_object.spec.containers
+    for ct in containers:
+        name = ct.name
+
+        try:
+            ct_cpu_limit = ct.resources.limits.get('cpu')
+        except:
+            ct_cpu_limit = None
+        try:
+            ct_mem_limit = ct.resources.limits.get('memory')
+        except:
+            ct_mem_limit = None
+        limits_by_container[name] = (ct_cpu_limit, ct_mem_limit, False)
+
+    if pod_object.spec.init_containers is not None:
+        for ct in pod_object.spec.init_containers:
             name = ct.name
 
             try:
@@ -107,27 +90,58 @@ def aggregate_pod_metrics(cluster_name, namespace, pod_name):
                 ct_mem_limit = ct.resources.limits.get('memory')
             except:
                 ct_mem_limit = None
-            limits_by_container[name] = (ct_cpu_limit, ct_mem_limit, False)
+            limits_by_container[name] = (ct_cpu_limit, ct_mem_limit, True)
 
-        if pod_object.spec.init_containers is not None:
-            for ct in pod_object.spec.init_containers:
-                name = ct.name
+    return limits_by_container
 
-                try:
-                    ct_cpu_limit = ct.resources.limits.get('cpu')
-                except:
-                    ct_cpu_limit = None
-                try:
-                    ct_mem_limit = ct.resources.limits.get('memory')
-                except:
-                    ct_mem_limit = None
-                limits_by_container[name] = (ct_cpu_limit, ct_mem_limit, True)
+def get_pod_container_usage(cluster_name, namespace, pod_name):
+    """
+    Helper method for getting current usage for containers in a pod
+    :return: Dict(container_name : (cpu, mem)), or None if http request failed
+    """
+    # through the cluster's client, so that it is rate limited like every other request (see k8s_api.limit())
+    api_client = k8s_api.api_client(cluster_name=cluster_name, api_class="CustomObjectsApi")
+    try:
+        pod_metrics = api_client.get_namespaced_custom_object("metrics.k8s.io", "v1beta1", namespace, "pods", pod_name)
+    except ApiException:
+        return None
+    return parse_container_usage(pod_metrics)
+
+def get_pod_container_limits(cluster_name, namespace, pod_name):
+    """
+    Helper method for getting limits for containers in a pod
+    :return: Dict(container_name : (cpu, mem, (bool) is_init_container))), where None for cpu and mem mean no limits specified
+    """
+    api_client = k8s_api.api_client(cluster_name=cluster_name, api_class="CoreV1Api")
+    return parse_container_limits(api_client.read_namespaced_pod(pod_name, namespace))
 
-        return limits_by_container
+def aggregate_pod_metrics(cluster_name, namespace, pod_name):
+    """
+    Get the pod and container compute resources
+    :param (str) cluster_name: cluster the pod is in
+    :param (str) namespace: namespace the pod is in
+    :param (str) pod_name
+    :return: ((Dict) pod_final, (Dict) containers_final)
+                where if resource_metric_dict = {'cpu': (str) current_cpu, 'cpu_limit': (str) cpu_limit or 'N/A',
+                                                'mem': (str) current_mem, 'mem_limit': (str) mem_limit or 'N/A'},
+                then pod_final = resource_metric_dict (for pod),
+                and containers_final = Dict('init_containers': Dict(<container_name>, resource_metric_dict),
+                                            'containers': Dict(<container_name>, resource_metric_dict)), or None if no container info
+    """
 
     # get current container usage and limits
     container_limits = get_pod_container_limits(cluster_name,namespace,pod_name)
     container_usage = get_pod_container_usage(cluster_name,namespace,pod_name)
+    return combine_pod_metrics(container_limits, container_usage)
+
+def combine_pod_metrics(container_limits, container_usage):
+    """
+    Adds up the container usage and limits of a pod, see aggregate_pod_metrics()
+    (aio_backend.aggregate_pod_metrics() fetches them concurrently and combines them here too)
+    :param (Dict) container_limits: as returned by parse_container_limits()
+    :param (Dict) container_usage: as returned by parse_container_usage(), or None if there is no usage info
+    :return: same as aggregate_pod_metrics()
+    """
     if container_usage is None: # no container usage info
         return {'cpu': None, 'memory': None}, None
 
@@ -0,0 +1,107 @@
+from typing import Iterable, List, Tuple
+
+# kinds that pods are shown under in cluster mode
+WORKLOAD_KINDS = ("Deployment", "DaemonSet", "StatefulSet")
+
+def object_uid(obj) -> str:
+	"""
+	:param obj: k8s object, a python k8s client model or a dict as the api serves it
+	:return: (str) k8s uid of the object
+	"""
+	if isinstance(obj, dict):
+		return obj["metadata"]["uid"]
+	return obj.metadata.uid
+
+def owner_references(obj) -> List[Tuple[str, str, bool]]:
+	"""
+	:param obj: k8s object, a python k8s client model or a dict as the api serves it
+	:return: (List[Tuple[str, str, bool]]) (kind, k8s uid, whether it is the managing controller) of each owner reference
+	"""
+	if isinstance(obj, dict):
+		return [ (ref["kind"], ref["uid"], ref.get("controller")) for ref in obj["metadata"].get("ownerReferences") or [] ]
+	return [ (ref.kind, ref.uid, ref.controller) for ref in obj.metadata.owner_references or [] ]
+
+def controller_reference(obj) -> Tuple[str, str, bool]:
+	"""
+	Returns the owner reference of the object's managing controller.
+
+	:param obj: k8s object, a python k8s client model or a dict as the api serves it
+	:return: (Tuple[str, str, bool]) the reference with controller=true, falling back to the first reference,
+			or None if the object has no owner. See owner_references()
+	"""
+	refs = owner_references(obj)
+	for ref in refs:
+		if ref[2]:
+			return ref
+	return refs[0] if len(refs) > 0 else None
+
+class OwnershipResolver:
+	"""
+	Works out which Deployment, DaemonSet or StatefulSet a pod belongs to by following metadata.owner_references
+	(e.g. Pod -> ReplicaSet -> Deployment) through a uid-keyed map of objects that were already listed,
+	instead of re-running each workload's label selector as a query.
+	"""
+
+	def __init__(self, objs: Iterable = ()):
+		"""
+		:param (Iterable) objs: objects that can sit between a pod and its workload, usually ReplicaSets
+		"""
+		self.objects = {}	# k8s uid : object
+		for obj in objs:
+			self.add(obj)
+
+	def add(self, obj) -> None:
+		"""
+		Adds (or replaces) an object in the map.
+		:param obj: k8s object, a python k8s client model or a dict as the api serves it
+		"""
+		self.objects[object_uid(obj)] = obj
+
+	def remove(self, uid: str) -> None:
+		"""
+		Removes an object from the map.
+		:param (str) uid: k8s uid of the object
+		"""
+		self.objects.pop(uid, None)
+
+	def workload_owner(self, obj) -> Tuple[str, str]:
+		"""
+		Follows the controller references of an object until one points at a workload.
+
+		:param obj: k8s object, usually a pod, a python k8s client model or a dict as the api serves it
+		:return: ((str) kind, (str) k8s uid) of the owning Deployment, DaemonSet or StatefulSet,
+				or None if the chain ends (e.g. a bare pod, a Job) or runs through an object that isn't in the map
+		"""
+		ref = controller_reference(obj)
+		visited = set()
+		while ref is not None and ref[1] not in visited:
+			kind, uid, _ = ref
+			if kind in WORKLOAD_KINDS:
+				return kind, uid
+			visited.add(uid)
+			owner = self.objects.get(uid)
+			if owner is None:
+				return None
+			ref = controller_reference(owner)
+		return None
+
+	def missing_owner(self, obj) -> Tuple[str, str]:
+		"""
+		Follows the controller references of an object like workload_owner(), to tell why it found no workload.
+
+		:param obj: k8s object, usually a pod, a python k8s client model or a dict as the api serves it
+		:return: ((str) kind, (str) k8s uid) of the first object along the chain that isn't in the map,
+				or None if the chain reaches a workload or an object without owner
+		"""
+		ref = controller_reference(obj)
+		visited = set()
+		while ref is not None and ref[1] not in visited:
+			kind, uid, _ = ref
+			if kind in WORKLOAD_KINDS:
+				return None
+			visited.add(uid)
+			owner = self.objects.get(uid)
+			if owner is None:
+				return kind, uid
+			ref = controller_reference(owner)
+		return None
@@ -0,0 +1,107 @@
+import json, os, random, threading, time
+
+# Limits on the requests made to each api server, so that a crawl fanning out over many threads (or an event loop)
+# can't flood a fragile hub cluster. Every process keeps one ApiLimiter per kube-config context, shared by every
+# client pointing to it (see k8s_api.api_client() and aio_k8s_api.ClusterSession).
+#
+# The limits are per process, not shared between processes. In sharded mode (SKIPPER_CRAWL_MODE=sharded) a cluster
+# is only crawled by the worker process of its shard, but the coordinator lists clusters, applications and deployables
+# on its own limiters, and the webserver has its own too. An api server (the hub, typically) can get up to three
+# times the limits below, so set them to a third of what it should take overall.
+#
+# Defaults can be set with the environment variables below, and overridden per context with SKIPPER_API_LIMITS,
+# e.g. SKIPPER_API_LIMITS='{"hub-context": {"qps": 5, "burst": 10, "max_in_flight": 4}}'
+
+DEFAULT_LIMITS = {
+	"qps": float(os.environ.get("SKIPPER_API_QPS", 50)),					# requests per second, on average
+	"burst": float(os.environ.get("SKIPPER_API_BURST", 100)),				# requests that can be made at once after a quiet spell
+	"max_in_flight": int(os.environ.get("SKIPPER_API_MAX_IN_FLIGHT", 32)),	# requests waiting for an answer at the same time (watches aren't counted)
+	"timeout": float(os.environ.get("SKIPPER_API_TIMEOUT", 60)),			# seconds before a request (but not a watch) is given up on
+	"retries": int(os.environ.get("SKIPPER_API_RETRIES", 3)),				# retries of a request answered with 429 or 5xx
+	"backoff_base": float(os.environ.get("SKIPPER_API_BACKOFF_BASE", 0.5)),	# most seconds before the first retry, doubled for every retry after that
+	"backoff_max": float(os.environ.get("SKIPPER_API_BACKOFF_MAX", 30)),	# most seconds before any retry
+}
+CONTEXT_LIMITS = json.loads(os.environ.get("SKIPPER_API_LIMITS") or "{}")	# context name : { setting : value }
+
+class ApiLimiter:
+	"""
+	Token bucket of requests per second with a burst, plus a cap on the requests in flight, for one api server.
+	Waiting for a token is done by the caller: reserve() only says how long to wait, so threads can time.sleep()
+	and coroutines can asyncio.sleep() on the same bucket.
+	"""
+
+	def __init__(self, qps: float, burst: float, max_in_flight: int, timeout: float, retries: int,
+					backoff_base: float, backoff_max: float):
+		"""
+		:param (float) qps: requests per second the bucket refills at
+		:param (float) burst: size of the bucket
+		:param (int) max_in_flight: requests that can wait for an answer at the same time
+		:param (float) timeout: seconds before a request is given up on
+		:param (int) retries: retries of a request answered with 429 or 5xx
+		:param (float) backoff_base: most seconds before the first retry, doubled for every retry after that
+		:param (float) backoff_max: most seconds before any retry
+		"""
+		self.qps = qps
+		self.burst = burst
+		self.max_in_flight = max_in_flight
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff_base = backoff_base
+		self.backoff_max = backoff_max
+		self.tokens = burst
+		self.refilled_at = time.time()
+		self.lock = threading.Lock()
+		self.in_flight = threading.BoundedSemaphore(max_in_flight)
+
+	def reserve(self) -> float:
+		"""
+		Takes a token from the bucket. When it is empty the token is borrowed from the future, so callers queue up
+		in the order they asked instead of racing for every new token.
+		:return: (float) seconds to wait before making the request
+		"""
+		with self.lock:
+			now = time.time()
+			self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.qps)
+			self.refilled_at = now
+			self.tokens -= 1
+			return 0 if self.tokens >= 0 else -self.tokens / self.qps
+
+	def retry_delay(self, attempt: int, retry_after: str = None) -> float:
+		"""
+		:param (int) attempt: number of the retry, starting at 0
+		:param (str) retry_after: Retry-After header of the answer, if any
+		:return: (float) seconds to wait before the retry, picked at random up to the exponential backoff
+				(so that clients backing off together don't come back together), and at least what the server asked for
+		"""
+		delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+		try:
+			return max(delay, min(self.backoff_max, float(retry_after)))
+		except (TypeError, ValueError):
+			return delay
+
+	def should_retry(self, method: str, status, attempt: int) -> bool:
+		"""
+		:param (str) method: http method of the request
+		:param status: http status of the answer
+		:param (int) attempt: retries made so far
+		:return: (bool) whether to retry: 429 means the request wasn't handled, so it is always retried, other errors of the
+				server only for GETs, which are safe to repeat
+		"""
+		if attempt >= self.retries or not isinstance(status, int):
+			return False
+		return status == 429 or (status >= 500 and method == "GET")
+
+limiters = {}	# context name : ApiLimiter
+limiters_lock = threading.Lock()
+
+def limiter(context: str) -> ApiLimiter:
+	"""
+	:param (str) context: kube-config context of the api server
+	:return: (ApiLimiter) the limiter of the api server, created with DEFAULT_LIMITS and the context's CONTEXT_LIMITS on first use
+	"""
+	with limiters_lock:
+		if context not in limiters:
+			limits = dict(DEFAULT_LIMITS)
+			limits.update(CONTEXT_LIMITS.get(context, {}))
+			limiters[context] = ApiLimiter(**limits)
+		return limiters[context]
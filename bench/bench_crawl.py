@@ -0,0 +1,47 @@
+import argparse, os, sys, time, requests
+
+# Times crawl rounds, get_unhealthy_pods() and a few webserver reads against whatever clusters the kube-config points at,
+# normally the ones served by fake_apiserver.py. The webserver has to be running, and the crawler must not be.
+#
+# Usage:	KUBECONFIG=fake-kubeconfig python bench_crawl.py --rounds 3
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'controller'))
+
+def timed(function, *args):
+	"""
+	:return: ((float) seconds the call took, its result)
+	"""
+	start = time.time()
+	result = function(*args)
+	return time.time() - start, result
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the crawler and webserver.")
+	parser.add_argument("--rounds", type=int, default=3, help="crawl rounds to time, the first one writes everything")
+	parser.add_argument("--webserver", default="http://127.0.0.1:5000")
+	args = parser.parse_args()
+
+	# loads the kube-config and finds the clusters
+	import crawler
+	import errors_backend as eb
+
+	cluster_names = crawler.k8s_config.all_cluster_names()
+	print("Benchmarking %d clusters." % len(cluster_names))
+	for i in range(args.rounds):
+		# every round re-lists everything, instead of only what the scheduler says is due
+		crawler.scheduler.last_refresh.clear()
+		seconds, _ = timed(crawler.load_all)
+		print("Round %d: %.2f secs" % (i + 1, seconds))
+
+	seconds, (table_rows, _) = timed(eb.get_unhealthy_pods)
+	print("get_unhealthy_pods(): %d pods in %.2f secs" % (len(table_rows), seconds))
+
+	for path in [ "/mode/cluster/" + cname for cname in cluster_names ] + [ "/errors", "/search/deploy" ]:
+		seconds, response = timed(requests.get, args.webserver + path)
+		print("GET %s: %d in %.3f secs" % (path, response.status_code, seconds))
+
+if __name__ == "__main__":
+	try:
+		main()
+	except KeyboardInterrupt:
+		sys.exit(0)
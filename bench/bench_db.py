@@ -0,0 +1,195 @@
+import argparse, os, statistics, sys, tempfile, time
+
+# Times the webserver's navigation, anomaly and search endpoints on a generated db, first without the indexes
+# of models.py (added by migrations edb612603d16 and 79da50f0aee7), then with them. Then times opening namespaces of growing sizes, with has_children()
+# answered per row (the way it used to be) and per table. The webserver runs in this process (flask's test client)
+# on a db of its own, so neither the crawler nor a running webserver are needed, but the kube-config still has to load.
+#
+# Usage:	KUBECONFIG=fake-kubeconfig python bench_db.py --resources 1000000
+
+WEBSERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'controller', 'webserver')
+
+def generate(total: int, clusters: int, namespaces: int, workloads: int):
+	"""
+	Yields resources and edges shaped like a crawl: clusters > namespaces > deployments and services > pods,
+	with every pod under a deployment and the service of the same number. One pod in a thousand is unhealthy.
+
+	:param (int) total: resources to generate, roughly
+	:param (int) clusters: number of clusters
+	:param (int) namespaces: namespaces per cluster
+	:param (int) workloads: deployments (and as many services) per namespace
+	:return: generator of ("resource", (column values)) and ("edge", (start_uid, end_uid, relation))
+	"""
+	pods = max(1, (total // (clusters * namespaces) - 1 - 2 * workloads) // workloads)
+	n = 0
+	for c in range(clusters):
+		cname = "fake-%d" % c
+		yield "resource", (cname, "Cluster", cname, cname, None, None, None, "/root/", None, None)
+		yield "edge", ("root", cname, "Root<-Cluster")
+		for s in range(namespaces):
+			ns = "ns-%d" % s
+			ns_uid = "%s_%s" % (cname, ns)
+			yield "resource", (ns_uid, "Namespace", ns, cname, ns, None, None, "/root/%s/" % cname, None, None)
+			yield "edge", (cname, ns_uid, "Cluster<-Namespace")
+			ns_path = "/root/%s/%s/" % (cname, ns_uid)
+			for w in range(workloads):
+				app = "app-%d" % w
+				deploy_uid, svc_uid = "%s_deploy-%d" % (ns_uid, w), "%s_svc-%d" % (ns_uid, w)
+				yield "resource", (deploy_uid, "Deployment", "deploy-%d" % w, cname, ns, app, None, ns_path, None, None)
+				yield "resource", (svc_uid, "Service", "svc-%d" % w, cname, ns, app, None, ns_path, None, None)
+				yield "edge", (ns_uid, deploy_uid, "Namespace<-Deployment")
+				yield "edge", (ns_uid, svc_uid, "Namespace<-Service")
+				for p in range(pods):
+					n += 1
+					pod_uid = "%s_pod-%d" % (deploy_uid, p)
+					unhealthy = n % 1000 == 0
+					yield "resource", (pod_uid, "Pod", "deploy-%d-pod-%d" % (w, p), cname, ns, app, None, ns_path + deploy_uid + "/",
+										1 if unhealthy else 0, "CrashLoopBackOff" if unhealthy else None)
+					yield "edge", (deploy_uid, pod_uid, "Deployment<-Pod")
+					yield "edge", (svc_uid, pod_uid, "Service<-Pod")
+
+def wide_namespace(cname: str, size: int):
+	"""
+	Yields a namespace with size deployments, each with one pod, so that every row of its table has children.
+	:param (str) cname: cluster to put it in
+	:param (int) size: rows of the namespace's table
+	:return: generator of rows, like generate()
+	"""
+	ns = "wide-%d" % size
+	ns_uid = "%s_%s" % (cname, ns)
+	ns_path = "/root/%s/%s/" % (cname, ns_uid)
+	yield "resource", (ns_uid, "Namespace", ns, cname, ns, None, None, "/root/%s/" % cname, None, None)
+	yield "edge", (cname, ns_uid, "Cluster<-Namespace")
+	for w in range(size):
+		deploy_uid = "%s_deploy-%d" % (ns_uid, w)
+		yield "resource", (deploy_uid, "Deployment", "deploy-%d" % w, cname, ns, None, None, ns_path, None, None)
+		yield "edge", (ns_uid, deploy_uid, "Namespace<-Deployment")
+		yield "resource", (deploy_uid + "_pod", "Pod", "deploy-%d-pod" % w, cname, ns, None, None, ns_path + deploy_uid + "/", 0, None)
+		yield "edge", (deploy_uid, deploy_uid + "_pod", "Deployment<-Pod")
+
+def per_row_has_children(table):
+	"""
+	has_children() the way it used to be, one query per row.
+	"""
+	from app import db
+	from app.models import Edge
+	return [ db.session.query(Edge).filter(Edge.start_uid == t_item.uid).first() is not None for t_item in table ]
+
+def fill(db, rows) -> int:
+	"""
+	Inserts generated rows straight through the db's sqlite connection, in batches.
+	:param db: the webserver's flask-sqlalchemy db
+	:param rows: as yielded by generate()
+	:return: (int) number of resources inserted
+	"""
+	connection = db.engine.raw_connection()
+	insert = { "resource": "INSERT INTO resource (uid, rtype, name, cluster, namespace, application, app_path, cluster_path, "
+								"sev_measure, sev_reason) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+				"edge": "INSERT INTO edge (start_uid, end_uid, relation) VALUES (?, ?, ?)" }
+	batches = { "resource": [], "edge": [] }
+	n_resources = 0
+	for table, values in rows:
+		batches[table].append(values)
+		n_resources += table == "resource"
+		if len(batches[table]) >= 10000:
+			connection.executemany(insert[table], batches[table])
+			batches[table] = []
+	for table, batch in batches.items():
+		connection.executemany(insert[table], batch)
+	connection.commit()
+	connection.close()
+	return n_resources
+
+def drop_indexes(db) -> None:
+	"""
+	Drops the indexes of the webserver's tables. Going back to a revision from before the indexes would drop
+	columns the models select as well.
+	:param db: the webserver's flask-sqlalchemy db
+	"""
+	from app.models import Resource, Edge
+	for table in (Resource.__table__, Edge.__table__):
+		for index in table.indexes:
+			index.drop(db.engine)
+
+def create_indexes(db) -> None:
+	"""
+	Creates the indexes dropped by drop_indexes() again.
+	:param db: the webserver's flask-sqlalchemy db
+	"""
+	from app.models import Resource, Edge
+	for table in (Resource.__table__, Edge.__table__):
+		for index in table.indexes:
+			index.create(db.engine)
+
+def time_paths(client, paths, repeat: int):
+	"""
+	:return: (Dict[str, float]) path : median seconds of repeat GETs
+	"""
+	timings = {}
+	for path in paths:
+		seconds = []
+		for _ in range(repeat):
+			start = time.time()
+			response = client.get(path)
+			seconds.append(time.time() - start)
+			assert response.status_code == 200, (path, response.status_code)
+		timings[path] = statistics.median(seconds)
+	return timings
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the webserver's reads with and without indexes, and has_children() against table size.")
+	parser.add_argument("--resources", type=int, default=1000000, help="resources in the generated db, roughly")
+	parser.add_argument("--clusters", type=int, default=10)
+	parser.add_argument("--namespaces", type=int, default=50, help="namespaces per cluster")
+	parser.add_argument("--workloads", type=int, default=10, help="deployments (and as many services) per namespace")
+	parser.add_argument("--repeat", type=int, default=5, help="requests per path, the median is reported")
+	parser.add_argument("--table-sizes", default="100,1000,3000,10000", help="rows of the namespaces opened to time has_children()")
+	parser.add_argument("--db", help="sqlite file to generate the db in, defaults to a temporary file")
+	args = parser.parse_args()
+
+	# the webserver finds the backend relative to its own directory, and reads the db path from its config
+	os.chdir(WEBSERVER)
+	sys.path.insert(0, WEBSERVER)
+	db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+	from config import Config
+	Config.SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.abspath(db_path)
+	from app import app, db
+
+	start = time.time()
+	n_resources = fill(db, generate(args.resources, args.clusters, args.namespaces, args.workloads))
+	print("Generated %d resources in %s in %.1f secs." % (n_resources, db_path, time.time() - start))
+
+	paths = [ "/start/cluster", "/mode/cluster/fake-0", "/mode/cluster/fake-0_ns-0", "/mode/cluster/fake-0_ns-0_deploy-0",
+				"/errors", "/search/cluster:fake-1 ns:ns-2", "/search/app:app-3 kind:pod", "/search/ns:ns-4 pod-7" ]
+	client = app.test_client()
+	with app.app_context():
+		drop_indexes(db)
+		before = time_paths(client, paths, args.repeat)
+		create_indexes(db)
+		after = time_paths(client, paths, args.repeat)
+
+	print("%-45s %12s %12s" % ("GET", "no indexes", "indexes"))
+	for path in paths:
+		print("%-45s %10.3f s %10.3f s" % (path, before[path], after[path]))
+
+	from app import routes
+	sizes = [ int(size) for size in args.table_sizes.split(",") ]
+	for size in sizes:
+		fill(db, wide_namespace("fake-0", size))
+	paths = [ "/mode/cluster/fake-0_wide-%d" % size for size in sizes ]
+	set_based = routes.has_children
+	with app.app_context():
+		routes.has_children = per_row_has_children
+		before = time_paths(client, paths, args.repeat)
+		routes.has_children = set_based
+		after = time_paths(client, paths, args.repeat)
+
+	print("\n%-45s %12s %12s" % ("GET", "per row", "per table"))
+	for path in paths:
+		print("%-45s %10.3f s %10.3f s" % (path, before[path], after[path]))
+
+if __name__ == "__main__":
+	try:
+		main()
+	except KeyboardInterrupt:
+		sys.exit(0)
@@ -0,0 +1,472 @@
+import argparse, json, os, re, sys, time, uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# A stand-in for the api servers of many clusters, for benchmarking the crawler, get_unhealthy_pods() and the webserver
+# without live clusters. Every cluster is served under its own path prefix (http://<host>:<port>/clusters/<name>),
+# which fake_kubeconfig.py points a context at. The objects are either generated (see SyntheticCluster) or replayed
+# from json files written by the "record" command (see RecordedCluster).
+#
+# Usage:	python fake_apiserver.py serve --clusters 50 --namespaces 200 --pods 10000 --latency 20
+#			python fake_apiserver.py record recorded/		(lists every cluster of your kube-config)
+#			python fake_apiserver.py serve --replay recorded/
+
+# (api group path, plural) : (kind, whether it is namespaced) of every list the fake api servers answer
+KINDS = { ("api/v1", "namespaces"): ("Namespace", False),
+			("api/v1", "pods"): ("Pod", True),
+			("api/v1", "services"): ("Service", True),
+			("apis/apps/v1", "deployments"): ("Deployment", True),
+			("apis/apps/v1", "replicasets"): ("ReplicaSet", True),
+			("apis/apps/v1", "daemonsets"): ("DaemonSet", True),
+			("apis/apps/v1", "statefulsets"): ("StatefulSet", True),
+			("apis/app.k8s.io/v1beta1", "applications"): ("Application", True),
+			("apis/mcm.ibm.com/v1alpha1", "deployables"): ("Deployable", True),
+			("apis/clusterregistry.k8s.io/v1alpha1", "clusters"): ("Cluster", True),
+			("apis/metrics.k8s.io/v1beta1", "pods"): ("PodMetrics", True) }
+
+# <api group path>[/namespaces/<namespace>]/<plural>[/<name>], after the /clusters/<name> prefix
+PATH_PATTERN = re.compile(r"^/(api/v1|apis/[^/]+/[^/]+)(?:/namespaces/([^/]+))?/([^/]+)(?:/([^/]+))?$")
+
+CREATED = "2019-06-01T00:00:00Z"
+
+class SyntheticCluster:
+	"""
+	Generates the objects of one cluster on demand, so that clusters with many pods don't have to be held in memory.
+	Every namespace has the same number of deployments, each with one replicaset, a service selecting its pods,
+	and an even share of the cluster's pods. Every namespace also has one daemonset and one statefulset (without pods),
+	and the first namespace has the applications, whose deployables deploy the first deployments, one each.
+	Objects are numbered, and the objects of a namespace have consecutive numbers. Names of deployments, applications
+	and deployables carry the number of the cluster, since deployables are matched to what they deploy by name
+	across clusters and two of them deploying the same deployment would rewrite its app_path every round.
+	"""
+
+	def __init__(self, name: str, index: int, namespaces: int, deployments: int, pods: int, apps: int,
+					deployables: int, unhealthy: float, mcm_hub: bool, cluster_addresses: Dict[str, str]):
+		"""
+		:param (str) name: cluster name
+		:param (int) index: number of the cluster, used to make uids, and the names of applications and deployables, unique across clusters
+		:param (int) namespaces: number of namespaces
+		:param (int) deployments: number of deployments (and services) per namespace
+		:param (int) pods: number of pods in the cluster
+		:param (int) apps: number of applications
+		:param (int) deployables: number of deployables per application
+		:param (float) unhealthy: fraction of pods that are crash looping
+		:param (bool) mcm_hub: whether the cluster has the MCM cluster objects of every cluster
+		:param (Dict[str, str]) cluster_addresses: cluster name : server address, of every cluster
+		"""
+		self.name = name
+		self.index = index
+		self.namespaces = namespaces
+		self.deployments = deployments
+		self.pods_per_deploy = -(-pods // max(1, namespaces * deployments))
+		self.pods = pods
+		self.apps = apps
+		self.deployables = min(deployables, deployments)
+		self.unhealthy = unhealthy
+		self.cluster_addresses = cluster_addresses if mcm_hub else {}
+
+		# kind : (number of objects per namespace, total number of objects, function making object i)
+		self.layout = { "Namespace": (1, namespaces, self.namespace),
+						"Deployment": (deployments, namespaces * deployments, self.deployment),
+						"ReplicaSet": (deployments, namespaces * deployments, self.replica_set),
+						"Service": (deployments, namespaces * deployments, self.service),
+						"DaemonSet": (1, namespaces, self.daemon_set),
+						"StatefulSet": (1, namespaces, self.stateful_set),
+						"Pod": (deployments * self.pods_per_deploy, pods, self.pod),
+						"PodMetrics": (deployments * self.pods_per_deploy, pods, self.pod_metrics),
+						"Application": (apps, apps, self.application),
+						"Deployable": (apps * self.deployables, apps * self.deployables, self.deployable),
+						"Cluster": (len(self.cluster_addresses), len(self.cluster_addresses), self.mcm_cluster) }
+
+	def objects(self, kind: str, namespace: str = None):
+		"""
+		:param (str) kind
+		:param (str) namespace: namespace to list, or None for every namespace
+		:return: (LazyObjects) the objects of the given kind
+		"""
+		per_ns, total, make = self.layout[kind]
+		if namespace is None:
+			return LazyObjects(range(total), make)
+		ns = self.namespace_number(namespace)
+		if ns is None:
+			return []
+		# applications, deployables and mcm clusters all live in the first namespace
+		if kind in ("Application", "Deployable", "Cluster"):
+			return LazyObjects(range(total), make) if ns == 0 else []
+		return LazyObjects(range(min(ns * per_ns, total), min((ns + 1) * per_ns, total)), make)
+
+	def namespace_number(self, namespace: str) -> int:
+		"""
+		:param (str) namespace: namespace name
+		:return: (int) number of the namespace, or None if there is no such namespace
+		"""
+		match = re.match(r"^ns-(\d+)$", namespace)
+		if match is None or int(match.group(1)) >= self.namespaces:
+			return None
+		return int(match.group(1))
+
+	def uid(self, kind: str, i: int) -> str:
+		return str(uuid.UUID(int=(self.index << 96) | (hash_kind(kind) << 64) | i))
+
+	def metadata(self, kind: str, i: int, name: str, namespace: str = None, **fields) -> Dict:
+		md = { "name": name, "uid": self.uid(kind, i), "resourceVersion": "1", "creationTimestamp": CREATED }
+		if namespace is not None:
+			md["namespace"] = namespace
+		md.update(fields)
+		return md
+
+	def namespace(self, i: int) -> Dict:
+		return { "apiVersion": "v1", "kind": "Namespace", "metadata": self.metadata("Namespace", i, "ns-%d" % i),
+					"status": { "phase": "Active" } }
+
+	def deploy_name(self, d: int) -> str:
+		return "c%d-deploy-%d" % (self.index, d)
+
+	def app_name(self, a: int) -> str:
+		return "c%d-app-%d" % (self.index, a)
+
+	def deployable_name(self, a: int, d: int) -> str:
+		return "c%d-dpb-%d-%d" % (self.index, a, d)
+
+	def pod_template(self, labels: Dict[str, str]) -> Dict:
+		return { "metadata": { "labels": labels }, "spec": { "containers": [ { "name": "main", "image": "busybox" } ] } }
+
+	def deployment(self, d: int) -> Dict:
+		labels = { "app": self.deploy_name(d) }
+		return { "apiVersion": "apps/v1", "kind": "Deployment",
+					"metadata": self.metadata("Deployment", d, self.deploy_name(d), "ns-%d" % (d // self.deployments), labels=labels),
+					"spec": { "replicas": self.pods_per_deploy, "selector": { "matchLabels": labels }, "template": self.pod_template(labels) },
+					"status": { "replicas": self.pods_per_deploy, "readyReplicas": self.pods_per_deploy } }
+
+	def replica_set(self, d: int) -> Dict:
+		labels = { "app": self.deploy_name(d) }
+		owner = { "apiVersion": "apps/v1", "kind": "Deployment", "name": self.deploy_name(d), "uid": self.uid("Deployment", d), "controller": True }
+		return { "apiVersion": "apps/v1", "kind": "ReplicaSet",
+					"metadata": self.metadata("ReplicaSet", d, self.deploy_name(d) + "-5d8f7c", "ns-%d" % (d // self.deployments),
+												labels=labels, ownerReferences=[ owner ]),
+					"spec": { "replicas": self.pods_per_deploy, "selector": { "matchLabels": labels }, "template": self.pod_template(labels) } }
+
+	def service(self, d: int) -> Dict:
+		return { "apiVersion": "v1", "kind": "Service",
+					"metadata": self.metadata("Service", d, "svc-%d" % d, "ns-%d" % (d // self.deployments)),
+					"spec": { "selector": { "app": self.deploy_name(d) }, "ports": [ { "port": 80, "protocol": "TCP" } ], "type": "ClusterIP" } }
+
+	def daemon_set(self, i: int) -> Dict:
+		labels = { "app": "dset-%d" % i }
+		return { "apiVersion": "apps/v1", "kind": "DaemonSet", "metadata": self.metadata("DaemonSet", i, "dset-%d" % i, "ns-%d" % i),
+					"spec": { "selector": { "matchLabels": labels }, "template": self.pod_template(labels) } }
+
+	def stateful_set(self, i: int) -> Dict:
+		labels = { "app": "sset-%d" % i }
+		return { "apiVersion": "apps/v1", "kind": "StatefulSet", "metadata": self.metadata("StatefulSet", i, "sset-%d" % i, "ns-%d" % i),
+					"spec": { "selector": { "matchLabels": labels }, "serviceName": "sset-%d" % i, "template": self.pod_template(labels) } }
+
+	def pod(self, i: int) -> Dict:
+		d = i // self.pods_per_deploy
+		owner = { "apiVersion": "apps/v1", "kind": "ReplicaSet", "name": self.deploy_name(d) + "-5d8f7c",
+					"uid": self.uid("ReplicaSet", d), "controller": True }
+		# spread the unhealthy pods evenly instead of bunching them up in the first namespaces
+		if (i * 7919) % 10000 < self.unhealthy * 10000:
+			state, ready, restarts = { "waiting": { "reason": "CrashLoopBackOff", "message": "back-off restarting failed container" } }, False, 5
+		else:
+			state, ready, restarts = { "running": { "startedAt": CREATED } }, True, 0
+		return { "apiVersion": "v1", "kind": "Pod",
+					"metadata": self.metadata("Pod", i, "%s-5d8f7c-%d" % (self.deploy_name(d), i), "ns-%d" % (d // self.deployments),
+												labels={ "app": self.deploy_name(d) }, ownerReferences=[ owner ]),
+					"spec": { "containers": [ { "name": "main", "image": "busybox" } ], "nodeName": "node-%d" % (i % 16) },
+					"status": { "phase": "Running", "startTime": CREATED,
+								"containerStatuses": [ { "name": "main", "image": "busybox", "imageID": "docker://busybox", "ready": ready,
+														"restartCount": restarts, "state": state } ] } }
+
+	def pod_metrics(self, i: int) -> Dict:
+		pod = self.pod(i)
+		return { "apiVersion": "metrics.k8s.io/v1beta1", "kind": "PodMetrics",
+					"metadata": { "name": pod["metadata"]["name"], "namespace": pod["metadata"]["namespace"], "creationTimestamp": CREATED },
+					"timestamp": CREATED, "window": "30s",
+					"containers": [ { "name": "main", "usage": { "cpu": "%dm" % (1 + i % 50), "memory": "%dMi" % (16 + i % 64) } } ] }
+
+	def application(self, a: int) -> Dict:
+		dpb_names = ",".join(self.deployable_name(a, d) for d in range(self.deployables))
+		return { "apiVersion": "app.k8s.io/v1beta1", "kind": "Application",
+					"metadata": self.metadata("Application", a, self.app_name(a), "ns-0", annotations={ "apps.ibm.com/deployables": dpb_names }),
+					"spec": { "selector": { "matchLabels": { "app": self.app_name(a) } } } }
+
+	def deployable(self, i: int) -> Dict:
+		a, d = divmod(i, self.deployables)
+		template = self.deployment(i % max(1, self.namespaces * self.deployments))
+		deployer = { "kind": "Deployment", "kube": { "namespace": template["metadata"]["namespace"], "template": template } }
+		return { "apiVersion": "mcm.ibm.com/v1alpha1", "kind": "Deployable",
+					"metadata": self.metadata("Deployable", i, self.deployable_name(a, d), "ns-0", labels={ "app": self.app_name(a) }),
+					"spec": { "deployer": deployer } }
+
+	def mcm_cluster(self, i: int) -> Dict:
+		name, address = sorted(self.cluster_addresses.items())[i]
+		return { "apiVersion": "clusterregistry.k8s.io/v1alpha1", "kind": "Cluster",
+					"metadata": self.metadata("Cluster", i, name, "ns-0"),
+					"spec": { "kubernetesApiEndpoints": { "serverEndpoints": [ { "clientCIDR": "0.0.0.0/0", "serverAddress": address } ] } } }
+
+class RecordedCluster:
+	"""
+	Serves the objects of one cluster as they were recorded by the "record" command.
+	"""
+
+	def __init__(self, name: str, recorded: Dict[str, List[Dict]]):
+		"""
+		:param (str) name: cluster name
+		:param (Dict[str, List[Dict]]) recorded: kind : objects
+		"""
+		self.name = name
+		self.recorded = recorded
+		self.cluster_addresses = {}
+
+	def objects(self, kind: str, namespace: str = None) -> List[Dict]:
+		"""
+		:param (str) kind
+		:param (str) namespace: namespace to list, or None for every namespace
+		:return: (List[Dict]) the objects of the given kind
+		"""
+		objects = self.recorded.get(kind, [])
+		if namespace is None:
+			return objects
+		return [ obj for obj in objects if obj["metadata"].get("namespace") == namespace ]
+
+class LazyObjects:
+	"""
+	Sequence of generated objects, made when they are looked at.
+	"""
+
+	def __init__(self, numbers: range, make):
+		self.numbers = numbers
+		self.make = make
+
+	def __len__(self) -> int:
+		return len(self.numbers)
+
+	def __getitem__(self, i: int) -> Dict:
+		return self.make(self.numbers[i])
+
+def hash_kind(kind: str) -> int:
+	"""
+	:return: (int) 32-bit number standing for the kind in generated uids
+	"""
+	return sum(ord(c) * 31 ** i for i, c in enumerate(kind)) & 0xffffffff
+
+def matches(obj: Dict, field_selector: str, label_selector: str) -> bool:
+	"""
+	Checks an object against the equality-based field and label selectors the backend uses.
+	:param (Dict) obj
+	:param (str) field_selector: e.g. "metadata.name=foo", or None
+	:param (str) label_selector: e.g. "app=foo,tier=web", or None
+	:return: (bool) whether the object is selected
+	"""
+	for requirement in (field_selector or "").split(","):
+		if "=" in requirement:
+			path, value = re.split(r"==?", requirement, maxsplit=1)
+			field = obj
+			for key in path.split("."):
+				field = field.get(key, {}) if isinstance(field, dict) else {}
+			if field != value:
+				return False
+	labels = obj["metadata"].get("labels") or {}
+	for requirement in (label_selector or "").split(","):
+		if "!=" in requirement:
+			key, value = requirement.split("!=", 1)
+			if labels.get(key) == value:
+				return False
+		elif "=" in requirement:
+			key, value = re.split(r"==?", requirement, maxsplit=1)
+			if labels.get(key) != value:
+				return False
+		elif requirement and requirement not in labels:
+			return False
+	return True
+
+def list_page(objects, query: Dict[str, str]) -> Tuple[List[Dict], str]:
+	"""
+	Picks the page of objects a list request asks for, following limit and continue.
+	:param objects: sequence of objects
+	:param (Dict[str, str]) query: query parameters of the request
+	:return: ((List[Dict]) objects of the page, (str) continue token of the next page, or "" if this is the last one)
+	"""
+	start = int(query.get("continue") or 0)
+	limit = int(query.get("limit") or 0)
+	page = []
+	i = start
+	while i < len(objects) and (limit == 0 or len(page) < limit):
+		obj = objects[i]
+		if matches(obj, query.get("fieldSelector"), query.get("labelSelector")):
+			page.append(obj)
+		i += 1
+	return page, (str(i) if i < len(objects) else "")
+
+def make_handler(clusters: Dict, latency: float, address: str):
+	"""
+	:param (Dict) clusters: cluster name : SyntheticCluster or RecordedCluster
+	:param (float) latency: seconds every request takes at least
+	:param (str) address: host:port the server is reachable at
+	:return: request handler class serving the clusters
+	"""
+
+	class FakeApiHandler(BaseHTTPRequestHandler):
+		protocol_version = "HTTP/1.1"
+
+		def do_GET(self):
+			time.sleep(latency)
+			url = urlparse(self.path)
+			query = { key: values[-1] for key, values in parse_qs(url.query).items() }
+			match = re.match(r"^/clusters/([^/]+)(/.*)$", url.path)
+			if match is None or match.group(1) not in clusters:
+				return self.respond(404, status(404, "NotFound", "no such cluster"))
+			cluster, path = clusters[match.group(1)], match.group(2)
+
+			if path == "/api":
+				return self.respond(200, { "kind": "APIVersions", "versions": [ "v1" ],
+											"serverAddressByClientCIDRs": [ { "clientCIDR": "0.0.0.0/0",
+																			"serverAddress": address + "/clusters/" + cluster.name } ] })
+			if query.get("watch") in ("true", "1"):
+				return self.respond(405, status(405, "MethodNotAllowed", "the fake api server doesn't support watches"))
+
+			match = PATH_PATTERN.match(path)
+			if match is None or (match.group(1), match.group(3)) not in KINDS:
+				return self.respond(404, status(404, "NotFound", "the server could not find the requested resource"))
+			group, namespace, plural, name = match.groups()
+			kind, _ = KINDS[(group, plural)]
+			objects = cluster.objects(kind, namespace)
+
+			# get a single object by name
+			if name is not None:
+				for obj in list_page(objects, { "fieldSelector": "metadata.name=" + name })[0]:
+					return self.respond(200, obj)
+				return self.respond(404, status(404, "NotFound", '{} "{}" not found'.format(plural, name)))
+
+			page, _continue = list_page(objects, query)
+			self.respond(200, { "apiVersion": "v1" if group == "api/v1" else group[len("apis/"):], "kind": kind + "List",
+								"metadata": { "resourceVersion": "1", "continue": _continue }, "items": page })
+
+		def respond(self, code: int, body: Dict) -> None:
+			data = json.dumps(body).encode()
+			self.send_response(code)
+			self.send_header("Content-Type", "application/json")
+			self.send_header("Content-Length", str(len(data)))
+			self.end_headers()
+			self.wfile.write(data)
+
+		def log_message(self, format, *args):
+			pass	# a crawl makes thousands of requests
+
+	return FakeApiHandler
+
+def status(code: int, reason: str, message: str) -> Dict:
+	"""
+	:return: (Dict) k8s Status object for an error response
+	"""
+	return { "kind": "Status", "apiVersion": "v1", "metadata": {}, "status": "Failure", "message": message, "reason": reason, "code": code }
+
+def synthetic_clusters(args, address: str) -> Dict[str, SyntheticCluster]:
+	"""
+	:param args: parsed command line arguments of the serve command
+	:param (str) address: host:port the server is reachable at
+	:return: (Dict[str, SyntheticCluster]) cluster name : generated cluster
+	"""
+	names = [ "fake-%d" % i for i in range(args.clusters) ]
+	addresses = { name: address + "/clusters/" + name for name in names }
+	return { name: SyntheticCluster(name, i, args.namespaces, args.deployments, args.pods, args.apps,
+									args.deployables, args.unhealthy, i == 0, addresses)
+				for i, name in enumerate(names) }
+
+def recorded_clusters(directory: str) -> Dict[str, RecordedCluster]:
+	"""
+	:param (str) directory: directory the record command wrote to
+	:return: (Dict[str, RecordedCluster]) cluster name : recorded cluster
+	"""
+	clusters = {}
+	for file_name in sorted(os.listdir(directory)):
+		if file_name.endswith(".json"):
+			with open(os.path.join(directory, file_name)) as f:
+				name = file_name[:-len(".json")]
+				clusters[name] = RecordedCluster(name, json.load(f))
+	return clusters
+
+def record(directory: str) -> None:
+	"""
+	Lists every kind the fake api server serves in every cluster of the kube-config,
+	and writes them to <directory>/<cluster name>.json for the serve command to replay.
+	:param (str) directory
+	"""
+	sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+	import k8s_api, k8s_config
+
+	k8s_config.load_kube_config()
+	os.makedirs(directory, exist_ok=True)
+	for cname in k8s_config.update_available_clusters():
+		api_client = k8s_api.api_client(cname, "CoreV1Api").api_client
+		recorded = {}
+		for (group, plural), (kind, _) in KINDS.items():
+			objects = []
+			_continue = ""
+			while True:
+				try:
+					data = api_client.call_api("/{}/{}".format(group, plural), "GET", {}, [ ("limit", 500), ("continue", _continue) ],
+												{ "Accept": "application/json" }, auth_settings=[ "BearerToken" ],
+												_preload_content=False, _return_http_data_only=True).data
+				except Exception as e:
+					print("Could not record", plural, "in cluster", cname + ":", repr(e))
+					break
+				result = json.loads(data)
+				objects += result.get("items") or []
+				_continue = result.get("metadata", {}).get("continue")
+				if not _continue:
+					break
+			recorded[kind] = objects
+		with open(os.path.join(directory, cname + ".json"), "w") as f:
+			json.dump(recorded, f)
+		print("Recorded cluster", cname, "with", sum(len(objects) for objects in recorded.values()), "objects.")
+
+def serve(args) -> None:
+	"""
+	Serves generated or recorded clusters until interrupted.
+	:param args: parsed command line arguments of the serve command
+	"""
+
+	class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+		daemon_threads = True
+
+	address = "{}:{}".format(args.host, args.port)
+	clusters = recorded_clusters(args.replay) if args.replay else synthetic_clusters(args, address)
+	server = ThreadingHTTPServer((args.host, args.port), make_handler(clusters, args.latency / 1000, address))
+	print("Serving %d clusters on http://%s/clusters/<cluster name>" % (len(clusters), address))
+	server.serve_forever()
+
+def main():
+	parser = argparse.ArgumentParser(description="Fake k8s api servers for benchmarking skipper.")
+	commands = parser.add_subparsers(dest="command")
+	serve_parser = commands.add_parser("serve", help="serve generated clusters, or recorded ones with --replay")
+	serve_parser.add_argument("--host", default="127.0.0.1")
+	serve_parser.add_argument("--port", type=int, default=8001)
+	serve_parser.add_argument("--latency", type=float, default=0, help="milliseconds every request takes at least")
+	serve_parser.add_argument("--replay", help="directory written by the record command, instead of generating clusters")
+	serve_parser.add_argument("--clusters", type=int, default=3, help="number of clusters")
+	serve_parser.add_argument("--namespaces", type=int, default=20, help="namespaces per cluster")
+	serve_parser.add_argument("--deployments", type=int, default=5, help="deployments (and services) per namespace")
+	serve_parser.add_argument("--pods", type=int, default=1000, help="pods per cluster")
+	serve_parser.add_argument("--apps", type=int, default=2, help="applications per cluster")
+	serve_parser.add_argument("--deployables", type=int, default=3, help="deployables per application")
+	serve_parser.add_argument("--unhealthy", type=float, default=0.01, help="fraction of pods that are crash looping")
+	record_parser = commands.add_parser("record", help="record the clusters of your kube-config for --replay")
+	record_parser.add_argument("directory")
+	args = parser.parse_args()
+
+	if args.command == "record":
+		record(args.directory)
+	elif args.command == "serve":
+		serve(args)
+	else:
+		parser.print_help()
+
+if __name__ == "__main__":
+	try:
+		main()
+	except KeyboardInterrupt:
+		sys.exit(0)
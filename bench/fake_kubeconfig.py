@@ -0,0 +1,42 @@
+import argparse, os, sys, yaml
+from typing import Dict
+
+# Writes a kube-config with one context per cluster served by fake_apiserver.py.
+#
+# Usage:	python fake_kubeconfig.py --clusters 50 --output fake-kubeconfig
+#			export KUBECONFIG=$PWD/fake-kubeconfig
+
+def fake_kubeconfig(cluster_names, server: str) -> Dict:
+	"""
+	:param cluster_names: names of the clusters the fake api server serves
+	:param (str) server: url of the fake api server, e.g. http://127.0.0.1:8001
+	:return: (Dict) kube-config
+	"""
+	return { "apiVersion": "v1", "kind": "Config", "preferences": {},
+				"clusters": [ { "name": name, "cluster": { "server": "{}/clusters/{}".format(server, name) } } for name in cluster_names ],
+				"users": [ { "name": "fake-user", "user": { "token": "fake-token" } } ],
+				"contexts": [ { "name": name, "context": { "cluster": name, "user": "fake-user", "namespace": "default" } }
+								for name in cluster_names ],
+				"current-context": cluster_names[0] if len(cluster_names) > 0 else "" }
+
+def main():
+	parser = argparse.ArgumentParser(description="Writes a kube-config pointing at fake_apiserver.py.")
+	parser.add_argument("--server", default="http://127.0.0.1:8001", help="url of the fake api server")
+	parser.add_argument("--clusters", type=int, default=3, help="number of generated clusters, as passed to fake_apiserver.py serve")
+	parser.add_argument("--replay", help="directory written by fake_apiserver.py record, to use its cluster names instead")
+	parser.add_argument("--output", default="fake-kubeconfig", help="file to write the kube-config to")
+	args = parser.parse_args()
+
+	if args.replay:
+		cluster_names = sorted(name[:-len(".json")] for name in os.listdir(args.replay) if name.endswith(".json"))
+	else:
+		cluster_names = [ "fake-%d" % i for i in range(args.clusters) ]
+	with open(args.output, "w") as f:
+		yaml.dump(fake_kubeconfig(cluster_names, args.server), f, sort_keys=False)
+	print("Wrote a kube-config for %d clusters to %s, use it with: export KUBECONFIG=%s" % (len(cluster_names), args.output, os.path.abspath(args.output)))
+
+if __name__ == "__main__":
+	try:
+		main()
+	except KeyboardInterrupt:
+		sys.exit(0)
@@ -0,0 +1,194 @@
+import collections, json, requests, threading, time
+from typing import Dict, List, Tuple
+from instrumentation import REGISTRY
+
+FLUSH_DURATION = REGISTRY.histogram("skipper_bulk_flush_duration_seconds", "Time the webserver takes to write a bulk request to the db.")
+FLUSHED_ITEMS = REGISTRY.counter("skipper_bulk_items_total", "Items sent to the webserver's /bulk endpoint.", [ "type" ])
+FLUSH_FAILURES = REGISTRY.counter("skipper_bulk_failures_total", "Bulk requests that didn't make it into the db.")
+
+class BulkWriter:
+	"""
+	Buffers resource and edge writes and sends them to the webserver's /bulk endpoint in chunks,
+	instead of making one http request (and one db commit) per resource or edge.
+	Safe to share between threads; items are sent in the order they were added.
+	"""
+
+	def __init__(self, url: str, chunk_size: int):
+		"""
+		:param (str) url: url of the webserver's /bulk endpoint
+		:param (int) chunk_size: number of buffered items that triggers a flush
+		"""
+		self.url = url
+		self.chunk_size = chunk_size
+		self.items = []
+		self.lock = threading.Lock()		# guards items and failures
+		self.flush_lock = threading.Lock()	# keeps flushes (and so items) in order
+		self.failures = 0					# flushes that didn't make it into the db
+
+	def add(self, item: Dict) -> None:
+		"""
+		Queues an item for the /bulk endpoint, flushing if the buffer is full.
+		:param (Dict) item: {"type": ..., "data": {...}}, as the /bulk endpoint takes them
+		"""
+		with self.lock:
+			self.items.append(item)
+			full = len(self.items) >= self.chunk_size
+		if full:
+			self.flush()
+
+	def add_resource(self, data: Dict) -> None:
+		"""
+		Queues a resource to be added or updated.
+		:param (Dict) data: same data that POST /resource/<uid> takes, including the uid
+		"""
+		self.add({"type": "resource", "data": data})
+
+	def add_edge(self, data: Dict) -> None:
+		"""
+		Queues an edge to be added.
+		:param (Dict) data: same data that POST /edge/<start_uid>/<end_uid> takes
+		"""
+		self.add({"type": "edge", "data": data})
+
+	def delete_resource(self, uid: str) -> None:
+		"""
+		Queues a resource and the edges touching it to be removed. Unlike DELETE /resource/<uid>,
+		descendants are left alone.
+		:param (str) uid: skipper uid of the resource
+		"""
+		self.add({"type": "delete", "data": {"uid": uid}})
+
+	def delete_edges(self, edges: List[Tuple[str, str, str]]) -> None:
+		"""
+		Queues edges to be removed, leaving the resources at either end alone.
+		:param (List[Tuple[str, str, str]]) edges: (start_uid, end_uid, relation) of each edge
+		"""
+		if len(edges) > 0:
+			self.add({"type": "delete_edges", "data": {"edges": edges}})
+
+	def touch_resources(self, uids: List[str], generation: int) -> None:
+		"""
+		Queues marking resources as seen in a crawl generation, so that sweeps of that generation keep them.
+		:param (List[str]) uids: skipper uids of the resources
+		:param (int) generation: crawl generation
+		"""
+		if len(uids) > 0:
+			self.add({"type": "touch", "data": {"uids": uids, "generation": generation}})
+
+	def touch_edges(self, edges: List[Tuple[str, str, str]], generation: int) -> None:
+		"""
+		Queues marking edges as seen in a crawl generation, so that edge sweeps of that generation keep them.
+		Edges that aren't in the db are added, so there is no need to add_edge() them as well.
+		:param (List[Tuple[str, str, str]]) edges: (start_uid, end_uid, relation) of each edge
+		:param (int) generation: crawl generation
+		"""
+		if len(edges) > 0:
+			self.add({"type": "touch_edges", "data": {"edges": edges, "generation": generation}})
+
+	def sweep_resources(self, generation: int, rtypes: List[str], clusters: List[str] = None, except_clusters: List[str] = None) -> None:
+		"""
+		Queues the removal of the resources of the given rtypes that weren't touched in a crawl generation,
+		along with their descendants that weren't touched either, and every edge touching them.
+		:param (int) generation: crawl generation
+		:param (List[str]) rtypes: rtypes to sweep
+		:param (List[str]) clusters: only sweep resources in these clusters, defaults to all clusters
+		:param (List[str]) except_clusters: don't sweep resources in these clusters
+		"""
+		self.add({"type": "sweep", "data": {"generation": generation, "rtypes": rtypes,
+											"clusters": clusters, "except_clusters": except_clusters}})
+
+	def sweep_edges(self, generation: int, relations: List[str], clusters: List[str] = None) -> None:
+		"""
+		Queues the removal of the edges of the given relations that weren't touched in a crawl generation.
+		:param (int) generation: crawl generation
+		:param (List[str]) relations: relations to sweep, e.g. "Namespace<-Deployment"
+		:param (List[str]) clusters: only sweep edges to resources in these clusters, defaults to all clusters
+		"""
+		self.add({"type": "sweep_edges", "data": {"generation": generation, "relations": relations, "clusters": clusters}})
+
+	def flush(self) -> None:
+		"""
+		Sends all buffered items to the webserver as newline-delimited json.
+		"""
+		with self.flush_lock:
+			with self.lock:
+				items, self.items = self.items, []
+			if len(items) == 0:
+				return
+
+			body = "\n".join(json.dumps(item, default=str) for item in items)
+			self.send(body, collections.Counter(item["type"] for item in items))
+
+	def send(self, body: str, counts: Dict[str, int]) -> None:
+		"""
+		Posts already serialized items to the /bulk endpoint. Call while holding flush_lock.
+		:param (str) body: newline-delimited json items
+		:param (Dict[str, int]) counts: item type : number of items of that type in the body
+		"""
+		for item_type, count in counts.items():
+			FLUSHED_ITEMS.inc(count, type=item_type)
+		try:
+			with FLUSH_DURATION.time():
+				response = requests.post(self.url, data=body, headers={"Content-Type": "application/x-ndjson"})
+		except requests.exceptions.ConnectionError as e:
+			print("Bulk write of", sum(counts.values()), "items failed:", repr(e))
+			self.failed()
+			return
+		if response.status_code != 200:
+			self.failed()
+			print("Bulk write of", sum(counts.values()), "items failed with status", response.status_code)
+
+	def failed(self) -> None:
+		"""
+		Counts a flush that didn't make it into the db.
+		"""
+		with self.lock:
+			self.failures += 1
+		FLUSH_FAILURES.inc()
+
+	def pop_failures(self) -> int:
+		"""
+		:return: (int) number of flushes that didn't make it into the db since the last call
+		"""
+		with self.lock:
+			failures, self.failures = self.failures, 0
+		return failures
+
+	def forward(self, body: str, counts: Dict[str, int]) -> None:
+		"""
+		Posts items serialized by another process (see QueueWriter), in order with this writer's own flushes.
+		:param (str) body: newline-delimited json items
+		:param (Dict[str, int]) counts: item type : number of items of that type in the body
+		"""
+		with self.flush_lock:
+			self.send(body, counts)
+
+	def start_autoflush(self, interval: float) -> None:
+		"""
+		Starts a background thread that flushes the buffer every interval seconds,
+		so that writes trickling in (e.g. from watch events) show up without waiting for a full chunk.
+		:param (float) interval: seconds between flushes
+		"""
+		def autoflush():
+			while True:
+				time.sleep(interval)
+				self.flush()
+		threading.Thread(target=autoflush, name="bulk autoflush", daemon=True).start()
+
+class QueueWriter(BulkWriter):
+	"""
+	BulkWriter for the worker processes of the sharded crawler. Items are serialized in the worker, and each chunk
+	is put on a multiprocessing queue as ("batch", body, counts) instead of being posted, so that a single process
+	(the coordinator, through BulkWriter.forward()) makes every write to the webserver.
+	"""
+
+	def __init__(self, queue, chunk_size: int):
+		"""
+		:param queue: multiprocessing queue read by the coordinator
+		:param (int) chunk_size: number of buffered items that triggers a flush
+		"""
+		super().__init__(None, chunk_size)
+		self.queue = queue
+
+	def send(self, body: str, counts: Dict[str, int]) -> None:
+		self.queue.put(("batch", body, dict(counts)))
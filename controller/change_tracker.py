@@ -0,0 +1,85 @@
+import hashlib, json, threading
+from typing import Dict, Tuple
+
+class ChangeTracker:
+	"""
+	Remembers a fingerprint of what was last written for every resource, so that objects that haven't
+	changed since the last round (same resourceVersion, same parents and paths) can be skipped before
+	they are serialized or sent to the webserver.
+	"""
+
+	def __init__(self):
+		self.fingerprints = {}	# skipper uid : { tag : fingerprint of the last write }
+		self.seen = set()		# skipper uids checked since the last end_round()
+		self.lock = threading.Lock()
+		self.written = 0
+		self.skipped = 0
+
+	def changed(self, uid: str, content, tag: str = "") -> bool:
+		"""
+		Checks a write against the last one made for the same uid and tag, and records it.
+
+		:param (str) uid: skipper uid of the resource being written
+		:param content: json-serializable summary of the write, e.g. (resourceVersion, parent uid)
+		:param (str) tag: tells apart different writes for the same resource, e.g. one edge per parent
+		:return: (bool) True if the write should be made, False if it is the same as last time
+		"""
+		fingerprint = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).digest()
+		with self.lock:
+			self.seen.add(uid)
+			tags = self.fingerprints.setdefault(uid, {})
+			if tags.get(tag) == fingerprint:
+				self.skipped += 1
+				return False
+			tags[tag] = fingerprint
+			self.written += 1
+			return True
+
+	def keep(self, uids) -> None:
+		"""
+		Marks resources as seen without checking a write for them, e.g. ones that weren't listed again this round
+		but are still there, so end_round() doesn't drop their fingerprints.
+		:param uids: skipper uids
+		"""
+		with self.lock:
+			self.seen.update(uids)
+
+	def end_round(self) -> None:
+		"""
+		Drops the fingerprints of resources that weren't checked since the last call. They were (or are about to be)
+		swept from the db, so they have to be written again if they come back.
+		"""
+		with self.lock:
+			self.fingerprints = { uid: tags for uid, tags in self.fingerprints.items() if uid in self.seen }
+			self.seen = set()
+
+	def clear(self) -> None:
+		"""
+		Drops every fingerprint, e.g. after a failed write, so the next round writes everything.
+		"""
+		with self.lock:
+			self.fingerprints = {}
+
+	def snapshot(self) -> Dict[str, Dict[str, bytes]]:
+		"""
+		:return: (Dict[str, Dict[str, bytes]]) copy of the fingerprints, for a crawl checkpoint
+		"""
+		with self.lock:
+			return { uid: dict(tags) for uid, tags in self.fingerprints.items() }
+
+	def restore(self, fingerprints: Dict[str, Dict[str, bytes]]) -> None:
+		"""
+		Takes the fingerprints of a crawl checkpoint, so that a restarted crawler doesn't write again what is already in the db.
+		:param (Dict[str, Dict[str, bytes]]) fingerprints: as returned by snapshot()
+		"""
+		with self.lock:
+			self.fingerprints = fingerprints
+
+	def pop_counts(self) -> Tuple[int, int]:
+		"""
+		:return: ((int) writes made, (int) writes skipped) since the last call
+		"""
+		with self.lock:
+			counts = (self.written, self.skipped)
+			self.written, self.skipped = 0, 0
+		return counts
@@ -0,0 +1,40 @@
+import os, pickle, time
+from typing import Dict
+
+# bumped whenever what the crawler saves changes, checkpoints of another version are ignored
+VERSION = 3
+
+def save(path: str, state: Dict) -> None:
+	"""
+	Saves what the crawler knows at the end of a round, so that a restarted crawler can pick up from there.
+	The file is written next to the last checkpoint and only replaces it once complete, so a crash half way
+	through leaves the last one usable.
+
+	:param (str) path: file to save to
+	:param (Dict) state: state to save, see crawler.checkpoint_state()
+	"""
+	start = time.time()
+	tmp_path = path + ".tmp"
+	with open(tmp_path, "wb") as f:
+		pickle.dump({ "version": VERSION, "saved_at": time.time(), "state": state }, f, protocol=pickle.HIGHEST_PROTOCOL)
+	os.replace(tmp_path, path)
+	print("Saved crawl checkpoint in %.2f seconds." % (time.time() - start))
+
+def load(path: str) -> Dict:
+	"""
+	:param (str) path: file saved by save()
+	:return: (Dict) the state that was saved, or None if there is no checkpoint or it can't be used
+	"""
+	try:
+		with open(path, "rb") as f:
+			checkpoint = pickle.load(f)
+	except FileNotFoundError:
+		return None
+	except Exception as e:
+		print("Ignoring crawl checkpoint", path, "that could not be read:", repr(e))
+		return None
+	if not isinstance(checkpoint, dict) or checkpoint.get("version") != VERSION:
+		print("Ignoring crawl checkpoint", path, "saved by another version of the crawler.")
+		return None
+	print("Loaded crawl checkpoint saved %d seconds ago." % (time.time() - checkpoint["saved_at"]))
+	return checkpoint["state"]
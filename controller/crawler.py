@@ -1,57 +1,199 @@
-import os, sys
+import os, sys, threading
 import requests, json, time, yaml
-import kubernetes as k8s
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from dateutil.parser import parse
+from crawler_config import CrawlerConfig
+from change_tracker import ChangeTracker
+from scheduler import CrawlScheduler
+import checkpoint
 
 print("Loading backend functions...")
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
-import k8s_config
+from instrumentation import REGISTRY, start_http_server
+from bulk_writer import BulkWriter, QueueWriter
+from sharding import ShardCoordinator
+import k8s_api, k8s_config
 import cluster_mode_backend as cmb
 import app_mode_backend as amb
-import errors_backend as eb
-
-print("Getting access to db...")
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'controller', 'webserver'))
-from app.models import Resource, Edge
+import label_selectors
+import records
+from deployer_index import DeployerIndex, deployer_key
+from pod_registry import PodRegistry
+import ownership
+from watcher import ClusterWatcher, WATCHED_KINDS
 
 print("Loading kube config...")
 k8s_config.load_kube_config()
 k8s_config.update_available_clusters()
 
-# For reference
-# {"uid", "created_at", "rtype", "name", "cluster", "namespace", "application", "app_path", "cluster_path", "sev_measure", "sev_reason", "info"}
-
-def load_all() -> None:
+# cluster_pool runs one crawl_cluster() per cluster, list_pool runs the individual list calls
+# that those crawls (and the application phase) fan out to
+cluster_pool = ThreadPoolExecutor(max_workers=CrawlerConfig.CLUSTER_WORKERS)
+list_pool = ThreadPoolExecutor(max_workers=CrawlerConfig.LIST_WORKERS)
+
+# rtypes written from a cluster crawl, the key crawl_cluster() stores them under, and the function listing them cluster-wide
+WORKLOAD_KINDS = [ ("Deployment", "deploys", cmb.cluster_deployments),
+					("Service", "svcs", cmb.cluster_services),
+					("DaemonSet", "dsets", cmb.cluster_daemon_sets),
+					("StatefulSet", "ssets", cmb.cluster_stateful_sets) ]
+
+# rtypes written from a cluster crawl, which are only swept in the clusters that were crawled
+CLUSTER_RTYPES = [ "Namespace" ] + [ rtype for rtype, _, _ in WORKLOAD_KINDS ] + [ "Pod" ]
+# relations of the edges written from a cluster crawl, swept the same way, and of the edges written for applications
+CLUSTER_RELATIONS = [ "Cluster<-Namespace" ] + [ "Namespace<-" + rtype for rtype, _, _ in WORKLOAD_KINDS ] \
+					+ [ rtype + "<-Pod" for rtype, _, _ in WORKLOAD_KINDS ] + [ "Namespace<-Pod" ]
+APP_RELATIONS = [ "Application<-Deployable" ] + [ "Deployable<-" + rtype for rtype, _, _ in WORKLOAD_KINDS ]
+
+# key crawl_cluster() stores each listed kind under : function listing it cluster-wide. Everything is listed with raw=True,
+# as dicts, since only a few fields are read and the rest is stored as it came (see records.py).
+# pods are listed a page at a time instead, and each page is written before the next one is fetched, see write_pods()
+LISTERS = { key: lister for _, key, lister in WORKLOAD_KINDS }
+LISTERS.update({ "nss": cmb.cluster_namespaces, "rsets": cmb.cluster_replica_sets, "pods": cmb.cluster_pod_pages })
+
+if CrawlerConfig.BACKEND == "asyncio":
+	import aio_backend
+	# the same LISTERS keys, listed concurrently on aio_backend's event loop instead of on list_pool
+	ASYNC_LISTERS = { "nss": aio_backend.cluster_namespaces, "rsets": aio_backend.cluster_replica_sets,
+						"deploys": aio_backend.cluster_deployments, "svcs": aio_backend.cluster_services,
+						"dsets": aio_backend.cluster_daemon_sets, "ssets": aio_backend.cluster_stateful_sets }
+
+# LISTERS keys of the kinds in the subtree of a resource of each rtype, refreshed ahead of schedule when a user
+# navigates into such a resource (see serve_refresh_requests()). "apps" covers applications, deployables and their edges
+SUBTREE_KINDS = { "Cluster": list(LISTERS), "Namespace": [ key for _, key, _ in WORKLOAD_KINDS ] + [ "rsets", "pods" ],
+					"Deployment": [ "rsets", "pods" ], "DaemonSet": [ "rsets", "pods" ], "StatefulSet": [ "rsets", "pods" ],
+					"Service": [ "svcs", "pods" ], "Application": [ "apps" ], "Deployable": [ "apps" ] }
+
+# crawl instrumentation, served on CrawlerConfig.METRICS_PORT (api requests are counted in k8s_api, bulk writes in bulk_writer)
+PHASE_DURATION = REGISTRY.histogram("skipper_crawl_phase_duration_seconds", "Time spent in each phase of a crawl round.", [ "phase" ])
+CYCLE_DURATION = REGISTRY.histogram("skipper_crawl_cycle_duration_seconds", "Time a whole crawl round takes.")
+CLUSTER_DURATION = REGISTRY.histogram("skipper_cluster_crawl_duration_seconds", "Time a cluster crawl takes, including queueing its writes.", [ "cluster" ])
+CLUSTER_FAILURES = REGISTRY.counter("skipper_cluster_crawl_failures_total", "Cluster crawls that errored or timed out.", [ "cluster" ])
+OBJECTS_LISTED = REGISTRY.counter("skipper_objects_listed_total", "Objects received from list calls.", [ "cluster", "kind" ])
+WRITES = REGISTRY.counter("skipper_crawl_writes_total", "Resources written, or skipped because they hadn't changed.", [ "result" ])
+
+# fingerprints of what was written last round, so unchanged objects aren't serialized and rewritten every round
+tracker = ChangeTracker()
+
+# decides which kinds are re-listed in which clusters every round. Besides the LISTERS keys, "apps" stands for a
+# cluster's applications and deployables, and ("", "mcm") for the MCM cluster objects of every cluster
+intervals = { key: CrawlerConfig.WORKLOAD_INTERVAL for key in LISTERS }
+intervals.update({ "nss": CrawlerConfig.NAMESPACE_INTERVAL, "pods": CrawlerConfig.POD_INTERVAL,
+					"apps": CrawlerConfig.APP_INTERVAL, "mcm": CrawlerConfig.MCM_INTERVAL })
+scheduler = CrawlScheduler(intervals, CrawlerConfig.ANOMALY_SPEEDUP, CrawlerConfig.BACKOFF_BASE,
+							CrawlerConfig.BACKOFF_MAX, CrawlerConfig.REQUEST_BUDGET)
+
+# what was listed the last time each kind was refreshed, used until the scheduler says it is due again
+listed_cache = {}	# cluster name : { LISTERS key : k8s objects, or skipper uids for "pods". "owned" : { workload skipper uid : its pods' skipper uids },
+					#				"pod_edges" : (start_uid, end_uid, relation) of the pods' edges }
+app_cache = {}		# cluster name : [ (application, its deployables) ]
+mcm_cache = {}		# cluster name : MCM cluster object
+listed_sizes = {}	# cluster name : { LISTERS key : number of objects last listed }, to estimate crawl costs
+watchers = {}		# cluster name : its ClusterWatcher, in watch mode
+refresh_requested = threading.Event()	# set when users asked for subtrees to be refreshed, wakes the crawl loop up
+shard_deployers = {}	# cluster name : deployers reported by the crawl process of its shard, in sharded mode
+# guards listed_cache, listed_sizes and app_cache, which crawl threads (possibly of a round that gave up on them) write to
+# while checkpoint_state() copies them
+caches_lock = threading.Lock()
+checkpoint_saved_at = 0.0	# time the last checkpoint was saved
+# clusters whose crawl_cluster() hasn't returned yet. A crawl that timed out keeps running (and writing) after its round
+# gave up on it, since a running future can't be cancelled, so the cluster isn't crawled again until it returns
+running_crawls = set()
+
+def crawl_costs(cluster_names: List[str]) -> Dict[Tuple[str, str], int]:
 	"""
-	Loads all Resources and Edges into the database.
+	:param (List[str]) cluster_names: clusters that are crawled
+	:return: (Dict[Tuple[str, str], int]) (cluster, kind) : estimated number of api requests to refresh it, for every pair the scheduler handles
 	"""
+	costs = { ("", "mcm"): 2 * len(cluster_names) }
+	for cname in cluster_names:
+		# one request per page, going by how many objects there were last time
+		for key in LISTERS:
+			page_size = CrawlerConfig.PAGE_SIZE if key == "pods" else k8s_api.PAGE_SIZE
+			costs[(cname, key)] = 1 + listed_sizes.get(cname, {}).get(key, 0) // page_size
+		# listing the applications, and every application's deployables in every cluster
+		costs[(cname, "apps")] = 1 + len(app_cache.get(cname, [])) * (1 + len(cluster_names))
+	return costs
+
+def list_kinds(cname: str, keys: List[str]) -> Dict[str, List]:
+	"""
+	Lists kinds of a cluster cluster-wide, all at the same time: on list_pool, or on aio_backend's event loop
+	with the asyncio backend.
 
-	def to_json(k8s_obj: k8s.client.models) -> str:
-		to_s = lambda dt: dt.__str__()
-		return json.dumps(k8s_obj.to_dict(), default=to_s)
-
-	all_nss = []                # all namespaces
-	all_deploys = []            # all deployments
-	all_svcs = []               # all services
-	all_dsets = []              # all daemonsets
-	all_ssets = []              # all statefulsets
-	all_pods = []               # all pods
-
-	all_dpbs = []               # all deployables
+	:param (str) cname: name of the cluster
+	:param (List[str]) keys: LISTERS keys of the kinds to list, except "pods"
+	:return: (Dict[str, List]) LISTERS key : k8s objects, as dicts
+	"""
+	if CrawlerConfig.BACKEND == "asyncio":
+		results = aio_backend.run(aio_backend.gather(*[ ASYNC_LISTERS[key](cname, raw=True) for key in keys ]))
+		return dict(zip(keys, results))
+	futures = { key: list_pool.submit(LISTERS[key], cname, raw=True) for key in keys }
+	return { key: future.result() for key, future in futures.items() }
 
-	start = time.time()         # time how long one round of load-all takes
-	split_start = time.time()   # time how long each portion takes
+def crawl_cluster(writer: BulkWriter, generation: int, cname: str, due: List[str]) -> Dict:
+	"""
+	Writes the namespaces, deployments, services, daemonsets, statefulsets and pods of a cluster, and marks them
+	and their edges as seen in this crawl generation. The kinds that are due are listed cluster-wide, all at once (see list_kinds()),
+	the others are taken from the last time they were listed. Pods are streamed: each page is linked to its parents,
+	written and dropped before the next one is fetched, so only the pods' uids and edges are kept between rounds.
+	Nothing is written until every kind has been listed at least once.
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (str) cname: name of the cluster to crawl
+	:param (List[str]) due: LISTERS keys of the kinds to list again
+	:return: (Dict) whether any pod has sev_measure 1 under "anomalous" (None if pods weren't listed again).
+			None if some kind hasn't been listed yet.
+	"""
 
-	print("\nStarting a round of load-all. Strap yourself in, astronaut.")
+	with CLUSTER_DURATION.time(cluster=cname):
+		fresh = list_kinds(cname, [ key for key in due if key != "pods" ])
+		with caches_lock:
+			listed = dict(listed_cache.get(cname, {}))
+			listed.update(fresh)
+			listed_cache[cname] = listed
+		for key in fresh:
+			OBJECTS_LISTED.inc(len(listed[key]), cluster=cname, kind=key)
+		if any(key not in listed and key not in due for key in LISTERS):
+			return None
+
+		split_start = time.time()
+		ns_uids = write_namespaces(writer, generation, cname, listed["nss"])
+		workload_uids = write_workloads(writer, generation, cname, listed, ns_uids)
+		anomalous = None
+		if "pods" in due:
+			pods, owned, pod_edges, anomalous = write_pods(writer, generation, cname, listed, ns_uids, workload_uids)
+			with caches_lock:
+				listed.update(pods=pods, owned=owned, pod_edges=pod_edges)
+		else:
+			tracker.keep(listed["pods"])
+			writer.touch_resources(listed["pods"], generation)
+			writer.touch_edges(listed["pod_edges"], generation)
+		with caches_lock:
+			listed_sizes[cname] = { key: len(listed[key]) for key in LISTERS }
+		print("Wrote cluster %s's %d namespaces, %d workloads and %d pods in %d seconds." % (cname, len(ns_uids),
+				sum(len(listed[key]) for _, key, _ in WORKLOAD_KINDS), len(listed["pods"]), time.time() - split_start))
+	return { "anomalous": anomalous }
+
+def load_clusters(writer: BulkWriter, generation: int, refresh_mcm: bool = True) -> List[str]:
+	"""
+	Writes every accessible cluster, and marks it as seen in this crawl generation.
+	Clusters that are no longer accessible are left for the end-of-round sweep.
 
-	# insert all clusters into the database
-	stale_clusters = Resource.query.filter(Resource.rtype=="Cluster").all()
-	stale_cdict = { c.name: c for c in stale_clusters }
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (bool) refresh_mcm: whether to list the MCM cluster objects again, instead of using the ones listed last time
+	:return: (List[str]) names of the accessible clusters
+	"""
 	cluster_names = k8s_config.all_cluster_names()
-	mcm_clusters = cmb.mcm_clusters(cluster_names)
+
+	if refresh_mcm:
+		mcm_clusters = cmb.mcm_clusters(cluster_names)
+		mcm_cache.clear()
+		mcm_cache.update(mcm_clusters)
 	for cname in cluster_names:
-		if cname in mcm_clusters:
-			mcm_cluster = mcm_clusters[cname]
+		if cname in mcm_cache:
+			mcm_cluster = dict(mcm_cache[cname])
 			mcm_cluster["yaml"] = yaml.dump(mcm_cluster, sort_keys=False)
 			cluster_data = {'uid': cname, "rtype": 'Cluster', "name": cname , "cluster": cname ,
 						 "cluster_path": "/root/", "created_at" : mcm_cluster["metadata"].get("creationTimestamp"),
@@ -60,373 +202,785 @@ def load_all() -> None:
 			cluster_data = {"uid": cname, "rtype": "Cluster", "name": cname,
 							"cluster": cname, "cluster_path": "/root/"}
 
-		# remove cluster from running list of stale clusters
-		if cname in stale_cdict.keys():
-			stale_cdict.pop(cname)
+		if tracker.changed(cname, cluster_data):
+			writer.add_resource(cluster_data)
 
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(cname), data=cluster_data)
+	writer.touch_resources(cluster_names, generation)
+	return cluster_names
 
-		# find all namespaces under this cluster and add it
-		# to the running list of namespaces (all_nss)
-		nss = cmb.cluster_namespaces(cluster_name=cname)
-		for ns in nss:
-			ns.metadata.cluster_name = cname
-		all_nss += nss
+def list_applications(cluster_names: List[str]) -> List:
+	"""
+	Lists the Applications of clusters, all at the same time: on list_pool, or on aio_backend's event loop
+	with the asyncio backend.
 
-	# remove all stale clusters, descendants, and associated edges
-	# i.e. clusters that were in the db but that we didn't find
-	for cname in stale_cdict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(cname))
+	:param (List[str]) cluster_names
+	:return: (List) each cluster's (List[Dict]) Applications, or the Exception listing them raised, in the order of cluster_names
+	"""
+	if CrawlerConfig.BACKEND == "asyncio":
+		return aio_backend.run(aio_backend.gather(*[ aio_backend.cluster_applications(cname) for cname in cluster_names ],
+													return_exceptions=True))
+	futures = [ list_pool.submit(amb.cluster_applications, cname) for cname in cluster_names ]
+	results = []
+	for future in futures:
+		try:
+			results.append(future.result())
+		except Exception as e:
+			results.append(e)
+	return results
 
-		# remove any apps that were defined in the cluster
-		cluster_apps = Resource.query.filter(Resource.rtype=="Application" and Resource.uid.like(cname + "%")).all()
-		for capp in cluster_apps:
-			requests.delete('http://127.0.0.1:5000/resource/{}'.format(capp.uid))
+def list_app_deployables(apps: List[Dict]) -> List[List[Dict]]:
+	"""
+	Lists the Deployables of Applications, all at the same time: on list_pool, or on aio_backend's event loop
+	with the asyncio backend.
 
-	print("Wrote %d clusters and found all child namespaces in %d seconds." % (len(cluster_names), time.time() - split_start))
+	:param (List[Dict]) apps: Applications, with their cluster name in their metadata
+	:return: (List[List[Dict]]) each Application's Deployables, in the order of apps
+	"""
+	args = [ (app["metadata"]["cluster_name"], app["metadata"]["namespace"], app["metadata"]["name"]) for app in apps ]
+	if CrawlerConfig.BACKEND == "asyncio":
+		return aio_backend.run(aio_backend.gather(*[ aio_backend.application_deployables(*arg) for arg in args ]))
+	futures = [ list_pool.submit(amb.application_deployables, *arg) for arg in args ]
+	return [ future.result() for future in futures ]
+
+def load_apps(writer: BulkWriter, generation: int, cluster_names: List[str], due_clusters: List[str]) -> Tuple[List[Dict], List[str]]:
+	"""
+	Writes every Application and Deployable, and marks them and the edges between them as seen in this crawl generation.
+	Applications are only listed again in the clusters that are due, the others' are taken from the last time they were listed.
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (List[str]) cluster_names: clusters to look for Applications in
+	:param (List[str]) due_clusters: clusters to list Applications in again
+	:return: ((List[Dict]) deployables of every cluster's Applications, with the name and skipper uid of their Application added to their metadata,
+			  (List[str]) clusters whose Applications couldn't be listed, or haven't been listed yet)
+	"""
 
-	# insert all applications into the database
 	split_start = time.time()
-	stale_apps = Resource.query.filter(Resource.rtype == "Application").all()
-	stale_adict = { app.uid: app for app in stale_apps }
-	apps = amb.all_applications()
-	for app in apps:	
+	listed = {}			# cluster name : [ (application, its deployables) ] listed this round
+	app_failures = []	# clusters whose applications couldn't be listed
+	apps = []
+	for cname, result in zip(due_clusters, list_applications(due_clusters)):
+		if isinstance(result, Exception):
+			print("Could not list applications in cluster", cname + ":", repr(result))
+			app_failures.append(cname)
+			continue
+		listed[cname] = []
+		apps += result
+
+	# find all deployables under each application
+	for app, deployables in zip(apps, list_app_deployables(apps)):
+		md = app["metadata"]
+		for dpb in deployables:
+			dpb["metadata"]["app_name"] = md["name"]
+			dpb["metadata"]["app_uid"] = md["cluster_name"] + "_" + md["uid"]
+		listed[md["cluster_name"]].append((app, deployables))
+	with caches_lock:
+		app_cache.update(listed)
+	# clusters that weren't due and were never listed (e.g. after a restart without a checkpoint, or a new cluster
+	# the scheduler's budget didn't reach) have nothing to touch their Applications with, so they can't be swept either
+	app_failures += [ cname for cname in cluster_names if cname not in app_cache and cname not in app_failures ]
+
+	all_dpbs = []
+	app_uids = []
+	for app, deployables in [ entry for cname in cluster_names for entry in app_cache.get(cname, []) ]:
 		md = app["metadata"]
 		name, cname, ns, k8s_uid = md["name"], md["cluster_name"], md["namespace"], md["uid"]
 		app_uid = cname + "_" + k8s_uid
-		created_at = parse(app["metadata"]["creationTimestamp"])
-		app_data = { "uid": app_uid, "created_at": created_at, "rtype": "Application",
-						"name": name, "cluster": cname, "namespace": ns, "application": name,
-							"app_path": "/root/", "info": json.dumps(app)}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(app_uid), data=app_data)
-
-		# find all deployables under this application and add it to the running
-		# list of all deployables (all_dpbs)
-		deployables = amb.application_deployables(cluster_name=cname, namespace=ns, app_name=name)
-		for dpb in deployables:
-			dpb["metadata"]["app_name"] = name
-			dpb["metadata"]["app_uid"] = app_uid
+		app_uids.append(app_uid)
+		if tracker.changed(app_uid, md.get("resourceVersion")):
+			created_at = parse(app["metadata"]["creationTimestamp"])
+			app_data = { "uid": app_uid, "created_at": created_at, "rtype": "Application",
+							"name": name, "cluster": cname, "namespace": ns, "application": name,
+								"app_path": "/root/", "info": json.dumps(app)}
+			writer.add_resource(app_data)
+
+		# add this application's deployables to the running list of all deployables (all_dpbs)
 		all_dpbs += deployables
 
-		# remove this app from running list of stale apps
-		if app_uid in stale_adict.keys():
-			stale_adict.pop(app_uid)
-
-	# remove all stale apps, descendants, and associated edges
-	for app_uid in stale_adict:
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(app_uid))
-
-	print("Wrote %d applications and found all child deployables in %d seconds." % (len(apps), time.time() - split_start))
-
-	# insert all namespaces and corresponding edges into the database
-	split_start = time.time()
-	stale_nss = Resource.query.filter(Resource.rtype == "Namespace").all()
-	stale_nsdict = { ns.uid: ns for ns in stale_nss }
-	for ns in all_nss:
-		cname = ns.metadata.cluster_name
-		ns_uid = cname + "_" + ns.metadata.uid
-		ns_name = ns.metadata.name
-		created_at = ns.metadata.creation_timestamp
-		ns_resource = {"uid": ns_uid, "created_at": created_at, "rtype": "Namespace",
-					"name": ns_name, "cluster": cname, "namespace": ns_name,
-					"cluster_path": "/root/{}/".format(cname), "info": to_json(ns)}
-		ns_edge = {"start_uid": cname, "end_uid": ns_uid, "relation": "Cluster<-Namespace"}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(ns_uid), data=ns_resource)
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(cname, ns_uid), data=ns_edge)
-
-		# remove this ns from list of stale namespaces
-		if ns_uid in stale_nsdict.keys():
-			stale_nsdict.pop(ns_uid)
-
-		# find all deployments under this namespace and add it to the running
-		# list of all deployments (all_deploys)
-		deploys = cmb.namespace_deployments(cluster_name=cname, namespace=ns_name)
-		for deploy in deploys:
-			deploy.metadata.cluster_name = cname
-			deploy.metadata.ns_uid = ns_uid
-		all_deploys += deploys
-
-		# find all services under this namespace and add it to the running
-		# list of all services (all_svcs)
-		svcs = cmb.namespace_services(cluster_name=cname, namespace=ns_name)
-		for svc in svcs:
-			svc.metadata.cluster_name = cname
-			svc.metadata.ns_uid = ns_uid
-		all_svcs += svcs
-
-		# find all daemonsets under this namespace and add it to the running
-		# list of all daemonsets (all_dsets)
-		dsets = cmb.namespace_daemon_sets(cluster_name=cname, namespace=ns_name)
-		for dset in dsets:
-			dset.metadata.cluster_name = cname
-			dset.metadata.ns_uid = ns_uid
-		all_dsets += dsets
-
-		# find all statefulsets under this namespace and add it to the running
-		# list of all statefulsets (all_ssets)
-		ssets = cmb.namespace_stateful_sets(cluster_name=cname, namespace=ns_name)
-		for sset in ssets:
-			sset.metadata.cluster_name = cname
-			sset.metadata.ns_uid = ns_uid
-		all_ssets += ssets
-
-	# remove all stale namespaces, their descendants and associated edges
-	for sns_uid in stale_nsdict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(sns_uid))
-
-	print("Wrote %d namespaces and found child deployments, services, daemonsets and statefulsets in %d seconds." % (len(all_nss), time.time() - split_start))
+	writer.touch_resources(app_uids, generation)
+	print("Wrote %d applications and found all child deployables in %d seconds." % (len(app_uids), time.time() - split_start))
 
 	# insert all deployables and corresponding edges into the database
 	split_start = time.time()
-	stale_dpbs = Resource.query.filter(Resource.rtype == "Deployable").all()
-	stale_dpb_dict = { dpb.uid: dpb for dpb in stale_dpbs }
+	dpb_uids = []
+	dpb_edges = []
 	for dpb in all_dpbs:
 		md = dpb["metadata"]
 		app_name, app_uid = md["app_name"], md["app_uid"]
 		dpb_name, k8s_uid, cname, ns = md["name"], md["uid"], md["cluster_name"], md["namespace"]
 		dpb_uid = cname + "_" + k8s_uid
+		dpb_uids.append(dpb_uid)
+		dpb_edges.append((app_uid, dpb_uid, "Application<-Deployable"))
+
+		if not tracker.changed(dpb_uid, (md.get("resourceVersion"), app_uid, app_name)):
+			continue
 		created_at = parse(dpb["metadata"]["creationTimestamp"])
 		dpb_resource = {"uid": dpb_uid, "created_at": created_at, "rtype": "Deployable",
 					"name": dpb_name, "cluster": cname, "namespace": ns, "application": app_name,
 					"app_path": "/root/{}/".format(app_uid), "info": json.dumps(dpb)}
-		dpb_edge = {"start_uid": app_uid, "end_uid": dpb_uid, "relation": "Application<-Deployable"}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(dpb_uid), data=dpb_resource)
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(app_uid, dpb_uid), data=dpb_edge)
+		writer.add_resource(dpb_resource)
 
-		# remove this deployable from the list of stale deployables
-		if dpb_uid in stale_dpb_dict.keys():
-			stale_dpb_dict.pop(dpb_uid)
+	writer.touch_resources(dpb_uids, generation)
+	writer.touch_edges(dpb_edges, generation)
+	print("Wrote %d deployables in %d seconds." % (len(all_dpbs), time.time() - split_start ))
+	return all_dpbs, app_failures
 
-	# remove all stale deployables, their descendants and associated edges
-	for dpb_uid in stale_dpb_dict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(dpb_uid))
+def sweep_apps(writer: BulkWriter, generation: int, app_failures: List[str]) -> None:
+	"""
+	Removes the Applications and Deployables that weren't seen in this crawl generation,
+	along with their descendants that weren't seen either, and the application edges that weren't seen.
 
-	print("Wrote %d deployables in %d seconds." % (len(all_dpbs), time.time() - split_start ))
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (List[str]) app_failures: clusters whose Applications couldn't be listed (or haven't been yet), as returned by load_apps()
+	"""
+	# applications of clusters that are gone are swept too, they can't be listed anymore
+	writer.sweep_resources(generation, ["Application"], except_clusters=app_failures)
+	# a deployable can live in a different cluster than its application, so we can only tell
+	# which deployables are stale when every cluster's applications could be listed
+	if len(app_failures) == 0:
+		writer.sweep_resources(generation, ["Deployable"])
+		writer.sweep_edges(generation, APP_RELATIONS)
 
-	# insert all deployments and corresponding edges into the database
-	split_start = time.time()
-	stale_deploys = Resource.query.filter(Resource.rtype == "Deployment").all()
-	stale_deploy_dict = { deploy.uid: deploy for deploy in stale_deploys }
-	for deploy in all_deploys:
-		cname = deploy.metadata.cluster_name
-		ns_uid = deploy.metadata.ns_uid
-		deploy_uid = cname + "_" + deploy.metadata.uid
-		deploy_path = "/root/{}/{}/".format(cname, ns_uid)
-		created_at = deploy.metadata.creation_timestamp
-		deploy_resource = {"uid": deploy_uid, "created_at": created_at, "rtype": "Deployment",
-						"name": deploy.metadata.name, "cluster": cname, "namespace": deploy.metadata.namespace,
-						"cluster_path": deploy_path, "info": to_json(deploy)}
-		deploy_edge = {"start_uid": ns_uid, "end_uid": deploy_uid, "relation": "Namespace<-Deployment"}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(deploy_uid), data=deploy_resource)
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(ns_uid, deploy_uid), data=deploy_edge)	
-
-		# find all pods being managed by this deployment and add them to the list of all pods (all_pods)
-		pods = cmb.deployment_pods(cluster_name=cname, namespace=deploy.metadata.namespace, deploy_name=deploy.metadata.name)
-		for pod in pods:
-			pod.metadata.cluster_name = cname
-			pod.metadata.ns_uid = ns_uid
-			pod.metadata.parent_uid = deploy_uid
-			pod.metadata.parent_type = "Deployment"
-		all_pods += pods
-
-		# remove this deployment from the list of stale deployments
-		if deploy_uid in stale_deploy_dict.keys():
-			stale_deploy_dict.pop(deploy_uid)
-
-	# remove all stale deployments, their descendants and associated edges
-	for deploy_uid in stale_deploy_dict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(deploy_uid))
-
-	print("Wrote %d deployments and found managed pods in %d seconds." % (len(all_deploys), time.time() - split_start))
-
-	# insert all services and corresponding edges into the database
-	split_start = time.time()
-	stale_svcs = Resource.query.filter(Resource.rtype == "Service").all()
-	stale_svc_dict = { svc.uid: svc for svc in stale_svcs }
-	for svc in all_svcs:
-		cname = svc.metadata.cluster_name
-		ns_uid = svc.metadata.ns_uid
-		svc_uid = cname + "_" + svc.metadata.uid
-		svc_path = "/root/{}/{}/".format(cname, ns_uid)
-		created_at = svc.metadata.creation_timestamp
-		svc_resource = {"uid": svc_uid, "created_at": created_at, "rtype": "Service",
-						"name": svc.metadata.name, "cluster": cname, "namespace": svc.metadata.namespace,
-						"cluster_path": svc_path, "info": to_json(svc)}
-		svc_edge = {"start_uid": ns_uid, "end_uid": svc_uid, "relation": "Namespace<-Service"}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(svc_uid), data=svc_resource)
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(ns_uid, svc_uid), data=svc_edge)
-
-		# find all pods selected by this service and add them to the list of all pods (all_pods)
-		pods = cmb.service_pods(cluster_name=cname, namespace=svc.metadata.namespace, svc_name=svc.metadata.name)
-		for pod in pods:
-			pod.metadata.cluster_name = cname
-			pod.metadata.ns_uid = ns_uid
-			pod.metadata.parent_uid = svc_uid
-			pod.metadata.parent_type = "Service"
-		all_pods += pods
-
-		# remove this service from the list of stale services
-		if svc_uid in stale_svc_dict.keys():
-			stale_svc_dict.pop(svc_uid)
-
-	# remove all stale services, their descendants and associated edges
-	for svc_uid in stale_svc_dict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(svc_uid))
-
-	print("Wrote %d services and found selected pods in %d seconds." % (len(all_svcs), time.time() - split_start))
-
-	# insert all daemonsets and corresponding edges into the database
-	split_start = time.time()
-	stale_dsets = Resource.query.filter(Resource.rtype == "DaemonSet").all()
-	stale_dset_dict = { dset.uid: dset for dset in stale_dsets }
-	for dset in all_dsets:
-		cname = dset.metadata.cluster_name
-		ns_uid = dset.metadata.ns_uid
-		dset_uid = cname + "_" + dset.metadata.uid
-		dset_path = "/root/{}/{}/".format(cname, ns_uid)
-		created_at = dset.metadata.creation_timestamp
-		dset_resource = {"uid": dset_uid, "created_at": created_at, "rtype": "DaemonSet",
-					"name": dset.metadata.name, "cluster": cname, "namespace": dset.metadata.namespace,
-					"cluster_path": dset_path, "info": to_json(dset)}
-		dset_edge = {"start_uid": ns_uid, "end_uid": dset_uid, "relation": "Namespace<-DaemonSet"}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(dset_uid), data=dset_resource)
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(ns_uid, dset_uid), data=dset_edge)
-
-		# find all pods managed by this daemonset and add them to the list of all pods (all_pods)
-		pods = cmb.daemon_set_pods(cluster_name=cname, namespace=dset.metadata.namespace, dset_name=dset.metadata.name)
-		for pod in pods:
-			pod.metadata.cluster_name = cname
-			pod.metadata.ns_uid = ns_uid
-			pod.metadata.parent_uid = dset_uid
-			pod.metadata.parent_type = "DaemonSet"
-		all_pods += pods
-
-		# remove this daemonset from the list of stale daemonsets
-		if dset_uid in stale_dset_dict.keys():
-			stale_dset_dict.pop(dset_uid)
-
-	# remove all stale daemonsets, their descendants and associated edges
-	for dset_uid in stale_dset_dict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(dset_uid))
-
-	print("Wrote %d daemonsets and found managed pods in %d seconds." % (len(all_dsets), time.time() - split_start))
-
-	# insert all stateful sets and corresponding edges into the database
-	split_start = time.time()
-	stale_ssets = Resource.query.filter(Resource.rtype == "StatefulSet").all()
-	stale_sset_dict = { sset.uid: sset for sset in stale_ssets }
-	for sset in all_ssets:
-		cname = sset.metadata.cluster_name
-		ns_uid = sset.metadata.ns_uid
-		sset_uid = cname + "_" + sset.metadata.uid
-		sset_path = "/root/{}/{}/".format(cname, ns_uid)
-		created_at = sset.metadata.creation_timestamp
-		sset_resource = {"uid": sset_uid, "created_at": created_at, "rtype": "StatefulSet",
-							"name": sset.metadata.name, "cluster": cname, "namespace": sset.metadata.namespace,
-							"cluster_path": sset_path, "info": to_json(sset)}
-		sset_edge = {"start_uid": ns_uid, "end_uid": sset_uid, "relation": "Namespace<-StatefulSet"}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(sset_uid), data=sset_resource)
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(ns_uid, sset_uid), data=sset_edge)
-
-		# find all pods managed by this statefulset and add them to the list of all pods (all_pods)
-		pods = cmb.stateful_set_pods(cluster_name=cname, namespace=sset.metadata.namespace, sset_name=sset.metadata.name)
-		for pod in pods:
-			pod.metadata.cluster_name = cname
-			pod.metadata.ns_uid = ns_uid
-			pod.metadata.parent_uid = sset_uid
-			pod.metadata.parent_type = "StatefulSet"
-		all_pods += pods
-
-		# remove this stateful set from the list of stale statefulsets
-		if sset_uid in stale_sset_dict.keys():
-			stale_sset_dict.pop(sset_uid)
-
-	# remove all stale statefulsets, their descendants and associated edges
-	for sset_uid in stale_sset_dict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(sset_uid))
-
-	print("Wrote %d statefulsets and found managed pods in %d seconds." % (len(all_ssets), time.time() - split_start))
-
-	# insert all pods and corresponding edges into the database
-	split_start = time.time()
-	stale_pods = Resource.query.filter(Resource.rtype == "Pod").all()
-	stale_pod_dict = { pod.uid: pod for pod in stale_pods }
-	for pod in all_pods:
-		cname = pod.metadata.cluster_name
-		ns_uid = pod.metadata.ns_uid
-		parent_uid = pod.metadata.parent_uid
-		parent_type = pod.metadata.parent_type
-		pod_uid = cname + "_" + pod.metadata.uid
-		pod_path = "/root/{}/{}/{}/".format(cname, ns_uid, parent_uid)
-		sev_measure, sev_reason = eb.pod_state(pod)
-		created_at = pod.metadata.creation_timestamp
-
-		# don't write this pod to db w/ a cluster_path that goes through a service
-		if parent_type != "Service":
-			pod_resource = {"uid": pod_uid, "created_at": created_at, "rtype": "Pod",
-							"name": pod.metadata.name, "cluster": cname, "namespace": pod.metadata.namespace,
-							"cluster_path": pod_path, "sev_measure": sev_measure, "sev_reason": sev_reason, "info": to_json(pod)}
-			requests.post('http://127.0.0.1:5000/resource/{}'.format(pod_uid), data=pod_resource)
-
-		pod_edge = {"start_uid": parent_uid, "end_uid": pod_uid, "relation": parent_type + "<-Pod"}
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(parent_uid, pod_uid), data=pod_edge)
-
-		# remove this pod from the list of stale pods
-		if pod_uid in stale_pod_dict.keys():
-			stale_pod_dict.pop(pod_uid)
-
-	# remove all stale pods and associated edges
-	for pod_uid in stale_pod_dict.keys():
-		requests.delete('http://127.0.0.1:5000/resource/{}'.format(pod_uid))
-
-	print("Wrote %d pods in %d seconds." % (len(all_pods), time.time() - split_start))
 
-	# create edges between deployables and their resources
+def writes_made_it(writer: BulkWriter) -> bool:
+	"""
+	Flushes the writer, and tells whether every write so far made it into the db. Nothing may be swept otherwise:
+	the touches that would have kept live resources (and their subtrees) may be among the writes that were lost.
+
+	:param (BulkWriter) writer
+	:return: (bool) whether no flush failed since the writer's failures were last popped
+	"""
+	writer.flush()
+	if writer.failures > 0:
+		print("Some writes of this round didn't make it into the db, not removing anything.")
+		return False
+	return True
+
+def sweep_round(writer: BulkWriter, generation: int, app_failures: List[str], crawled_clusters: List[str]) -> None:
+	"""
+	Removes everything that wasn't seen in this crawl generation, along with descendants that weren't seen either
+	and associated edges. Resources in clusters that errored or timed out are kept, unless the cluster itself is gone,
+	and nothing is removed if any write of the round was lost (see writes_made_it()).
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (List[str]) app_failures: clusters whose Applications couldn't be listed (or haven't been yet), as returned by load_apps()
+	:param (List[str]) crawled_clusters: clusters that were crawled, as returned by collect_crawls()
+	"""
+	if not writes_made_it(writer):
+		return
+	writer.sweep_resources(generation, [ "Cluster" ])
+	sweep_apps(writer, generation, app_failures)
+	writer.sweep_resources(generation, CLUSTER_RTYPES, clusters=crawled_clusters)
+	writer.sweep_edges(generation, CLUSTER_RELATIONS, clusters=crawled_clusters)
+	writer.flush()
+
+def record_crawl(cname: str, due: List[str], found: Dict = None, error: str = None) -> bool:
+	"""
+	Tells the scheduler how a cluster crawl went. A cluster that errored or took too long is backed off.
+
+	:param (str) cname: cluster name
+	:param (List[str]) due: kinds the crawl listed again
+	:param (Dict) found: result of crawl_cluster(), if it finished
+	:param (str) error: why the crawl failed, or None if it finished
+	:return: (bool) whether the cluster was crawled, i.e. its stale resources can be swept
+	"""
+	if error is not None:
+		print("Could not crawl cluster", cname + ", keeping its resources from the last round:", error)
+		scheduler.failed(cname)
+		CLUSTER_FAILURES.inc(cluster=cname)
+		return False
+	if len(due) > 0:
+		scheduler.succeeded(cname, due, None if found is None else found["anomalous"])
+	if found is None:
+		print("Not all of cluster", cname + "'s kinds have been listed yet, keeping its resources from the last round.")
+		return False
+	return True
+
+def start_crawls(writer: BulkWriter, generation: int, due: Dict[str, List[str]]) -> Dict:
+	"""
+	Starts a crawl_cluster() on cluster_pool for every cluster, except the ones whose crawl from an earlier round
+	is still running (see running_crawls).
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (Dict[str, List[str]]) due: cluster name : kinds to list again
+	:return: (Dict) cluster name : future of its crawl_cluster() call, for the crawls that were started
+	"""
+	cluster_futures = {}
+	for cname in due:
+		if cname in running_crawls:
+			continue
+		running_crawls.add(cname)
+		cluster_futures[cname] = cluster_pool.submit(crawl_cluster, writer, generation, cname, due[cname])
+		cluster_futures[cname].add_done_callback(lambda _, cname=cname: running_crawls.discard(cname))
+	return cluster_futures
+
+def collect_crawls(cluster_futures: Dict, due: Dict[str, List[str]], timeout: float) -> List[str]:
+	"""
+	Waits for the cluster crawls started with start_crawls(), and tells the scheduler how they went.
+	A cluster that errored, is taking too long or is still being crawled from an earlier round is skipped for this round
+	(and backed off), and the data it already has in the db is left as is.
+
+	:param (Dict) cluster_futures: cluster name : future of its crawl_cluster() call
+	:param (Dict[str, List[str]]) due: cluster name : kinds its crawl listed again
+	:param (float) timeout: seconds to wait for the crawls that haven't finished yet
+	:return: (List[str]) names of the clusters that were crawled
+	"""
+	_, not_done = wait(cluster_futures.values(), timeout=max(0, timeout))
+	crawled_clusters = []	# clusters whose crawl finished this round
+	for cname in due:
+		future = cluster_futures.get(cname)
+		if future is None:
+			crawled = record_crawl(cname, due[cname], error="still crawling from an earlier round")
+		elif future in not_done:
+			future.cancel()
+			crawled = record_crawl(cname, due[cname], error="timed out")
+		else:
+			try:
+				crawled = record_crawl(cname, due[cname], future.result())
+			except Exception as e:
+				crawled = record_crawl(cname, due[cname], error=repr(e))
+		if crawled:
+			crawled_clusters.append(cname)
+	return crawled_clusters
+
+def collect_shards(coordinator: ShardCoordinator, generation: int, due: Dict[str, List[str]], timeout: float) -> List[str]:
+	"""
+	Same as collect_crawls(), for the crawls the coordinator's worker processes were sent by load_all().
+	Also takes in what the workers know about the clusters they crawled, and the writes they made or skipped.
+
+	:param (ShardCoordinator) coordinator
+	:param (int) generation: crawl generation of this round
+	:param (Dict[str, List[str]]) due: cluster name : kinds its crawl listed again
+	:param (float) timeout: seconds to wait for the workers that haven't finished yet
+	:return: (List[str]) names of the clusters that were crawled
+	"""
+	outcomes, (written, skipped) = coordinator.wait_round(generation, max(0, timeout))
+	WRITES.inc(written, result="written")
+	WRITES.inc(skipped, result="skipped")
+	crawled_clusters = []
+	for cname in due:
+		outcome = outcomes.get(cname, { "error": "timed out" })
+		if "sizes" in outcome:
+			with caches_lock:
+				listed_sizes[cname] = outcome["sizes"]
+			shard_deployers[cname] = outcome["deployers"]
+		if record_crawl(cname, due[cname], outcome.get("found"), outcome.get("error")):
+			crawled_clusters.append(cname)
+	for cname in list(shard_deployers):
+		if cname not in due:
+			shard_deployers.pop(cname)
+	return crawled_clusters
+
+def crawl_shard(shard: int, commands, results) -> None:
+	"""
+	Worker process of the sharded crawl mode, run by a ShardCoordinator. Every round it crawls the clusters it is sent
+	with crawl_cluster(), and puts their serialized writes, then the outcome of every crawl that finished, on the results queue.
+	Caches of clusters that moved to another shard are dropped.
+
+	:param (int) shard: number of the worker
+	:param commands: multiprocessing queue the rounds come in on, see ShardCoordinator.start_round()
+	:param results: multiprocessing queue read by the coordinator
+	"""
+	writer = QueueWriter(results, CrawlerConfig.BULK_CHUNK_SIZE)
+	if CrawlerConfig.METRICS_PORT > 0:
+		start_http_server(CrawlerConfig.METRICS_PORT + 1 + shard)
+
+	while True:
+		try:
+			generation, due, contexts, clear, deadline = commands.get()
+		except KeyboardInterrupt:
+			return
+		k8s_config.cc_mapping.update(contexts)
+		with caches_lock:
+			for cname in list(listed_cache):
+				if cname not in due:
+					listed_cache.pop(cname)
+					listed_sizes.pop(cname, None)
+		if clear:
+			tracker.clear()
+
+		futures = start_crawls(writer, generation, due)
+		# the coordinator stops waiting at the deadline, so crawls still running then are reported as timed out
+		_, not_done = wait(futures.values(), timeout=max(0, deadline - time.time()))
+		outcomes = {}	# cluster name : outcome, for the coordinator's collect_shards()
+		for cname, future in futures.items():
+			if future in not_done:
+				future.cancel()
+				continue
+			try:
+				found = future.result()
+			except Exception as e:
+				outcomes[cname] = { "error": repr(e) }
+				continue
+			outcomes[cname] = { "found": found, "sizes": listed_sizes.get(cname, {}), "deployers": cluster_deployers(cname) }
+
+		writer.flush()
+		tracker.end_round()
+		results.put(("round", shard, generation, outcomes, tracker.pop_counts()))
+
+def raw_namespace(obj: Dict) -> str:
+	"""
+	:param (Dict) obj: k8s object, as a dict
+	:return: (str) namespace of the object
+	"""
+	return obj["metadata"].get("namespace")
+
+def raw_labels(obj: Dict) -> Dict:
+	"""
+	:param (Dict) obj: k8s object, as a dict
+	:return: (Dict) labels of the object, or None
+	"""
+	return obj["metadata"].get("labels")
+
+def write_namespaces(writer: BulkWriter, generation: int, cname: str, nss: List) -> Dict[str, str]:
+	"""
+	Writes the namespaces of a cluster, and marks them and their edges as seen in this crawl generation.
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (str) cname: cluster name
+	:param (List) nss: namespace objects, as dicts
+	:return: (Dict[str, str]) namespace name : skipper uid
+	"""
+	ns_uids = {}
+	for ns in nss:
+		md = ns["metadata"]
+		ns_uid = cname + "_" + md["uid"]
+		ns_uids[md["name"]] = ns_uid
+		if tracker.changed(ns_uid, md.get("resourceVersion")):
+			ns_resource, _ = records.namespace_record(ns, cname)
+			writer.add_resource(ns_resource)
+
+	writer.touch_resources(list(ns_uids.values()), generation)
+	writer.touch_edges([ (cname, ns_uid, "Cluster<-Namespace") for ns_uid in ns_uids.values() ], generation)
+	return ns_uids
+
+def write_workloads(writer: BulkWriter, generation: int, cname: str, listed: Dict[str, List], ns_uids: Dict[str, str]) -> set:
+	"""
+	Writes the deployments, services, daemonsets and statefulsets of a cluster, and marks them and their edges as seen in this crawl generation.
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (str) cname: cluster name
+	:param (Dict[str, List]) listed: k8s objects of the cluster as dicts, keyed like LISTERS
+	:param (Dict[str, str]) ns_uids: namespace name : skipper uid, as returned by write_namespaces()
+	:return: (set) skipper uids of the deployments, daemonsets and statefulsets, which pods can be owned by
+	"""
+	workload_uids = set()
+	for rtype, key, _ in WORKLOAD_KINDS:
+		obj_uids = []
+		obj_edges = []
+		for obj in listed[key]:
+			md = obj["metadata"]
+			obj_uid = cname + "_" + md["uid"]
+			ns_uid = ns_uids.get(md.get("namespace"))
+			obj_uids.append(obj_uid)
+			if ns_uid is not None:
+				obj_edges.append((ns_uid, obj_uid, "Namespace<-" + rtype))
+			if rtype != "Service":
+				workload_uids.add(obj_uid)
+			if tracker.changed(obj_uid, (md.get("resourceVersion"), ns_uid)):
+				obj_resource, _ = records.workload_record(obj, rtype, cname, ns_uid)
+				writer.add_resource(obj_resource)
+		writer.touch_resources(obj_uids, generation)
+		writer.touch_edges(obj_edges, generation)
+	return workload_uids
+
+def write_pods(writer: BulkWriter, generation: int, cname: str, listed: Dict[str, List], ns_uids: Dict[str, str],
+				workload_uids: set) -> Tuple[List[str], Dict[str, List[str]], List[Tuple[str, str, str]], bool]:
+	"""
+	Lists the pods of a cluster a page at a time. The pods of each page are linked to the workload that owns them
+	(through their owner references) and to the services that select them (through a label-selector index of the page),
+	written, and marked (along with its edges) as seen in this crawl generation before the next page is fetched. Each pod is
+	classified and serialized once however many parents it has (see PodRegistry), the other parents only add an edge.
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (str) cname: cluster name
+	:param (Dict[str, List]) listed: k8s objects of the cluster as dicts, keyed like LISTERS
+	:param (Dict[str, str]) ns_uids: namespace name : skipper uid, as returned by write_namespaces()
+	:param (set) workload_uids: skipper uids of the workloads pods can be owned by, as returned by write_workloads()
+	:return: ((List[str]) skipper uids of the pods,
+			  (Dict[str, List[str]]) workload skipper uid : skipper uids of the pods it owns,
+			  (List[Tuple[str, str, str]]) (start_uid, end_uid, relation) of the pods' edges,
+			  (bool) whether any pod has sev_measure 1)
+	"""
+	resolver = ownership.OwnershipResolver(listed["rsets"])
+	pod_uids = []
+	owned = {}
+	pod_edges = []
+	anomalous = False
+	for page in LISTERS["pods"](cname, CrawlerConfig.PAGE_SIZE, raw=True):
+		OBJECTS_LISTED.inc(len(page), cluster=cname, kind="pods")
+		registry = PodRegistry(cname)
+		for pod in page:
+			registry.add(pod)
+		anomalous = anomalous or registry.anomalous()
+
+		# find the workload managing every pod, and the pods selected by every service. Pods that no workload owns
+		# (bare pods, pods of jobs, etc.) go right under their namespace, as a ClusterWatcher writes them. Pods whose
+		# replicaset or workload was created after it was listed are left for the next round
+		for pod in page:
+			owner = resolver.workload_owner(pod)
+			if owner is not None and cname + "_" + owner[1] in workload_uids:
+				registry.add_parent(pod, cname + "_" + owner[1], owner[0])
+				owned.setdefault(cname + "_" + owner[1], []).append(cname + "_" + pod["metadata"]["uid"])
+			elif owner is None:
+				missing = resolver.missing_owner(pod)
+				ns_uid = ns_uids.get(raw_namespace(pod))
+				if (missing is None or missing[0] != "ReplicaSet") and ns_uid is not None:
+					registry.add_parent(pod, ns_uid, "Namespace")
+		pod_index = label_selectors.LabelIndex(page, namespace_of=raw_namespace, labels_of=raw_labels)
+		for svc in listed["svcs"]:
+			for pod in pod_index.select(raw_namespace(svc), (svc.get("spec") or {}).get("selector")):
+				registry.add_parent(pod, cname + "_" + svc["metadata"]["uid"], "Service")
+
+		page_edges = []
+		for pod_uid, pod, state, parents in registry:
+			md = pod["metadata"]
+			ns_uid = ns_uids.get(md.get("namespace"))
+			for parent_uid, parent_type in parents:
+				page_edges.append((parent_uid, pod_uid, parent_type + "<-Pod"))
+				# the workload (or namespace) parent writes the pod itself, so it changes with the pod. A service only adds
+				# the edge, which is touched with the rest of the page's. Keep one fingerprint per workload parent
+				if parent_type == "Service":
+					continue
+				if tracker.changed(pod_uid, (md.get("resourceVersion"), ns_uid, parent_type), tag=parent_uid):
+					pod_resource, _ = records.pod_record(pod, cname, ns_uid, parent_uid, parent_type, state)
+					writer.add_resource(pod_resource)
+
+		page_uids = list(registry.pods)
+		writer.touch_resources(page_uids, generation)
+		writer.touch_edges(page_edges, generation)
+		pod_uids += page_uids
+		pod_edges += page_edges
+	return pod_uids, owned, pod_edges, anomalous
+
+def cluster_deployers(cname: str) -> List[Tuple[Tuple[str, str, str], str, List[str]]]:
+	"""
+	:param (str) cname: cluster name
+	:return: (List[Tuple[Tuple[str, str, str], str, List[str]]]) ((kind, namespace, name), skipper uid, skipper uids of the pods
+			it owns) of every deployment, service, daemonset and statefulset of the cluster, from what its crawl (or its watcher,
+			or the crawl process of its shard) last listed
+	"""
+	if cname in watchers:
+		return watchers[cname].deployers()
+	if cname in shard_deployers:
+		return shard_deployers[cname]
+
+	deployers = []
+	listed = listed_cache.get(cname, {})
+	owned = listed.get("owned", {})
+	for rtype, key, _ in WORKLOAD_KINDS:
+		for obj in listed.get(key, []):
+			md = obj["metadata"]
+			uid = cname + "_" + md["uid"]
+			deployers.append(((rtype, md.get("namespace"), md["name"]), uid, owned.get(uid, [])))
+	return deployers
+
+def deployer_index(cluster_names: List[str]) -> DeployerIndex:
+	"""
+	Indexes the deployments, services, daemonsets and statefulsets of every cluster by (kind, namespace, name),
+	so deployables can be matched to their deployers without api calls.
+
+	:param (List[str]) cluster_names: clusters to index, in the order matches are preferred
+	:return: (DeployerIndex) (kind, namespace, name) : (skipper uid, skipper uids of the pods it owns) of every match
+	"""
+	index = DeployerIndex()
+	for cname in cluster_names:
+		for (kind, namespace, name), uid, pod_uids in cluster_deployers(cname):
+			index.add(kind, namespace, name, (uid, pod_uids))
+	return index
+
+def load_app_edges(writer: BulkWriter, generation: int, all_dpbs: List[Dict], index: DeployerIndex) -> None:
+	"""
+	Creates edges between deployables and the resources they deploy (marking them as seen in this crawl generation),
+	and sets the app_path of those resources and their pods.
+	A deployer that exists in several clusters is matched to the first one in the index.
+
+	:param (BulkWriter) writer
+	:param (int) generation: crawl generation of this round
+	:param (List[Dict]) all_dpbs: deployables returned by load_apps()
+	:param (DeployerIndex) index: deployers, as returned by deployer_index()
+	"""
+
 	split_start = time.time()
+	resource_edges = []
 	for dpb in all_dpbs:
 		cname = dpb["metadata"]["cluster_name"]
-		ns_name = dpb["metadata"]["namespace"]
 		app_name = dpb["metadata"]["app_name"]
 		app_uid = dpb["metadata"]["app_uid"]
-		dpb_name = dpb["metadata"]["name"]
 		dpb_uid = cname + "_" + dpb["metadata"]["uid"]
-		resource = amb.deployable_resource(cluster_name=cname, namespace=ns_name, deployable_name=dpb_name)
 
 		# case: helm charts
-		if resource == {}:
+		key = deployer_key(dpb)
+		if key is None:
+			continue
+		matches = index.lookup(*key)
+		if len(matches) == 0:
 			continue
 
-		resource_uid = resource["metadata"]["cluster_name"] + "_" + resource["metadata"]["uid"]
-		resource_edge = {"start_uid": dpb_uid, "end_uid": resource_uid, "relation": "Deployable<-" + resource["kind"]}
-		requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(dpb_uid, resource_uid), data=resource_edge)
+		resource_uid, pod_uids = matches[0]
+		resource_edges.append((dpb_uid, resource_uid, "Deployable<-" + key[0]))
 
 		# update app_path of resource
 		update_info = {"uid": resource_uid, "app_path": "/root/{}/{}/".format(app_uid, dpb_uid), "application" : app_name}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(resource_uid), data=update_info)
+		if tracker.changed(resource_uid, update_info, tag="app"):
+			writer.add_resource(update_info)
 
 		# update app_path of the resource's pods
-		pods = []
-		if resource["kind"] == "Deployment":
-			pods = cmb.deployment_pods(cluster_name=resource["metadata"]["cluster_name"],
-											namespace=resource["metadata"]["namespace"],
-											deploy_name=resource["metadata"]["name"])
-		elif resource["kind"] == "DaemonSet":
-			pods = cmb.daemon_set_pods(cluster_name=resource["metadata"]["cluster_name"],
-											namespace=resource["metadata"]["namespace"],
-											dset_name=resource["metadata"]["name"])
-		elif resource["kind"] == "StatefulSet":
-			pods = cmb.stateful_set_pods(cluster_name=resource["metadata"]["cluster_name"],
-											namespace=resource["metadata"]["namespace"],
-											sset_name=resource["metadata"]["name"])
-		for pod in pods:
-			pod_uid = resource["metadata"]["cluster_name"] + "_" + pod.metadata.uid
+		for pod_uid in pod_uids:
 			update_info = {"uid": pod_uid, "application": app_name, "app_path": "/root/{}/{}/{}/".format(app_uid, dpb_uid, resource_uid)}
-			requests.post('http://127.0.0.1:5000/resource/{}'.format(pod_uid), data=update_info)
+			if tracker.changed(pod_uid, update_info, tag="app"):
+				writer.add_resource(update_info)
 
+	writer.touch_edges(resource_edges, generation)
+	writer.flush()
 	print("Updated app_paths and created app mode edges in %d seconds." % (time.time() - split_start))
 
+def subtree_freshness() -> Dict[str, Dict[str, float]]:
+	"""
+	:return: (Dict[str, Dict[str, float]]) cluster name : { rtype : time every kind of SUBTREE_KINDS[rtype] was last listed
+			in the cluster }. In watch mode the watched kinds of clusters whose watches are all running are always fresh
+	"""
+	now = time.time()
+	refreshed_at = {}	# (cluster, kind) : time
+	for (cname, kind), last in list(scheduler.last_refresh.items()):
+		refreshed_at[(cname, kind)] = last
+	for cname, watcher in list(watchers.items()):
+		if len(watcher.resource_versions) == len(WATCHED_KINDS):
+			refreshed_at.update({ (cname, key): now for key in LISTERS })
+
+	freshness = {}
+	for cname in set(cname for cname, _ in refreshed_at):
+		for rtype, keys in SUBTREE_KINDS.items():
+			if all((cname, key) in refreshed_at for key in keys):
+				freshness.setdefault(cname, {})[rtype] = min(refreshed_at[(cname, key)] for key in keys)
+	return freshness
+
+def serve_refresh_requests() -> None:
+	"""
+	Runs in the background for as long as the crawler does. Tells the webserver how fresh each subtree is, and takes
+	the refreshes users asked for by navigating into resources: the kinds in those subtrees are handed to the scheduler
+	to go first in the next round (budget and backoffs still apply), and the crawl loop is woken up for it.
+	"""
+	while True:
+		try:
+			response = requests.post("http://127.0.0.1:5000/refresh", params={ "wait": CrawlerConfig.REFRESH_POLL_INTERVAL },
+									json={ "freshness": subtree_freshness() })
+			pairs = set()
+			for refresh in response.json()["requests"]:
+				pairs.update((refresh["cluster"], key) for key in SUBTREE_KINDS.get(refresh["rtype"], []))
+			if CrawlerConfig.CRAWL_MODE == "watch":
+				# watched kinds are always fresh, only applications are listed on a timer
+				pairs = set(pair for pair in pairs if pair[1] == "apps")
+		except Exception as e:
+			print("Could not get refresh requests from the webserver:", repr(e))
+			time.sleep(CrawlerConfig.REFRESH_POLL_INTERVAL)
+			continue
+		if len(pairs) > 0:
+			scheduler.request(pairs)
+			refresh_requested.set()
+
+def checkpoint_state(generation: int) -> Dict:
+	"""
+	:param (int) generation: crawl generation of the round that just ended, every write of which made it into the db
+	:return: (Dict) what the crawler knows after the round, for checkpoint.save(). In sharded mode the worker processes'
+			listings and fingerprints aren't included, only the coordinator's (clusters and applications)
+	"""
+	with caches_lock:
+		listed, sizes, apps = { cname: dict(listed) for cname, listed in listed_cache.items() }, dict(listed_sizes), dict(app_cache)
+	return { "mode": CrawlerConfig.CRAWL_MODE, "generation": generation, "fingerprints": tracker.snapshot(),
+			"listed": listed, "sizes": sizes, "apps": apps, "mcm": dict(mcm_cache), "last_refresh": dict(scheduler.last_refresh),
+			"anomalous": set(scheduler.anomalous), "watchers": { cname: watcher.checkpoint() for cname, watcher in watchers.items() } }
+
+def checkpoint_due() -> bool:
+	"""
+	:return: (bool) whether checkpoints are on and the last one was saved at least CrawlerConfig.CHECKPOINT_INTERVAL seconds ago
+	"""
+	return bool(CrawlerConfig.CHECKPOINT_PATH) and time.time() - checkpoint_saved_at >= CrawlerConfig.CHECKPOINT_INTERVAL
+
+def save_checkpoint(state: Dict) -> None:
+	"""
+	Saves a checkpoint to CrawlerConfig.CHECKPOINT_PATH, if checkpoints are on. A checkpoint that can't be saved
+	only costs the next restart its head start, so errors are printed and the crawl goes on.
+	:param (Dict) state: as returned by checkpoint_state()
+	"""
+	global checkpoint_saved_at
+	if not CrawlerConfig.CHECKPOINT_PATH:
+		return
+	try:
+		checkpoint.save(CrawlerConfig.CHECKPOINT_PATH, state)
+	except Exception as e:
+		print("Could not save crawl checkpoint:", repr(e))
+	checkpoint_saved_at = time.time()
+
+def restore_checkpoint() -> Dict:
+	"""
+	Picks up from the checkpoint saved at CrawlerConfig.CHECKPOINT_PATH, if it belongs to the db the webserver has:
+	every (cluster, kind) that was listed is taken from the checkpoint and only listed again once the scheduler
+	says it is due, and what was already written isn't written again. A checkpoint newer than anything in the db
+	(e.g. the db was deleted) or from another crawl mode is ignored, and the crawler starts from scratch.
+
+	:return: (Dict) cluster name : state of its ClusterWatcher to restore in watch mode, see ClusterWatcher.restore()
+	"""
+	state = checkpoint.load(CrawlerConfig.CHECKPOINT_PATH) if CrawlerConfig.CHECKPOINT_PATH else None
+	if state is None:
+		return {}
+	if state["mode"] != CrawlerConfig.CRAWL_MODE:
+		print("Ignoring crawl checkpoint saved in", state["mode"], "mode.")
+		return {}
+	db_generation = requests.get("http://127.0.0.1:5000/generation").json()["generation"]
+	if db_generation is None or db_generation < state["generation"]:
+		print("Ignoring crawl checkpoint, the db doesn't have what it says was written.")
+		return {}
+
+	tracker.restore(state["fingerprints"])
+	listed_cache.update(state["listed"])
+	listed_sizes.update(state["sizes"])
+	app_cache.update(state["apps"])
+	mcm_cache.update(state["mcm"])
+	# only pairs whose listing was restored can wait until they are due, the rest are listed right away
+	for (cname, kind), refreshed_at in state["last_refresh"].items():
+		if kind in listed_cache.get(cname, {}) or (kind == "apps" and cname in app_cache) or kind == "mcm":
+			scheduler.last_refresh[(cname, kind)] = refreshed_at
+	scheduler.anomalous.update(cname for cname in state["anomalous"] if cname in listed_cache)
+	print("Resuming from crawl checkpoint: %d of %d kinds across your clusters are up to date." %
+			(len(scheduler.last_refresh), len(state["last_refresh"])))
+	return state["watchers"]
+
+def load_all(coordinator: ShardCoordinator = None) -> None:
+	"""
+	Loads all Resources and Edges into the database.
+
+	:param (ShardCoordinator) coordinator: in sharded mode, runs the cluster crawls in its worker processes instead of on cluster_pool
+	"""
+
+	# resource and edge writes are buffered and sent to the webserver in bulk
+	writer = BulkWriter("http://127.0.0.1:5000/bulk", CrawlerConfig.BULK_CHUNK_SIZE) if coordinator is None else coordinator.writer
+	# everything found this round is marked with the round's generation, and whatever isn't gets swept at the end
+	generation = int(time.time() * 1000)
+
+	start = time.time()         # time how long one round of load-all takes
+	split_start = time.time()   # time how long each portion takes
+
+	print("\nStarting a round of load-all. Strap yourself in, astronaut.")
+
+	# pick the kinds that are due in each cluster
+	cluster_names = k8s_config.all_cluster_names()
+	costs = crawl_costs(cluster_names)
+	granted = scheduler.plan(costs)
+	due = { cname: [ key for key in LISTERS if (cname, key) in granted ] for cname in cluster_names }
+	print("Refreshing %d of %d kinds across your clusters." % (len(granted), len(costs)))
+
+	# start crawling (and writing) every cluster in the background, the crawls are waited for after the application phase
+	if coordinator is None:
+		cluster_futures = start_crawls(writer, generation, due)
+	else:
+		coordinator.start_round(generation, due, { cname: k8s_config.context_for_cluster(cname) for cname in cluster_names },
+								start + CrawlerConfig.CLUSTER_TIMEOUT)
+
+	# insert all clusters into the database
+	refresh_mcm = ("", "mcm") in granted
+	with PHASE_DURATION.time(phase="clusters"):
+		load_clusters(writer, generation, refresh_mcm)
+	if refresh_mcm:
+		scheduler.refreshed("", [ "mcm" ])
+	print("Wrote %d clusters in %d seconds." % (len(cluster_names), time.time() - split_start))
+
+	# insert all applications and deployables into the database.
+	# a cluster without the application crd fails to list them every time, so that doesn't back the cluster off
+	app_clusters = [ cname for cname in cluster_names if (cname, "apps") in granted ]
+	with PHASE_DURATION.time(phase="apps"):
+		all_dpbs, app_failures = load_apps(writer, generation, cluster_names, app_clusters)
+	for cname in app_clusters:
+		scheduler.refreshed(cname, [ "apps" ])
+
+	# wait for the cluster crawls, which write what they find as they go
+	with PHASE_DURATION.time(phase="crawl_wait"):
+		timeout = CrawlerConfig.CLUSTER_TIMEOUT - (time.time() - start)
+		if coordinator is None:
+			crawled_clusters = collect_crawls(cluster_futures, due, timeout)
+		else:
+			crawled_clusters = collect_shards(coordinator, generation, due, timeout)
+	print("Crawled %d of %d clusters in %d seconds." % (len(crawled_clusters), len(cluster_names), time.time() - start))
+
+	# create edges between deployables and their resources
+	with PHASE_DURATION.time(phase="app_edges"):
+		load_app_edges(writer, generation, all_dpbs, deployer_index(cluster_names))
+
+	# remove everything that wasn't seen this round
+	split_start = time.time()
+	with PHASE_DURATION.time(phase="sweep"):
+		sweep_round(writer, generation, app_failures, crawled_clusters)
+	tracker.end_round()
+	print("Removed stale resources in %d seconds." % (time.time() - split_start))
+
+	# anything that didn't make it into the db has to be written again next round, otherwise the round can be resumed from
+	if writer.pop_failures() > 0:
+		tracker.clear()
+		if coordinator is not None:
+			coordinator.clear_trackers = True
+	elif checkpoint_due():
+		save_checkpoint(checkpoint_state(generation))
+	written, skipped = tracker.pop_counts()
+	WRITES.inc(written, result="written")
+	WRITES.inc(skipped, result="skipped")
+	print("Wrote %d objects and skipped %d unchanged ones." % (written, skipped))
+	CYCLE_DURATION.observe(time.time() - start)
 	print("Total time elapsed: {} secs".format(time.time()-start))
 
+def watch_all(watcher_states: Dict = None) -> None:
+	"""
+	Incremental alternative to calling load_all() in a loop. Every cluster's namespaces, workloads and pods
+	are listed once and then kept up to date from watch events, so changes reach the db within seconds
+	without re-listing. Applications and deployables are still re-listed every APP_REFRESH_INTERVAL seconds.
+
+	:param (Dict) watcher_states: cluster name : state of its ClusterWatcher from a crawl checkpoint, those clusters
+								are watched from where the checkpoint left off instead of being listed again
+	"""
+
+	# watch events trickle in, so flush them on a timer instead of waiting for a full chunk
+	writer = BulkWriter("http://127.0.0.1:5000/bulk", CrawlerConfig.BULK_CHUNK_SIZE)
+	writer.start_autoflush(CrawlerConfig.WATCH_FLUSH_INTERVAL)
+
+	print("\nStarting to watch your clusters.")
+	generation = int(time.time() * 1000)
+	cluster_names = load_clusters(writer, generation)
+	if writes_made_it(writer):
+		writer.sweep_resources(generation, [ "Cluster" ])
+	for cname in cluster_names:
+		watchers[cname] = ClusterWatcher(cname, writer, generation)
+		if cname in (watcher_states or {}):
+			watchers[cname].restore(watcher_states[cname])
+		watchers[cname].start()
+
+	while True:
+		start = time.time()
+		generation = int(time.time() * 1000)
+		all_dpbs, app_failures = load_apps(writer, generation, cluster_names, cluster_names)
+		load_app_edges(writer, generation, all_dpbs, deployer_index(cluster_names))
+		if writes_made_it(writer):
+			sweep_apps(writer, generation, app_failures)
+		tracker.end_round()
+		# the watchers' state is taken before the flush, so every event it covers is in the db once the flush went through
+		state = checkpoint_state(generation) if checkpoint_due() else None
+		writer.flush()
+		if writer.pop_failures() > 0:
+			tracker.clear()
+		elif state is not None:
+			save_checkpoint(state)
+		for cname in cluster_names:
+			if cname not in app_failures:
+				scheduler.refreshed(cname, [ "apps" ])
+		print("Refreshed applications in {} secs".format(time.time()-start))
+		# applications are listed again early when a user asks for one to be refreshed
+		refresh_requested.wait(CrawlerConfig.APP_REFRESH_INTERVAL)
+		refresh_requested.clear()
+
 if __name__ == "__main__":
 
 	# wait for the webserver to come up
@@ -439,9 +993,31 @@ if __name__ == "__main__":
 		else:
 			break
 
+	# in sharded mode the cluster crawls run in worker processes.
+	# the accessible clusters are looked up again every CLUSTER_REFRESH_INTERVAL seconds, so the shards follow
+	# clusters appearing and disappearing
+	coordinator = None
+	if CrawlerConfig.CRAWL_MODE == "sharded":
+		coordinator = ShardCoordinator(CrawlerConfig.CRAWL_PROCESSES, crawl_shard,
+										BulkWriter("http://127.0.0.1:5000/bulk", CrawlerConfig.BULK_CHUNK_SIZE))
+	clusters_refreshed_at = time.time()
+
+	if CrawlerConfig.METRICS_PORT > 0:
+		start_http_server(CrawlerConfig.METRICS_PORT)
+
 	try:
-		# crawl continuously
+		watcher_states = restore_checkpoint()
+		threading.Thread(target=serve_refresh_requests, name="refresh requests", daemon=True).start()
+		if CrawlerConfig.CRAWL_MODE == "watch":
+			watch_all(watcher_states)
+
+		# crawl continuously, as often as the scheduler has something due or a user asks for a refresh
 		while True:
-			load_all()
+			if coordinator is not None and time.time() - clusters_refreshed_at > CrawlerConfig.CLUSTER_REFRESH_INTERVAL:
+				k8s_config.update_available_clusters()
+				clusters_refreshed_at = time.time()
+			refresh_requested.clear()
+			load_all(coordinator)
+			refresh_requested.wait(max(1, scheduler.seconds_until_due(crawl_costs(k8s_config.all_cluster_names()))))
 	except KeyboardInterrupt as e:
 		sys.exit(0)
@@ -0,0 +1,56 @@
+import os
+
+class CrawlerConfig(object):
+	# number of clusters that are crawled at the same time
+	CLUSTER_WORKERS = int(os.environ.get("SKIPPER_CLUSTER_WORKERS", 8))
+	# number of per-namespace / per-workload list calls that can be in flight at the same time
+	LIST_WORKERS = int(os.environ.get("SKIPPER_LIST_WORKERS", 32))
+	# seconds to wait on a single cluster before giving up on it for the current round
+	CLUSTER_TIMEOUT = int(os.environ.get("SKIPPER_CLUSTER_TIMEOUT", 300))
+	# number of pods fetched per list request. Each page is written before the next one is fetched,
+	# so this bounds how many pod objects a cluster crawl holds at once
+	PAGE_SIZE = int(os.environ.get("SKIPPER_PAGE_SIZE", 500))
+	# number of resource / edge writes sent to the webserver's /bulk endpoint per request
+	BULK_CHUNK_SIZE = int(os.environ.get("SKIPPER_BULK_CHUNK_SIZE", 2000))
+	# "full" re-lists everything every round, "watch" lists once and then follows watch events,
+	# "sharded" is like full but spreads the cluster crawls over CRAWL_PROCESSES worker processes
+	CRAWL_MODE = os.environ.get("SKIPPER_CRAWL_MODE", "full")
+	# "threads" makes the list calls of a crawl from list_pool's threads, one blocking request per thread, "asyncio" makes
+	# them concurrently from one event loop over pooled connections (see backend/aio_backend.py, needs aiohttp)
+	BACKEND = os.environ.get("SKIPPER_BACKEND", "threads")
+	# number of worker processes in sharded mode
+	CRAWL_PROCESSES = int(os.environ.get("SKIPPER_CRAWL_PROCESSES", os.cpu_count() or 4))
+	# seconds between looking up the accessible clusters again in sharded mode
+	CLUSTER_REFRESH_INTERVAL = float(os.environ.get("SKIPPER_CLUSTER_REFRESH_INTERVAL", 300))
+	# seconds a single watch request stays open before it is renewed from the last resourceVersion
+	WATCH_TIMEOUT = int(os.environ.get("SKIPPER_WATCH_TIMEOUT", 300))
+	# seconds to wait before retrying a failed list or watch
+	WATCH_RETRY_INTERVAL = int(os.environ.get("SKIPPER_WATCH_RETRY_INTERVAL", 5))
+	# seconds between flushes of the writes coming from watch events
+	WATCH_FLUSH_INTERVAL = float(os.environ.get("SKIPPER_WATCH_FLUSH_INTERVAL", 1))
+	# seconds between re-lists of applications and deployables in watch mode
+	APP_REFRESH_INTERVAL = int(os.environ.get("SKIPPER_APP_REFRESH_INTERVAL", 60))
+	# seconds between re-lists of each kind in full mode, see scheduler.py
+	MCM_INTERVAL = float(os.environ.get("SKIPPER_MCM_INTERVAL", 300))
+	NAMESPACE_INTERVAL = float(os.environ.get("SKIPPER_NAMESPACE_INTERVAL", 300))
+	WORKLOAD_INTERVAL = float(os.environ.get("SKIPPER_WORKLOAD_INTERVAL", 60))
+	POD_INTERVAL = float(os.environ.get("SKIPPER_POD_INTERVAL", 15))
+	APP_INTERVAL = float(os.environ.get("SKIPPER_APP_INTERVAL", 120))
+	# factor the intervals are divided by for clusters with anomalies
+	ANOMALY_SPEEDUP = float(os.environ.get("SKIPPER_ANOMALY_SPEEDUP", 4))
+	# seconds to wait before retrying a cluster that failed, doubled on every failure in a row up to BACKOFF_MAX
+	BACKOFF_BASE = float(os.environ.get("SKIPPER_BACKOFF_BASE", 5))
+	BACKOFF_MAX = float(os.environ.get("SKIPPER_BACKOFF_MAX", 600))
+	# api requests the crawler can make per minute, across all clusters
+	REQUEST_BUDGET = float(os.environ.get("SKIPPER_REQUEST_BUDGET", 600))
+	# most seconds the crawler waits on the webserver for subtrees users want refreshed, before it reports how fresh
+	# its data is again (see /refresh)
+	REFRESH_POLL_INTERVAL = float(os.environ.get("SKIPPER_REFRESH_POLL_INTERVAL", 5))
+	# file the crawler saves its progress to at the end of a round (listings, fingerprints of what was written, and the
+	# resourceVersions watches were at), so that a restart against the same db resumes instead of starting over. Empty turns it off
+	CHECKPOINT_PATH = os.environ.get("SKIPPER_CHECKPOINT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "crawler.checkpoint"))
+	# least seconds between two checkpoints. A checkpoint holds every listing kept between rounds, so it grows with the clusters
+	# and isn't worth saving after every round; a restart resumes from a checkpoint up to this old
+	CHECKPOINT_INTERVAL = float(os.environ.get("SKIPPER_CHECKPOINT_INTERVAL", 300))
+	# port the crawler serves prometheus metrics on (http://127.0.0.1:<port>/metrics), 0 to turn it off
+	METRICS_PORT = int(os.environ.get("SKIPPER_METRICS_PORT", 5001))
@@ -0,0 +1,57 @@
+from typing import Dict, Iterator, List, Tuple
+import errors_backend as eb
+
+class PodRegistry:
+	"""
+	The pods of one page of a crawl, keyed by skipper uid, with every parent each of them was reached through.
+	A pod can be reached from the workload that owns it and from any number of services that select it; the registry
+	keeps a single entry for it, so that it is classified (eb.pod_state) and serialized once per crawl, and every other
+	parent only adds an edge.
+	"""
+
+	def __init__(self, cname: str):
+		"""
+		:param (str) cname: cluster the pods are in
+		"""
+		self.cname = cname
+		self.pods = {}		# skipper uid : pod, in the order they were added
+		self.states = {}	# skipper uid : (sev_measure, sev_reason)
+		self.parents = {}	# skipper uid : [ (parent skipper uid, parent rtype) ]
+
+	def add(self, pod: Dict) -> str:
+		"""
+		Adds a pod, classifying it the first time it is seen.
+		:param (Dict) pod: pod, as a dict
+		:return: (str) skipper uid of the pod
+		"""
+		uid = self.cname + "_" + pod["metadata"]["uid"]
+		if uid not in self.pods:
+			self.pods[uid] = pod
+			self.states[uid] = eb.pod_state(pod)
+			self.parents[uid] = []
+		return uid
+
+	def add_parent(self, pod: Dict, parent_uid: str, parent_type: str) -> None:
+		"""
+		Records that a pod was reached through a parent, adding the pod if it is new.
+		:param (Dict) pod: pod, as a dict
+		:param (str) parent_uid: skipper uid of the deployment, daemonset, statefulset or service, or of the namespace
+								of a pod that none of them owns
+		:param (str) parent_type: rtype of the parent
+		"""
+		parents = self.parents[self.add(pod)]
+		if (parent_uid, parent_type) not in parents:
+			parents.append((parent_uid, parent_type))
+
+	def anomalous(self) -> bool:
+		"""
+		:return: (bool) whether any pod has sev_measure 1
+		"""
+		return any(sev_measure == 1 for sev_measure, _ in self.states.values())
+
+	def __iter__(self) -> Iterator[Tuple[str, Dict, Tuple[int, str], List[Tuple[str, str]]]]:
+		"""
+		:return: (Iterator) (skipper uid, pod, (sev_measure, sev_reason), [ (parent skipper uid, parent rtype) ]) of every pod
+		"""
+		for uid, pod in self.pods.items():
+			yield uid, pod, self.states[uid], self.parents[uid]
@@ -0,0 +1,67 @@
+from typing import Dict, Tuple
+import errors_backend as eb
+from k8s_api import to_json
+
+# Builds the Resource and Edge rows the crawler writes for each kind of k8s object.
+# Objects are dicts as the api serves them (listed with raw=True), and are stored as they are in "info".
+# For reference
+# {"uid", "created_at", "rtype", "name", "cluster", "namespace", "application", "app_path", "cluster_path", "sev_measure", "sev_reason", "info"}
+
+def namespace_record(ns: Dict, cname: str) -> Tuple[Dict, Dict]:
+	"""
+	:param (Dict) ns: namespace
+	:param (str) cname: cluster the namespace is in
+	:return: ((Dict) namespace resource, (Dict) Cluster<-Namespace edge)
+	"""
+	ns_uid = cname + "_" + ns["metadata"]["uid"]
+	ns_name = ns["metadata"]["name"]
+	ns_resource = {"uid": ns_uid, "created_at": ns["metadata"].get("creationTimestamp"), "rtype": "Namespace",
+				"name": ns_name, "cluster": cname, "namespace": ns_name,
+				"cluster_path": "/root/{}/".format(cname), "info": to_json(ns)}
+	ns_edge = {"start_uid": cname, "end_uid": ns_uid, "relation": "Cluster<-Namespace"}
+	return ns_resource, ns_edge
+
+def workload_record(obj: Dict, rtype: str, cname: str, ns_uid: str) -> Tuple[Dict, Dict]:
+	"""
+	:param (Dict) obj: deployment, service, daemonset or statefulset
+	:param (str) rtype: "Deployment", "Service", "DaemonSet" or "StatefulSet"
+	:param (str) cname: cluster the object is in
+	:param (str) ns_uid: skipper uid of the object's namespace
+	:return: ((Dict) resource, (Dict) Namespace<-rtype edge)
+	"""
+	md = obj["metadata"]
+	obj_uid = cname + "_" + md["uid"]
+	obj_resource = {"uid": obj_uid, "created_at": md.get("creationTimestamp"), "rtype": rtype,
+					"name": md["name"], "cluster": cname, "namespace": md.get("namespace"),
+					"cluster_path": "/root/{}/{}/".format(cname, ns_uid), "info": to_json(obj)}
+	obj_edge = {"start_uid": ns_uid, "end_uid": obj_uid, "relation": "Namespace<-" + rtype}
+	return obj_resource, obj_edge
+
+def pod_record(pod: Dict, cname: str, ns_uid: str, parent_uid: str, parent_type: str, state: Tuple[int, str] = None) -> Tuple[Dict, Dict]:
+	"""
+	:param (Dict) pod
+	:param (str) cname: cluster the pod is in
+	:param (str) ns_uid: skipper uid of the pod's namespace
+	:param (str) parent_uid: skipper uid of the deployment, daemonset, statefulset or service the pod is under,
+							or of its namespace if no workload owns it
+	:param (str) parent_type: rtype of the parent
+	:param (Tuple[int, str]) state: (sev_measure, sev_reason) of the pod if it was already classified, see eb.pod_state()
+	:return: ((Dict) pod resource, or None if the parent is a service, (Dict) parent_type<-Pod edge)
+	"""
+	md = pod["metadata"]
+	pod_uid = cname + "_" + md["uid"]
+	pod_edge = {"start_uid": parent_uid, "end_uid": pod_uid, "relation": parent_type + "<-Pod"}
+
+	# don't write this pod to db w/ a cluster_path that goes through a service
+	if parent_type == "Service":
+		return None, pod_edge
+
+	cluster_path = "/root/{}/{}/".format(cname, ns_uid)
+	if parent_type != "Namespace":
+		cluster_path += parent_uid + "/"
+	sev_measure, sev_reason = state or eb.pod_state(pod)
+	pod_resource = {"uid": pod_uid, "created_at": md.get("creationTimestamp"), "rtype": "Pod",
+					"name": md["name"], "cluster": cname, "namespace": md.get("namespace"),
+					"cluster_path": cluster_path,
+					"sev_measure": sev_measure, "sev_reason": sev_reason, "info": to_json(pod)}
+	return pod_resource, pod_edge
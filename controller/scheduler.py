@@ -0,0 +1,141 @@
+import time
+from typing import Dict, Set, Tuple
+
+class CrawlScheduler:
+	"""
+	Decides which (cluster, kind) pairs the crawler re-lists each round. Every kind has its own refresh interval,
+	which is shortened for clusters with anomalies. A cluster whose crawl fails is retried with exponential backoff.
+	The api requests granted are paid for from a token bucket that refills at request_budget per minute, and the
+	pairs that are most overdue go first when there isn't enough for all of them. Pairs requested with request()
+	(e.g. because a user is looking at them) are due right away and go before all others.
+	"""
+
+	def __init__(self, intervals: Dict[str, float], anomaly_speedup: float, backoff_base: float, backoff_max: float,
+					request_budget: float):
+		"""
+		:param (Dict[str, float]) intervals: kind : seconds between refreshes
+		:param (float) anomaly_speedup: factor the intervals are divided by for clusters with anomalies
+		:param (float) backoff_base: seconds to wait before retrying a cluster after its first failure, doubled on every failure after that
+		:param (float) backoff_max: most seconds to wait before retrying a cluster
+		:param (float) request_budget: api requests that can be made per minute
+		"""
+		self.intervals = intervals
+		self.anomaly_speedup = anomaly_speedup
+		self.backoff_base = backoff_base
+		self.backoff_max = backoff_max
+		self.capacity = request_budget
+		self.tokens = request_budget
+		self.refilled_at = time.time()
+		self.last_refresh = {}	# (cluster, kind) : time of the last successful refresh
+		self.failures = {}		# cluster : number of crawls that failed in a row
+		self.retry_at = {}		# cluster : time before which the cluster isn't crawled again
+		self.anomalous = set()	# clusters with pods that have sev_measure 1
+		self.requested = {}		# (cluster, kind) : time a refresh ahead of schedule was asked for
+
+	def interval(self, cname: str, kind: str) -> float:
+		"""
+		:param (str) cname: cluster name
+		:param (str) kind
+		:return: (float) seconds between refreshes of the kind in the cluster
+		"""
+		interval = self.intervals[kind]
+		if cname in self.anomalous:
+			interval /= self.anomaly_speedup
+		return interval
+
+	def due_at(self, cname: str, kind: str) -> float:
+		"""
+		:param (str) cname: cluster name
+		:param (str) kind
+		:return: (float) time at which the kind in the cluster should be refreshed next, 0 if it never was.
+				Requested pairs are due now, unless the cluster is backed off
+		"""
+		due = self.last_refresh.get((cname, kind), 0)
+		if due > 0 and (cname, kind) not in self.requested:
+			due += self.interval(cname, kind)
+		return max(due, self.retry_at.get(cname, 0))
+
+	def refill(self, now: float) -> None:
+		"""
+		Adds the tokens earned since the last refill to the bucket.
+		:param (float) now: current time
+		"""
+		self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.capacity / 60)
+		self.refilled_at = now
+
+	def plan(self, costs: Dict[Tuple[str, str], int]) -> Set[Tuple[str, str]]:
+		"""
+		Picks the pairs to refresh this round, most overdue first, until the request budget runs out.
+		A pair that costs more than the whole budget is still granted once the bucket is full, so it isn't starved.
+
+		:param (Dict[Tuple[str, str], int]) costs: (cluster, kind) : estimated number of api requests to refresh it
+		:return: (Set[Tuple[str, str]]) (cluster, kind) pairs to refresh
+		"""
+		now = time.time()
+		self.refill(now)
+
+		def overdue(pair: Tuple[str, str]) -> Tuple[bool, float]:
+			last = self.last_refresh.get(pair)
+			return pair in self.requested, float("inf") if last is None else (now - last) / self.interval(*pair)
+
+		granted = set()
+		due = [ pair for pair in costs if self.due_at(*pair) <= now ]
+		for pair in sorted(due, key=overdue, reverse=True):
+			if self.tokens < costs[pair] and self.tokens < self.capacity:
+				break
+			self.tokens -= costs[pair]
+			granted.add(pair)
+		return granted
+
+	def request(self, pairs) -> None:
+		"""
+		Asks for pairs to be refreshed ahead of their schedule, by the next plan() that has the budget for them.
+		:param pairs: (cluster, kind) pairs
+		"""
+		now = time.time()
+		for pair in pairs:
+			self.requested.setdefault(pair, now)
+
+	def refreshed(self, cname: str, kinds) -> None:
+		"""
+		Records that kinds were refreshed, without touching the cluster's backoff.
+		:param (str) cname: cluster name
+		:param kinds: kinds that were refreshed
+		"""
+		now = time.time()
+		for kind in kinds:
+			self.last_refresh[(cname, kind)] = now
+			self.requested.pop((cname, kind), None)
+
+	def succeeded(self, cname: str, kinds, anomalous: bool = None) -> None:
+		"""
+		Records a successful crawl of a cluster.
+		:param (str) cname: cluster name
+		:param kinds: kinds that were refreshed
+		:param (bool) anomalous: whether the cluster has pods with sev_measure 1, or None if that wasn't checked
+		"""
+		self.refreshed(cname, kinds)
+		self.failures.pop(cname, None)
+		self.retry_at.pop(cname, None)
+		if anomalous is True:
+			self.anomalous.add(cname)
+		elif anomalous is False:
+			self.anomalous.discard(cname)
+
+	def failed(self, cname: str) -> None:
+		"""
+		Records a failed crawl of a cluster, and backs off before the next one.
+		:param (str) cname: cluster name
+		"""
+		self.failures[cname] = self.failures.get(cname, 0) + 1
+		backoff = min(self.backoff_base * 2 ** (self.failures[cname] - 1), self.backoff_max)
+		self.retry_at[cname] = time.time() + backoff
+		print("Backing off cluster", cname, "for %d seconds." % backoff)
+
+	def seconds_until_due(self, pairs) -> float:
+		"""
+		:param pairs: (cluster, kind) pairs that are crawled
+		:return: (float) seconds until the first of them is due, 0 if one already is
+		"""
+		now = time.time()
+		return max(0, min((self.due_at(*pair) for pair in pairs), default=0) - now)
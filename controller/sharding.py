@@ -0,0 +1,142 @@
+import multiprocessing, queue, threading, time
+from typing import Dict, List, Tuple
+from bulk_writer import BulkWriter
+
+# seconds the coordinator waits past a round's deadline for the workers' reports, which they send once they stop
+# waiting for their crawls at the deadline and have flushed what those wrote
+REPORT_GRACE = 5
+
+def assign_shards(cluster_names: List[str], previous: Dict[str, int], shards: int) -> Dict[str, int]:
+	"""
+	Spreads clusters over shards as evenly as possible while moving as few of them as possible: clusters keep
+	the shard they had, clusters that appeared go to the emptiest shards, and clusters are only moved off the
+	fullest shard while it has more than one cluster more than the emptiest.
+
+	:param (List[str]) cluster_names: clusters to crawl
+	:param (Dict[str, int]) previous: cluster name : shard, as returned last time
+	:param (int) shards: number of shards
+	:return: (Dict[str, int]) cluster name : shard
+	"""
+	assignment = { cname: previous[cname] for cname in cluster_names if previous.get(cname, shards) < shards }
+	members = [ [] for _ in range(shards) ]
+	for cname, shard in sorted(assignment.items()):
+		members[shard].append(cname)
+	for cname in sorted(cluster_names):
+		if cname not in assignment:
+			shard = min(range(shards), key=lambda s: len(members[s]))
+			members[shard].append(cname)
+			assignment[cname] = shard
+
+	while True:
+		fullest = max(range(shards), key=lambda s: len(members[s]))
+		emptiest = min(range(shards), key=lambda s: len(members[s]))
+		if len(members[fullest]) - len(members[emptiest]) <= 1:
+			return assignment
+		cname = members[fullest].pop()
+		members[emptiest].append(cname)
+		assignment[cname] = emptiest
+
+class ShardCoordinator:
+	"""
+	Runs cluster crawls in worker processes, so that serializing the objects of many clusters isn't limited to one
+	core by the GIL. Every cluster is crawled by exactly one worker (its shard), so no two processes write the same
+	resources. The workers put their serialized writes on a shared queue, and a thread of the coordinator posts
+	them through a single BulkWriter, in order with the coordinator's own writes. Shards are reassigned whenever
+	the set of clusters changes, and a worker that died is restarted. Workers are spawned rather than forked,
+	since by the time one is restarted the coordinator has threads (and locks they may hold) that a fork would copy.
+	"""
+
+	def __init__(self, processes: int, worker, writer: BulkWriter):
+		"""
+		:param (int) processes: number of worker processes
+		:param worker: module-level function run in each worker process as worker(shard, commands, results). It reads
+					(generation, { cluster name : kinds due }, { cluster name : context }, (bool) clear, (float) deadline)
+					from commands, and puts ("batch", body, counts) for its writes, then ("round", shard, generation, outcomes, counts)
+					on results
+		:param (BulkWriter) writer: writer the workers' batches are posted through
+		"""
+		self.worker = worker
+		self.writer = writer
+		self.context = multiprocessing.get_context("spawn")
+		self.results = self.context.Queue()
+		self.commands = [ None ] * processes
+		self.processes = [ None ] * processes
+		self.assignment = {}			# cluster name : shard
+		self.rounds = queue.Queue()		# round messages, put once the batches before them were posted
+		self.clear_trackers = False		# whether the workers should forget what they wrote, on the next round
+		for shard in range(processes):
+			self.start_worker(shard)
+		threading.Thread(target=self.forward, name="shard writer", daemon=True).start()
+
+	def start_worker(self, shard: int) -> None:
+		"""
+		Starts (or restarts) the worker process of a shard.
+		:param (int) shard
+		"""
+		self.commands[shard] = self.context.Queue()
+		self.processes[shard] = self.context.Process(target=self.worker, name="crawl shard %d" % shard,
+														args=(shard, self.commands[shard], self.results), daemon=True)
+		self.processes[shard].start()
+
+	def forward(self) -> None:
+		"""
+		Posts the workers' batches as they come in, and passes their round messages on to wait_round().
+		"""
+		while True:
+			message = self.results.get()
+			if message[0] == "batch":
+				self.writer.forward(message[1], message[2])
+			else:
+				self.rounds.put(message)
+
+	def start_round(self, generation: int, due: Dict[str, List[str]], contexts: Dict[str, str], deadline: float) -> None:
+		"""
+		Reassigns the shards if the clusters changed, and sends every worker the clusters of its shard.
+
+		:param (int) generation: crawl generation of the round
+		:param (Dict[str, List[str]]) due: cluster name : kinds to list again, for every cluster to crawl
+		:param (Dict[str, str]) contexts: cluster name : kube-config context pointing to it
+		:param (float) deadline: time (as in time.time()) by which the workers should report the round,
+								the same one the coordinator waits for them until
+		"""
+		assignment = assign_shards(list(due), self.assignment, len(self.processes))
+		moved = [ cname for cname, shard in assignment.items() if self.assignment.get(cname, shard) != shard ]
+		if len(moved) > 0 or set(assignment) != set(self.assignment):
+			print("Spread %d clusters over %d crawl processes, moving %d." % (len(assignment), len(self.processes), len(moved)))
+		self.assignment = assignment
+
+		for shard, process in enumerate(self.processes):
+			if not process.is_alive():
+				print("Crawl process", shard, "died with exit code", str(process.exitcode) + ", restarting it.")
+				self.start_worker(shard)
+			shard_due = { cname: kinds for cname, kinds in due.items() if assignment[cname] == shard }
+			self.commands[shard].put((generation, shard_due, { cname: contexts.get(cname) for cname in shard_due },
+										self.clear_trackers, deadline))
+		self.clear_trackers = False
+
+	def wait_round(self, generation: int, timeout: float) -> Tuple[Dict[str, Dict], Tuple[int, int]]:
+		"""
+		Waits for every worker to finish the round, or for the timeout (plus REPORT_GRACE). By the time a worker's round message
+		is returned, every write it made before it has been posted. Round messages of earlier rounds
+		(from workers that were late) are dropped.
+
+		:param (int) generation: crawl generation of the round
+		:param (float) timeout: seconds until the round's deadline
+		:return: ((Dict[str, Dict]) cluster name : outcome of its crawl, for the clusters whose worker finished,
+				  ((int) writes made, (int) writes skipped) by those workers)
+		"""
+		deadline = time.time() + timeout + REPORT_GRACE
+		waiting = set(range(len(self.processes)))
+		outcomes = {}
+		written, skipped = 0, 0
+		while len(waiting) > 0 and time.time() < deadline:
+			try:
+				_, shard, round_generation, round_outcomes, counts = self.rounds.get(timeout=deadline - time.time())
+			except (queue.Empty, ValueError):
+				break
+			if round_generation != generation:
+				continue
+			waiting.discard(shard)
+			outcomes.update(round_outcomes)
+			written, skipped = written + counts[0], skipped + counts[1]
+		return outcomes, (written, skipped)
@@ -0,0 +1,362 @@
+import threading, time
+import kubernetes as k8s
+from typing import Dict, List, Tuple
+import k8s_api, label_selectors, ownership
+import records
+from bulk_writer import BulkWriter
+from crawler_config import CrawlerConfig
+
+# kinds kept up to date by a ClusterWatcher, in the order they are first listed (parents before children),
+# with the api class and cluster-wide list function used to list and watch them.
+# ReplicaSets aren't written to the db, they are only tracked to link pods to their deployments.
+WATCHED_KINDS = [ ("Namespace", "CoreV1Api", "list_namespace"),
+				("Deployment", "AppsV1Api", "list_deployment_for_all_namespaces"),
+				("DaemonSet", "AppsV1Api", "list_daemon_set_for_all_namespaces"),
+				("StatefulSet", "AppsV1Api", "list_stateful_set_for_all_namespaces"),
+				("Service", "CoreV1Api", "list_service_for_all_namespaces"),
+				("ReplicaSet", "AppsV1Api", "list_replica_set_for_all_namespaces"),
+				("Pod", "CoreV1Api", "list_pod_for_all_namespaces") ]
+
+class ClusterWatcher:
+	"""
+	Keeps the Namespaces, Deployments, DaemonSets, StatefulSets, Services and Pods of one cluster up to date in the db.
+	Each kind is listed once, then watched from the resourceVersion that list returned. Objects are handled as the dicts
+	the api serves (see records.py), never as python k8s client models. ADDED and MODIFIED events
+	become upserts of the object and of the edges to it, removing the edges it doesn't have anymore (e.g. from a service
+	that stopped selecting a pod), and DELETED events remove the object and its edges. Pods that no workload owns are
+	written under their namespace, and pods whose replicaset or workload hasn't been seen yet wait until it is.
+	When the api server answers 410 Gone the kind is listed again, and anything that disappeared in the meantime is removed.
+	A watcher restored from a crawl checkpoint (see restore()) skips the lists and watches from the saved resourceVersions.
+	"""
+
+	def __init__(self, cname: str, writer: BulkWriter, generation: int):
+		"""
+		:param (str) cname: name of the cluster to watch
+		:param (BulkWriter) writer: writer that the resulting writes are queued on
+		:param (int) generation: crawl generation the edges written by the watcher are marked with
+		"""
+		self.cname = cname
+		self.writer = writer
+		self.generation = generation
+		self.lock = threading.Lock()
+		self.ns_uids = {}		# namespace name : skipper uid
+		self.selectors = {}		# skipper uid : (namespace, label selector) of services
+		self.resolver = ownership.OwnershipResolver()	# replicasets, to follow pod owner references through
+		self.known = { kind: set() for kind, _, _ in WATCHED_KINDS }	# skipper uids last seen in the cluster, by kind
+		self.parent_edges = {}	# skipper uid : { skipper uid of a parent we have written an edge from : relation of the edge }
+		self.pod_labels = {}	# skipper uid : (namespace, labels) of the pods that were written, to match services against
+		self.waiting = {}		# skipper uid of a replicaset or workload that hasn't been seen yet : { skipper uid : pod owned by it }
+		self.names = {}			# skipper uid : (kind, namespace, name) of deployments, services, daemonsets and statefulsets
+		self.resource_versions = {}	# kind : resourceVersion of the last list or event handled
+
+	def start(self) -> None:
+		"""
+		Starts watching the cluster in the background.
+		"""
+		threading.Thread(target=self.run, name="watch " + self.cname, daemon=True).start()
+
+	def run(self) -> None:
+		"""
+		Lists every kind (retrying until the cluster answers), then starts one watch thread per kind.
+		Kinds with a resourceVersion from a checkpoint aren't listed, their watch starts from it.
+		"""
+		for kind, _, _ in WATCHED_KINDS:
+			with self.lock:
+				resource_version = self.resource_versions.get(kind)
+			while resource_version is None:
+				try:
+					resource_version = self.relist(kind)
+				except Exception as e:
+					print("Could not list", kind, "in cluster", self.cname + ", retrying:", repr(e))
+					time.sleep(CrawlerConfig.WATCH_RETRY_INTERVAL)
+				else:
+					break
+			threading.Thread(target=self.watch, args=(kind, resource_version),
+							name="watch {} {}".format(self.cname, kind), daemon=True).start()
+
+	def checkpoint(self) -> Dict:
+		"""
+		:return: (Dict) copy of what the watcher knows about the cluster, for a crawl checkpoint, see restore()
+		"""
+		with self.lock:
+			return { "ns_uids": dict(self.ns_uids), "selectors": dict(self.selectors), "replicasets": dict(self.resolver.objects),
+					"known": { kind: set(uids) for kind, uids in self.known.items() },
+					"parent_edges": { uid: dict(parents) for uid, parents in self.parent_edges.items() },
+					"pod_labels": dict(self.pod_labels), "waiting": { uid: dict(pods) for uid, pods in self.waiting.items() },
+					"names": dict(self.names), "resource_versions": dict(self.resource_versions) }
+
+	def restore(self, state: Dict) -> None:
+		"""
+		Takes what a watcher of the same cluster knew when a crawl checkpoint was saved. Call before start().
+		Events that came after the saved resourceVersions are replayed by the watches; if the api server
+		doesn't have them anymore (410 Gone) the kind is listed again, as usual.
+		:param (Dict) state: as returned by checkpoint()
+		"""
+		with self.lock:
+			self.ns_uids = state["ns_uids"]
+			self.selectors = state["selectors"]
+			self.resolver = ownership.OwnershipResolver(state["replicasets"].values())
+			self.known.update(state["known"])
+			self.parent_edges = state["parent_edges"]
+			self.pod_labels = state["pod_labels"]
+			self.waiting = state["waiting"]
+			self.names = state["names"]
+			self.resource_versions = state["resource_versions"]
+
+	def list_function(self, kind: str):
+		"""
+		:param (str) kind
+		:return: the cluster-wide list function of the api client for the given kind
+		"""
+		for watched_kind, api_class, list_name in WATCHED_KINDS:
+			if watched_kind == kind:
+				return getattr(k8s_api.api_client(self.cname, api_class), list_name)
+
+	def relist(self, kind: str) -> str:
+		"""
+		Lists every object of the given kind a page at a time, writes them, and removes the ones we knew of that are gone.
+		:param (str) kind
+		:return: (str) resourceVersion of the list (that of its last page), to start watching from
+		"""
+		listed_uids = set()
+		resource_version = None
+		for page, resource_version in k8s_api.list_pages(self.list_function(kind), page_size=CrawlerConfig.PAGE_SIZE,
+														raw=True, with_version=True):
+			for obj in page:
+				listed_uids.add(self.apply(kind, obj))
+		for uid in self.known[kind] - listed_uids:
+			self.remove(kind, uid)
+		with self.lock:
+			self.resource_versions[kind] = resource_version
+		return resource_version
+
+	def watch(self, kind: str, resource_version: str) -> None:
+		"""
+		Watches the given kind forever, starting from resource_version.
+		:param (str) kind
+		:param (str) resource_version: resourceVersion to start watching from
+		"""
+		while True:
+			try:
+				if resource_version is None:
+					resource_version = self.relist(kind)
+
+				stream = k8s.watch.Watch().stream(self.list_function(kind), resource_version=resource_version,
+												timeout_seconds=CrawlerConfig.WATCH_TIMEOUT)
+				for event in stream:
+					if event["type"] == "ERROR":
+						# 410 Gone: our resourceVersion is too old to watch from, so list again
+						if event["raw_object"].get("code") == 410:
+							resource_version = None
+							break
+						continue
+
+					obj = event["raw_object"]
+					if event["type"] == "DELETED":
+						self.remove(kind, self.cname + "_" + obj["metadata"]["uid"])
+					elif event["type"] in ("ADDED", "MODIFIED"):
+						self.apply(kind, obj)
+					resource_version = obj["metadata"].get("resourceVersion")
+					with self.lock:
+						self.resource_versions[kind] = resource_version
+			except k8s.client.rest.ApiException as e:
+				if e.status == 410:
+					resource_version = None
+					continue
+				print("Watch on", kind, "in cluster", self.cname, "failed, retrying:", repr(e))
+				time.sleep(CrawlerConfig.WATCH_RETRY_INTERVAL)
+			except Exception as e:
+				print("Watch on", kind, "in cluster", self.cname, "failed, retrying:", repr(e))
+				time.sleep(CrawlerConfig.WATCH_RETRY_INTERVAL)
+
+	def apply(self, kind: str, obj) -> str:
+		"""
+		Queues the resource and edges for an object that was listed, added or modified.
+		:param (str) kind
+		:param (Dict) obj: k8s object of the given kind, as a dict
+		:return: (str) skipper uid of the object
+		"""
+		with self.lock:
+			return self.update(kind, obj)
+
+	def update(self, kind: str, obj) -> str:
+		"""
+		Does the work of apply(). Call while holding self.lock.
+		:param (str) kind
+		:param (Dict) obj: k8s object of the given kind, as a dict
+		:return: (str) skipper uid of the object
+		"""
+		md = obj["metadata"]
+		uid = self.cname + "_" + md["uid"]
+		self.known[kind].add(uid)
+		if kind == "Namespace":
+			self.ns_uids[md["name"]] = uid
+			resource, edge = records.namespace_record(obj, self.cname)
+			self.write(uid, resource, [ edge ])
+			return uid
+
+		if kind == "ReplicaSet":
+			self.resolver.add(obj)
+			self.update_waiting(uid)
+			return uid
+
+		ns_uid = self.ns_uids.get(md.get("namespace"))
+		if kind == "Pod":
+			self.stop_waiting(uid)
+			owner_uid = self.missing_owner(obj)
+			if owner_uid is not None:
+				# its replicaset or workload event hasn't come yet, the pod is applied again once it has
+				self.waiting.setdefault(owner_uid, {})[uid] = obj
+				return uid
+
+			parents = self.pod_parents(obj)
+			if all(parent_type == "Service" for _, parent_type in parents):
+				# bare pods (and pods of jobs, etc.) go right under their namespace
+				parents.insert(0, (ns_uid, "Namespace"))
+			edges = []
+			pod_resource = None
+			for parent_uid, parent_type in parents:
+				resource, edge = records.pod_record(obj, self.cname, ns_uid, parent_uid, parent_type)
+				pod_resource = pod_resource or resource
+				edges.append(edge)
+			self.pod_labels[uid] = (md.get("namespace"), md.get("labels"))
+			self.write(uid, pod_resource, edges)
+			return uid
+
+		self.names[uid] = (kind, md.get("namespace"), md["name"])
+		resource, edge = records.workload_record(obj, kind, self.cname, ns_uid)
+		self.write(uid, resource, [ edge ])
+		if kind == "Service":
+			selector = (md.get("namespace"), (obj.get("spec") or {}).get("selector"))
+			if self.selectors.get(uid) != selector:
+				self.selectors[uid] = selector
+				self.select_pods(uid)
+		self.update_waiting(uid)
+		return uid
+
+	def deployers(self) -> List[Tuple[Tuple[str, str, str], str, List[str]]]:
+		"""
+		:return: (List[Tuple[Tuple[str, str, str], str, List[str]]]) ((kind, namespace, name), skipper uid, skipper uids of the
+				pods it owns) of every deployment, service, daemonset and statefulset, for crawler.deployer_index()
+		"""
+		with self.lock:
+			owned = {}	# workload skipper uid : pod skipper uids
+			for pod_uid in self.known["Pod"]:
+				for parent_uid in self.parent_edges.get(pod_uid, ()):
+					owned.setdefault(parent_uid, []).append(pod_uid)
+			return [ (key, uid, [] if key[0] == "Service" else owned.get(uid, [])) for uid, key in self.names.items() ]
+
+	def pod_parents(self, pod) -> List[Tuple[str, str]]:
+		"""
+		Finds the deployment, daemonset or statefulset that owns the given pod, and the services that select it.
+		Call while holding self.lock.
+		:param (Dict) pod
+		:return: (List[Tuple[str, str]]) (skipper uid, rtype) of each parent
+		"""
+		parents = []
+		owner = self.resolver.workload_owner(pod)
+		if owner is not None and self.cname + "_" + owner[1] in self.known[owner[0]]:
+			parents.append((self.cname + "_" + owner[1], owner[0]))
+		for uid, (namespace, selector) in self.selectors.items():
+			if namespace == pod["metadata"].get("namespace") and label_selectors.matches(selector, pod["metadata"].get("labels")):
+				parents.append((uid, "Service"))
+		return parents
+
+	def missing_owner(self, pod) -> str:
+		"""
+		Call while holding self.lock.
+		:param (Dict) pod
+		:return: (str) skipper uid of the replicaset or workload the pod's owner references lead to that hasn't been seen yet,
+				or None if the pod can be written. Owners of kinds that aren't watched (e.g. jobs) are never waited for
+		"""
+		owner = self.resolver.workload_owner(pod)
+		if owner is not None:
+			owner_uid = self.cname + "_" + owner[1]
+			return None if owner_uid in self.known[owner[0]] else owner_uid
+		missing = self.resolver.missing_owner(pod)
+		if missing is not None and missing[0] == "ReplicaSet":
+			return self.cname + "_" + missing[1]
+		return None
+
+	def update_waiting(self, owner_uid: str) -> None:
+		"""
+		Applies again the pods that were waiting for a replicaset or workload that was just seen. Call while holding self.lock.
+		:param (str) owner_uid: skipper uid of the replicaset or workload
+		"""
+		for pod in self.waiting.pop(owner_uid, {}).values():
+			self.update("Pod", pod)
+
+	def stop_waiting(self, pod_uid: str) -> None:
+		"""
+		Forgets the replicaset or workload a pod was waiting for, if any. Call while holding self.lock.
+		:param (str) pod_uid: skipper uid of the pod
+		"""
+		for owner_uid, pods in list(self.waiting.items()):
+			pods.pop(pod_uid, None)
+			if len(pods) == 0:
+				del self.waiting[owner_uid]
+
+	def select_pods(self, svc_uid: str) -> None:
+		"""
+		Adds the edges from a service that is new (or whose selector changed) to the pods it selects,
+		and removes the ones to the pods it doesn't select anymore. Call while holding self.lock.
+		:param (str) svc_uid: skipper uid of the service
+		"""
+		namespace, selector = self.selectors[svc_uid]
+		for pod_uid, (pod_namespace, labels) in self.pod_labels.items():
+			parents = dict(self.parent_edges.get(pod_uid, {}))
+			if pod_namespace == namespace and label_selectors.matches(selector, labels):
+				parents[svc_uid] = "Service<-Pod"
+			else:
+				parents.pop(svc_uid, None)
+			self.write_edges(pod_uid, parents)
+
+	def write(self, uid: str, resource: Dict, edges: List[Dict]) -> None:
+		"""
+		Queues the resource (if any) and the edges to it, see write_edges(). Call while holding self.lock.
+		:param (str) uid: skipper uid of the object
+		:param (Dict) resource: resource data, or None
+		:param (List[Dict]) edges: edge data of every edge that ends at the object
+		"""
+		if resource is not None:
+			self.writer.add_resource(resource)
+		self.write_edges(uid, { edge["start_uid"]: edge["relation"] for edge in edges })
+
+	def write_edges(self, uid: str, parents: Dict[str, str]) -> None:
+		"""
+		Queues the edges to an object that weren't written yet (marked with the watcher's generation),
+		and the removal of the ones written before that it doesn't have anymore. Call while holding self.lock.
+		:param (str) uid: skipper uid of the object
+		:param (Dict[str, str]) parents: skipper uid : relation of every edge that ends at the object
+		"""
+		written = self.parent_edges.get(uid, {})
+		self.writer.delete_edges([ (start_uid, uid, relation) for start_uid, relation in written.items()
+									if parents.get(start_uid) != relation ])
+		self.writer.touch_edges([ (start_uid, uid, relation) for start_uid, relation in parents.items()
+									if written.get(start_uid) != relation ], self.generation)
+		self.parent_edges[uid] = parents
+
+	def remove(self, kind: str, uid: str) -> None:
+		"""
+		Queues the removal of an object that was deleted from the cluster.
+		:param (str) kind
+		:param (str) uid: skipper uid of the object
+		"""
+		with self.lock:
+			self.known[kind].discard(uid)
+			self.selectors.pop(uid, None)
+			self.parent_edges.pop(uid, None)
+			self.names.pop(uid, None)
+			if kind == "Pod":
+				self.pod_labels.pop(uid, None)
+				self.stop_waiting(uid)
+			if kind == "Service":
+				# its edges go with it
+				for parents in self.parent_edges.values():
+					parents.pop(uid, None)
+			if kind == "ReplicaSet":
+				self.resolver.remove(uid[len(self.cname) + 1:])
+				return
+			if kind == "Namespace":
+				self.ns_uids = { name: ns_uid for name, ns_uid in self.ns_uids.items() if ns_uid != uid }
+			self.writer.delete_resource(uid)
@@ -1,3 +1,4 @@
+import os
 from flask import Flask
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
@@ -6,6 +7,7 @@ from flask_migrate import Migrate
 app = Flask(__name__)
 app.config.from_object(Config)
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# render_as_batch lets migrations alter sqlite tables (see the README)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'), render_as_batch=True)
 
 from app import routes, models
\ No newline at end of file
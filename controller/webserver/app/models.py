@@ -7,6 +7,12 @@ class Edge(db.Model):
 	end_uid = db.Column(db.String(128), nullable = False)
 	relation = db.Column(db.String(128), nullable = False)
 	last_updated = db.Column(db.DateTime(timezone=True), default = datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+	generation = db.Column(db.Integer)		# crawl round that last saw the edge, see sweep_edges() in store
+
+	# an edge is written once however often it is posted (see store.insert_edges()),
+	# children of a resource go by start_uid, deletes of a resource's edges by end_uid
+	__table_args__ = (db.Index('ix_edge_start_uid_end_uid_relation', start_uid, end_uid, relation, unique=True),
+						db.Index('ix_edge_end_uid', end_uid))
 
 class Resource(db.Model):
 	uid = db.Column(db.String(512), unique=True, nullable = False, primary_key=True)
@@ -21,4 +27,12 @@ class Resource(db.Model):
 	cluster_path = db.Column(db.String(512))
 	sev_measure = db.Column(db.Integer)		# for anomaly mode
 	sev_reason = db.Column(db.String(128))	# for anomaly mode
-	info = db.Column(db.String(100000))	# the remaning json info about the resource goes here
\ No newline at end of file
+	generation = db.Column(db.Integer)		# crawl round that last saw the resource, see sweep_resources() in store
+	info = db.Column(db.String(100000))	# the remaning json info about the resource goes here
+
+	# top level tables and sweeps, /errors and the order of /search results, and /search's case-insensitive filters
+	__table_args__ = (db.Index('ix_resource_rtype_cluster', rtype, cluster),
+						db.Index('ix_resource_sev_measure', sev_measure),
+						db.Index('ix_resource_lower_cluster_namespace', db.func.lower(cluster), db.func.lower(namespace)),
+						db.Index('ix_resource_lower_namespace', db.func.lower(namespace)),
+						db.Index('ix_resource_lower_application', db.func.lower(application)))
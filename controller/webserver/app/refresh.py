@@ -0,0 +1,62 @@
+import threading, time
+from typing import Dict, List
+
+class RefreshQueue:
+	"""
+	Subtrees users navigated into, for the crawler to refresh ahead of its schedule, and how fresh the crawler says
+	each kind of subtree is. The crawler picks up the requests (and reports freshness) through POST /refresh,
+	which waits for requests to come in rather than having the crawler poll in a tight loop.
+	"""
+
+	def __init__(self):
+		self.pending = {}		# skipper uid : { "uid", "rtype", "cluster", "requested_at" }, in the order they were asked for
+		self.freshness = {}		# cluster name : { rtype : time the crawler last refreshed subtrees of that rtype in the cluster }
+		self.condition = threading.Condition()
+
+	def request(self, uid: str, rtype: str, cluster: str) -> None:
+		"""
+		Asks for the subtree of a resource to be refreshed. Asking again before the crawler took the request keeps the first one.
+		:param (str) uid: skipper uid of the resource
+		:param (str) rtype: rtype of the resource
+		:param (str) cluster: cluster the crawler has to refresh it in (for deployables, the cluster of their application)
+		"""
+		with self.condition:
+			if uid not in self.pending:
+				self.pending[uid] = { "uid": uid, "rtype": rtype, "cluster": cluster, "requested_at": time.time() }
+				self.condition.notify_all()
+
+	def take(self, wait: float) -> List[Dict]:
+		"""
+		:param (float) wait: most seconds to wait for a request when there is none
+		:return: (List[Dict]) the pending requests, oldest first, which are no longer pending
+		"""
+		with self.condition:
+			if len(self.pending) == 0:
+				self.condition.wait(wait)
+			taken, self.pending = list(self.pending.values()), {}
+			return taken
+
+	def report(self, freshness: Dict[str, Dict[str, float]]) -> None:
+		"""
+		:param (Dict[str, Dict[str, float]]) freshness: cluster name : { rtype : time the crawler last refreshed subtrees of
+														that rtype in the cluster }, for every cluster the crawler crawls
+		"""
+		with self.condition:
+			self.freshness = freshness
+
+	def is_pending(self, uid: str) -> bool:
+		"""
+		:param (str) uid: skipper uid of a resource
+		:return: (bool) whether a refresh of the resource's subtree was asked for and the crawler hasn't taken it yet
+		"""
+		with self.condition:
+			return uid in self.pending
+
+	def refreshed_at(self, rtype: str, cluster: str) -> float:
+		"""
+		:param (str) rtype: rtype of a resource
+		:param (str) cluster: cluster the resource is refreshed in, as passed to request()
+		:return: (float) time the crawler last refreshed subtrees of that rtype in the cluster, or None if it hasn't said
+		"""
+		with self.condition:
+			return self.freshness.get(cluster, {}).get(rtype)
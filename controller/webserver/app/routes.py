@@ -1,34 +1,46 @@
-import sys, requests, datetime, json
+import sys, json, time
 import sqlalchemy, yaml
+import flask_migrate
+from typing import Dict, Tuple
 from dateutil.parser import parse
-from flask import request, jsonify
-from app import app, db
+from flask import request, jsonify, Response
+from app import app, db, store
 from app.models import Resource, Edge
+from app.refresh import RefreshQueue
 
 sys.path.insert(0,'../../backend')
 import resource_files, metrics
 import clients_resources, k8s_config
+from k8s_api import to_json, to_raw
 import cluster_mode_backend as cmb
 import app_mode_backend as amb
 import errors_backend as eb
+from deployer_index import DeployerIndex, deployer_key
+from instrumentation import REGISTRY, CONTENT_TYPE
+
+DB_WRITE_DURATION = REGISTRY.histogram("skipper_db_write_duration_seconds", "Time /bulk spends on each kind of db write.", [ "op" ])
 
 # loads the user's kube-config
 # gets exception info if something went wrong in the process
 running, e = k8s_config.load_kube_config()
 info_handler = resource_files.ResourceFiles()
 
-def to_json(k8s_obj) -> str:
-	"""
-	Turn object to json using json.dumps() on object dictionary, defaulting to __str__
-	"""
-	to_s = lambda dt: dt.__str__()
-	return json.dumps(k8s_obj.to_dict(), default=to_s)
+# subtrees users navigated into, which the crawler refreshes ahead of its schedule (see /refresh)
+refresh_queue = RefreshQueue()
 
-# check if user has a db
-try:
-	db.session.query(Resource).first()
-except sqlalchemy.exc.OperationalError as e:
-	db.create_all()
+# rtypes a Deployable can deploy
+DEPLOYER_RTYPES = [ "Deployment", "Service", "DaemonSet", "StatefulSet" ]
+# "generation" : crawl generation the indexes were built at, "indexes" : what deployer_indexes() returns
+deployer_cache = {}
+
+# create the db, or bring its schema up to date. dbs that were made with db.create_all() before
+# there were migrations are stamped with the initial revision first, so only the later migrations run on them
+INITIAL_REVISION = '1cbffc66441e'
+with app.app_context():
+	tables = sqlalchemy.inspect(db.engine).get_table_names()
+	if 'resource' in tables and 'alembic_version' not in tables:
+		flask_migrate.stamp(revision=INITIAL_REVISION)
+	flask_migrate.upgrade()
 
 def row_to_dict(row) -> dict:
 	"""
@@ -39,14 +51,58 @@ def row_to_dict(row) -> dict:
 		d[column.name] = str(getattr(row, column.name))
 	return d
 
+def newest_generation() -> int:
+	"""
+	:return: (int) newest crawl generation any resource was marked with, None if the crawler hasn't written to this db
+	"""
+	return db.session.query(sqlalchemy.func.max(Resource.generation)).scalar()
+
+def deployer_indexes() -> Tuple[DeployerIndex, DeployerIndex]:
+	"""
+	Indexes the Deployables by the deployer their spec names, and the resources they can deploy by (rtype, namespace, name).
+	Built once per crawl generation, since every Deployable's info has to be parsed for it.
+	:return: ((DeployerIndex) skipper uids of the Deployables, (DeployerIndex) skipper uids of the deployers)
+	"""
+	generation = newest_generation()
+	cached = deployer_cache.get("indexes")
+	if cached is not None and deployer_cache.get("generation") == generation:
+		return cached
+
+	deployables, deployers = DeployerIndex(), DeployerIndex()
+	for dpb_uid, info in db.session.query(Resource.uid, Resource.info).filter(Resource.rtype == "Deployable"):
+		key = deployer_key(json.loads(info)) if info else None
+		if key is not None:
+			deployables.add(*key, dpb_uid)
+	rows = db.session.query(Resource.rtype, Resource.namespace, Resource.name, Resource.uid).filter(Resource.rtype.in_(DEPLOYER_RTYPES))
+	for rtype, namespace, name, res_uid in rows:
+		deployers.add(rtype, namespace, name, res_uid)
+	deployer_cache["generation"], deployer_cache["indexes"] = generation, (deployables, deployers)
+	return deployables, deployers
+
+def refresh_cluster(resource: Resource) -> str:
+	"""
+	:param (Resource) resource
+	:return: (str) cluster the crawler refreshes the resource's subtree in: its own, except for deployables,
+			which are listed along with their application
+	"""
+	if resource.rtype == "Deployable" and resource.app_path is not None:
+		app_row = db.session.query(Resource.cluster).filter(Resource.uid == resource.app_path.split("/")[2]).first()
+		if app_row is not None:
+			return app_row[0]
+	return resource.cluster
+
 def has_children(table):
 	"""
 	Returns List[bool] for whether each item in table has children or not.
+	The parents among the items are looked up with one query per BULK_CHUNK_SIZE items (sqlite caps the bound
+	variables of a query), answered from the edge index instead of a query per item.
 	"""
-	has_children = []
-	for t_item in table:
-		has_children.append(False if db.session.query(Edge).filter(Edge.start_uid == t_item.uid).first() is None else True)
-	return has_children
+	uids = [ t_item.uid for t_item in table ]
+	parents = set()
+	chunk_size = app.config['BULK_CHUNK_SIZE']
+	for i in range(0, len(uids), chunk_size):
+		parents.update(uid for (uid,) in db.session.query(Edge.start_uid).filter(Edge.start_uid.in_(uids[i:i + chunk_size])).distinct())
+	return [ uid in parents for uid in uids ]
 
 @app.route('/')
 @app.route('/index')
@@ -76,6 +132,7 @@ def start(mode):
 	"""
 
 	cluster_rows = db.session.query(Resource).filter(Resource.rtype=="Cluster").all()
+	resources, edges = [], []
 	if len(cluster_rows) == 0:
 		# lazy load clusters
 		clusters = k8s_config.all_cluster_names()
@@ -90,9 +147,8 @@ def start(mode):
 			else:
 				resource_data = {"uid": cluster, "rtype": "Cluster", "name": cluster,
 								 "cluster": cluster, "cluster_path": "/root/"}
-			edge_data = {'start_uid': 'root', 'end_uid': cluster, 'relation': "Root<-Cluster"}
-			requests.post('http://127.0.0.1:5000/resource/{}'.format(cluster), data=resource_data)
-			requests.post('http://127.0.0.1:5000/edge/{}/{}'.format('root', cluster), data=edge_data)
+			resources.append(resource_data)
+			edges.append({'start_uid': 'root', 'end_uid': cluster, 'relation': "Root<-Cluster"})
 
 			# lazy load namespaces
 			namespaces = cmb.cluster_namespaces(cluster)
@@ -104,14 +160,14 @@ def start(mode):
 							"name": ns_name, "cluster": cluster, "namespace": ns_name,
 							"cluster_path": "/root/{}/".format(cluster),
 							"info": to_json(ns)}
-				edge_data = {'start_uid': cluster, 'end_uid': ns_uid, 'relation': "Cluster<-Namespace"}
-				requests.post('http://127.0.0.1:5000/resource/{}'.format(ns_uid), data=resource_data)
-				requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(cluster, ns_uid), data=edge_data)
+				resources.append(resource_data)
+				edges.append({'start_uid': cluster, 'end_uid': ns_uid, 'relation': "Cluster<-Namespace"})
 
-	# lazy load applications
+	# lazy load applications, unless the db is warm: the crawler keeps them up to date then, and clusters without
+	# the application crd would otherwise be asked for them again on every start
 	app_rows = db.session.query(Resource).filter(Resource.rtype=="Application").all()
-	has_apps = True
-	if len(app_rows) == 0:
+	has_apps = len(app_rows) > 0
+	if len(app_rows) == 0 and len(cluster_rows) == 0:
 		apps = amb.all_applications()
 		has_apps = True if len(apps) > 0 else False
 		for app in apps:
@@ -124,9 +180,8 @@ def start(mode):
 							"name": app_name, "cluster": app_cluster, "namespace": app_ns, "application": app_name,
 								"app_path": "/root/", "info": json.dumps(app)}
 
-			requests.post('http://127.0.0.1:5000/resource/{}'.format(app_uid), data=data)
-			edge_data = {'start_uid': 'root', 'end_uid': app_uid, 'relation': "Root<-Application"}
-			requests.post('http://127.0.0.1:5000/edge/{}/{}'.format('root', app_uid), data=edge_data)
+			resources.append(data)
+			edges.append({'start_uid': 'root', 'end_uid': app_uid, 'relation': "Root<-Application"})
 
 			# lazy load deployables
 			dpbs = amb.application_deployables(app_cluster, app_ns, app_name)
@@ -140,9 +195,9 @@ def start(mode):
 								 "name": dpb_name, "cluster": cname, "namespace": ns, "application": app_name,
 								 "app_path": "/root/{}/".format(app_uid), "info": json.dumps(dpb)}
 
-				edge_data = {'start_uid': app_uid, 'end_uid': dpb_uid, 'relation': "Application<-Deployable"}
-				requests.post('http://127.0.0.1:5000/resource/{}'.format(dpb_uid), data=resource_data)
-				requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(app_uid, dpb_uid), data=edge_data)
+				resources.append(resource_data)
+				edges.append({'start_uid': app_uid, 'end_uid': dpb_uid, 'relation': "Application<-Deployable"})
+	store.save(resources, edges)
 
 	# get the starting apps or clusters
 	if mode == 'app':
@@ -166,40 +221,23 @@ def resource(uid):
 		return jsonify(data=row_to_dict(resource))
 	elif request.method == 'DELETE':
 
-		# Removes resource with given uid, all descendants, and associated edges
-		to_delete = [ uid ]
-		while len(to_delete) > 0:
-			# delete the resource in question
-			curr_uid = to_delete.pop()
-			db.session.query(Resource).filter(Resource.uid == curr_uid).delete()
-
-			# find all children
-			outgoing_edges = db.session.query(Edge).filter(Edge.start_uid == curr_uid).all()
-			child_uids = [ edge.end_uid for edge in outgoing_edges ]
-			to_delete += child_uids
-
-			# removes edges associated with this resource
-			db.session.query(Edge).filter(Edge.start_uid == curr_uid or Edge.end_uid == curr_uid).delete()
+		# Removes resource with given uid, all descendants, and associated edges, in a few statements
+		store.delete_subtrees("uid = :uid", { "uid": uid })
 		db.session.commit()
 		return "Resource, descendants, and associated edges deleted"
 	else:
 		data = request.form.to_dict()
 
-		# make sure all dates are datetimes
-		if 'created_at' in data.keys() and not isinstance(data['created_at'], datetime.datetime):
-			data['created_at'] = parse(data['created_at'])
-
-		if request.method == 'POST': # add to db
-			try:
-				r1 = Resource(**data)
-				db.session.add(r1)
-				db.session.commit()
-			except sqlalchemy.exc.IntegrityError: # unique uid already in db
-				requests.put('http://127.0.0.1:5000/resource/{}'.format(uid), data=data) # redirect as put request with same data
+		if request.method == 'POST': # add to db, or update the resource if its uid is already in the db
+			store.upsert_resources([ dict(data, uid=uid) ])
+			db.session.commit()
 			return "Resource saved"
 
 		if request.method == 'PUT': # update db
-			db.session.query(Resource).filter(Resource.uid == uid).update(data)
+			# make sure all dates are datetimes
+			if 'created_at' in data.keys():
+				data['created_at'] = parse(data['created_at'])
+			store.update_resource(uid, data)
 			db.session.commit()
 			return "Resource updated"
 
@@ -233,19 +271,37 @@ def get_table_by_resource(mode, uid):
 	Get the table and relevant info for navigating INTO a resource (aka the table lists resource's children)
 	:param mode: 'app' or 'cluster'
 	:param uid: skipper uid of resource
-	:return: json response including path_names (List[str], list of names of resources in the path),
+	:return: json response of table_by_resource()
+	"""
+	return jsonify(**table_by_resource(mode, uid))
+
+def table_by_resource(mode: str, uid: str) -> Dict:
+	"""
+	Lists the children of a resource, lazy loading them if they aren't in the db yet.
+	:param (str) mode: 'app' or 'cluster'
+	:param (str) uid: skipper uid of resource
+	:return: (Dict) including path_names (List[str], list of names of resources in the path),
 									path_rtypes (List[str], list of rtypes of resources in the path),
 									path_uids (List[str], list of skipper uids of resources in the path),
 									table_items (List[Dict], list of dictionaries for resources to be displayed),
 									index (int, row to be selected),
-									has_children (List[bool]), whether each resource in table has children)
+									has_children (List[bool]), whether each resource in table has children),
+									refreshed_at (float, unix time the children were last listed, null if unknown),
+									refresh_pending (bool, whether the crawler is yet to refresh them ahead of its schedule)
 	"""
 
 	resource = db.session.query(Resource).filter_by(uid=uid).first()
 	outgoing_edges = db.session.query(Edge).filter_by(start_uid=uid).all()
 
-	if len(outgoing_edges) == 0:
+	if len(outgoing_edges) > 0:
+		# the children come from the crawler's last pass over them, so ask it for a fresh one
+		cluster = refresh_cluster(resource)
+		refresh_queue.request(resource.uid, resource.rtype, cluster)
+		refreshed_at = refresh_queue.refreshed_at(resource.rtype, cluster)
+	else:
+		refreshed_at = time.time()
 		children = []
+		resources, edges = [], []
 		# lazy load depending on current resource type
 		if resource.rtype == 'Cluster':
 			namespaces = cmb.cluster_namespaces(resource.cluster)
@@ -257,9 +313,8 @@ def get_table_by_resource(mode, uid):
 				resource_data = {"uid": ns_uid, "created_at": created_at, "rtype": "Namespace",
 								 "name": ns_name, "cluster": cname, "namespace": ns_name,
 								 "cluster_path": "/root/{}/".format(cname), "info": to_json(ns)}
-				edge_data = {'start_uid': cname, 'end_uid': ns_uid, 'relation': "Cluster<-Namespace"}
-				requests.post('http://127.0.0.1:5000/resource/{}'.format(ns_uid), data=resource_data)
-				requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(cname, ns_uid), data=edge_data)
+				resources.append(resource_data)
+				edges.append({'start_uid': cname, 'end_uid': ns_uid, 'relation': "Cluster<-Namespace"})
 
 		# for all other resources, storing(child, child_type) into the children list
 		elif resource.rtype == 'Namespace':
@@ -270,17 +325,28 @@ def get_table_by_resource(mode, uid):
 		elif resource.rtype == 'Application':
 			children.extend([(res, "Deployable") for res in amb.application_deployables(resource.cluster, resource.namespace, resource.name)])
 		elif resource.rtype == 'Deployable':
-			deployer_dict = amb.deployable_resource(resource.cluster, resource.namespace, resource.name)
-			if deployer_dict != {}:
-				children.extend([(deployer_dict, deployer_dict["kind"])])
-		elif resource.rtype == 'Deployment':
-			children.extend([(res, "Pod") for res in cmb.deployment_pods(resource.name, resource.namespace, resource.cluster)])
+			# the deployer is in the db once its cluster was crawled, the api is only asked for it until then
+			key = deployer_key(json.loads(resource.info)) if resource.info else None
+			deployer_uids = deployer_indexes()[1].lookup(*key)[:1] if key is not None else []
+			for deployer_uid in deployer_uids:
+				if resource.app_path != None:
+					store.update_resource(deployer_uid, {'app_path': resource.app_path + resource.uid + "/"})
+				edges.append({'start_uid': resource.uid, 'end_uid': deployer_uid, 'relation': "Deployable<-" + key[0]})
+			if key is not None and len(deployer_uids) == 0:
+				deployer_dict = amb.deployable_resource(resource.cluster, resource.namespace, resource.name)
+				if deployer_dict != {}:
+					children.extend([(deployer_dict, deployer_dict["kind"])])
+		elif resource.rtype in ['Deployment', 'StatefulSet', 'DaemonSet']:
+			# pods are found through their owner references, using the k8s uid at the end of the skipper uid
+			owner_uid = resource.uid.split("_")[-1]
+			children.extend([(res, "Pod") for res in cmb.owned_pods(owner_uid, resource.namespace, resource.cluster)])
 		elif resource.rtype == 'Service':
 			children.extend([(res, "Pod") for res in cmb.service_pods(resource.name, resource.namespace, resource.cluster)])
-		elif resource.rtype == 'StatefulSet':
-			children.extend([(res, "Pod") for res in cmb.stateful_set_pods(resource.name, resource.namespace, resource.cluster)])
-		elif resource.rtype == 'DaemonSet':
-			children.extend([(res, "Pod") for res in cmb.daemon_set_pods(resource.name, resource.namespace, resource.cluster)])
+
+		# the application of the children, looked up once for all of them
+		if resource.app_path != None and len(children) > 0:
+			app_uid = resource.app_path.split("/")[2]
+			app_name = db.session.query(Resource.name).filter(Resource.uid == app_uid).scalar()
 
 		# loop through children and add to db
 		for child, rtype in children:
@@ -293,26 +359,25 @@ def get_table_by_resource(mode, uid):
 			# build dict
 			resource_data = {'uid': skipper_uid, "created_at": created_at, \
 							 "rtype": rtype, "name" : child_obj["metadata"]["name"], \
-							 "cluster" : cluster, "namespace" : namespace, "info": json.dumps(child_obj, default=str)}
+							 "cluster" : cluster, "namespace" : namespace, "info": to_json(child)}
 
 			# fill in sev_measure and sev_reason fields if we are looking at a pod
 			if rtype == "Pod":
-				sm, sr = eb.pod_state(child)
+				sm, sr = eb.pod_state(to_raw(child))
 				resource_data["sev_measure"] = sm
 				resource_data["sev_reason"] = sr
 
 			# update paths
 			if resource.app_path != None:
 				resource_data['app_path'] = resource.app_path + resource.uid + "/"
-				app_uid = resource.app_path.split("/")[2]
-				resource_data["application"] = requests.get('http://127.0.0.1:5000/resource/{}'.format(app_uid)).json()['data']['name']
+				resource_data["application"] = app_name
 
 			if resource.cluster_path != None:
 				resource_data['cluster_path'] = resource.cluster_path + resource.uid + "/"
 
-			requests.post('http://127.0.0.1:5000/resource/{}'.format(skipper_uid), data=resource_data)
-			edge_data = {'start_uid': resource.uid, 'end_uid': skipper_uid, 'relation': resource.rtype + "<-" + rtype}
-			requests.post('http://127.0.0.1:5000/edge/{}/{}'.format(resource.uid, skipper_uid), data=edge_data)
+			resources.append(resource_data)
+			edges.append({'start_uid': resource.uid, 'end_uid': skipper_uid, 'relation': resource.rtype + "<-" + rtype})
+		store.save(resources, edges)
 
 	table_items = db.session.query(Resource).join(Edge, Resource.uid == Edge.end_uid).filter(Edge.start_uid == uid).all()
 
@@ -325,13 +390,12 @@ def get_table_by_resource(mode, uid):
 
 	# convert path using uids to breadcrumbs of resource names and types
 	path_uids = full_path.split("/")[2:-1]
-	path_names = []
-	path_rtypes = []
-	for res_uid in path_uids:
-		path_names.append(db.session.query(Resource.name).filter(Resource.uid == res_uid).first()[0])
-		path_rtypes.append(db.session.query(Resource.rtype).filter(Resource.uid == res_uid).first()[0])
+	path_info = store.names_and_rtypes(path_uids)
+	path_names = [ path_info[res_uid][0] for res_uid in path_uids ]
+	path_rtypes = [ path_info[res_uid][1] for res_uid in path_uids ]
 
-	return jsonify(path_names=path_names, path_rtypes=path_rtypes, path_uids=path_uids, table_items=[row_to_dict(t_item) for t_item in table_items], index=0, has_children=has_children(table_items))
+	return dict(path_names=path_names, path_rtypes=path_rtypes, path_uids=path_uids, table_items=[row_to_dict(t_item) for t_item in table_items], index=0, has_children=has_children(table_items),
+				refreshed_at=refreshed_at, refresh_pending=refresh_queue.is_pending(resource.uid))
 
 @app.route('/edge/<start_uid>/<end_uid>', methods=['POST', 'DELETE'])
 def edge(start_uid, end_uid):
@@ -343,11 +407,88 @@ def edge(start_uid, end_uid):
 	"""
 	data = request.form
 	if request.method == 'POST':
-		e1 = Edge(**data)
-		db.session.add(e1)
+		store.insert_edges([ dict(data.to_dict(), start_uid=start_uid, end_uid=end_uid) ])
 		db.session.commit()
 		return "Edge saved"
 
+@app.route('/bulk', methods=['POST'])
+def bulk():
+	"""
+	Add or update many resources and edges at once. Modifies database.
+	The body is either a json array or newline-delimited json (Content-Type: application/x-ndjson) of items
+	{"type": "resource", "edge", "delete", "touch", "touch_edges", "delete_edges", "sweep" or "sweep_edges", "data": {...}},
+	where data is what /resource/<uid> or /edge/<start_uid>/<end_uid> would take, {"uid": ...} for deletes,
+	{"uids": [...], "generation": ...} for touches, {"edges": [[start_uid, end_uid, relation], ...], "generation": ...} for
+	edge touches, {"edges": [[start_uid, end_uid, relation], ...]} for edge deletes, and the arguments of
+	store.sweep_resources() and store.sweep_edges() for sweeps. Chunks are applied in order, in one transaction per
+	BULK_CHUNK_SIZE items, and within a chunk resources and edges are applied first, then touches and edge deletes
+	(in the order they came, so an edge removed and added again stays), then deletes and sweeps.
+	:return: json response with the number of resources and edges written, resources and edges touched, and resources
+			and edges deleted
+	"""
+	if request.mimetype == 'application/x-ndjson':
+		items = [ json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip() ]
+	else:
+		items = request.get_json(force=True)
+
+	chunk_size = app.config['BULK_CHUNK_SIZE']
+	n_resources, n_edges, n_touched, n_edges_touched, n_deleted, n_edges_deleted = 0, 0, 0, 0, 0, 0
+	for i in range(0, len(items), chunk_size):
+		chunk = items[i:i + chunk_size]
+		with DB_WRITE_DURATION.time(op="resource"):
+			n_resources += store.upsert_resources([ item['data'] for item in chunk if item['type'] == 'resource' ])
+		with DB_WRITE_DURATION.time(op="edge"):
+			n_edges += store.insert_edges([ item['data'] for item in chunk if item['type'] == 'edge' ])
+		with DB_WRITE_DURATION.time(op="touch"):
+			for item in chunk:
+				if item['type'] == 'touch':
+					n_touched += store.touch_resources(item['data']['uids'], item['data']['generation'])
+				elif item['type'] == 'touch_edges':
+					n_edges_touched += store.touch_edges(item['data']['edges'], item['data']['generation'])
+				elif item['type'] == 'delete_edges':
+					n_edges_deleted += store.delete_edges(item['data']['edges'])
+		with DB_WRITE_DURATION.time(op="delete"):
+			n_deleted += store.delete_resources([ item['data']['uid'] for item in chunk if item['type'] == 'delete' ])
+		with DB_WRITE_DURATION.time(op="sweep"):
+			for item in chunk:
+				if item['type'] == 'sweep':
+					n_deleted += store.sweep_resources(**item['data'])
+				elif item['type'] == 'sweep_edges':
+					n_edges_deleted += store.sweep_edges(**item['data'])
+		with DB_WRITE_DURATION.time(op="commit"):
+			db.session.commit()
+
+	return jsonify(resources=n_resources, edges=n_edges, touched=n_touched, edges_touched=n_edges_touched,
+					deleted=n_deleted, edges_deleted=n_edges_deleted)
+
+@app.route('/refresh', methods=['POST'])
+def refresh():
+	"""
+	Used by the crawler: reports how fresh its data is, and takes the subtree refreshes users asked for by navigating
+	(see get_table_by_resource()), waiting up to ?wait= seconds for one when there is none.
+	Body: json {"freshness": {cluster name: {rtype: unix time subtrees of that rtype were last refreshed in the cluster}}}
+	:return: json response including requests (List[Dict], uid, rtype, cluster and requested_at of each subtree to refresh)
+	"""
+	data = request.get_json(silent=True) or {}
+	refresh_queue.report(data.get("freshness") or {})
+	return jsonify(requests=refresh_queue.take(float(request.args.get("wait", 0))))
+
+@app.route('/generation')
+def generation():
+	"""
+	Get the newest crawl generation any resource was marked with (see store.touch_resources()), null if the crawler hasn't
+	written to this db. The crawler checks it against its checkpoint before resuming from it.
+	"""
+	return jsonify(generation=newest_generation())
+
+@app.route('/metrics')
+def metrics_endpoint():
+	"""
+	Get the webserver's metrics (k8s api requests and db writes) in the Prometheus text format.
+	The crawler serves its own on SKIPPER_METRICS_PORT.
+	"""
+	return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/mode/app/switch/<uid>')
 def switch_app_mode(uid):
 	"""
@@ -383,18 +524,17 @@ def switch_app_mode(uid):
 		elif resource.rtype in ['Deployment', 'Service', 'DaemonSet', 'StatefulSet']:
 			resource_to_match = resource
 
-		# search for deployable that has same deployer_name as resource_to_match
+		# look up the deployable that deploys resource_to_match, by the deployer each deployable's spec names
 		if resource_to_match is not None:
-			dpbs = db.session.query(Resource).filter_by(rtype="Deployable").all()
-			for dpb in dpbs:
-				deployer_name = amb.deployable_resource_name(dpb.cluster, dpb.namespace, dpb.name)
-				if deployer_name == resource_to_match.name:
-					# if match, update the app paths of the resources
-					full_path = dpb.app_path + dpb.uid +  "/"
-					requests.put('http://127.0.0.1:5000/resource/{}'.format(resource_to_match.uid),data={'app_path': full_path})
-					if resource.rtype == 'Pod':
-						full_path += '{}/'.format(parent_uid)
-						requests.put('http://127.0.0.1:5000/resource/{}'.format(resource.uid), data={'app_path': full_path})
+			dpb_uids = deployer_indexes()[0].lookup(resource_to_match.rtype, resource_to_match.namespace, resource_to_match.name)[:1]
+			for dpb in db.session.query(Resource).filter(Resource.uid.in_(dpb_uids)).all():
+				# if match, update the app paths of the resources
+				full_path = dpb.app_path + dpb.uid +  "/"
+				store.update_resource(resource_to_match.uid, {'app_path': full_path})
+				if resource.rtype == 'Pod':
+					full_path += '{}/'.format(parent_uid)
+					store.update_resource(resource.uid, {'app_path': full_path})
+				db.session.commit()
 
 	if full_path == None or full_path.split("/")[-2] == 'root': # cannot switch from the current resource, go to top of hierarchy
 		table = db.session.query(Resource).filter(Resource.rtype == 'Application').all()
@@ -404,7 +544,7 @@ def switch_app_mode(uid):
 	# got the new path, now get the resource's siblings (aka the parent's children) and other data
 	parent = full_path.split("/")[-2]
 
-	data = requests.get('http://127.0.0.1:5000/mode/app/{}'.format(parent)).json()
+	data = table_by_resource('app', parent)
 	siblings = data['table_items']
 
 	# get index of resource within siblings
@@ -459,10 +599,11 @@ def switch_cluster_mode(uid):
 					# found in cluster mode, so update the app paths of the resources
 					ns_uid = resource_to_match.cluster + "_" + resource_to_match.namespace
 					full_path = "/root/{}/{}/".format(resource_to_match.cluster, ns_uid)
-					requests.put('http://127.0.0.1:5000/resource/{}'.format(resource_to_match.uid), data={'cluster_path': full_path})
+					store.update_resource(resource_to_match.uid, {'cluster_path': full_path})
 					if resource.rtype == 'Pod':
 						full_path += '{}/'.format(parent_uid)
-						requests.put('http://127.0.0.1:5000/resource/{}'.format(resource.uid), data={'cluster_path': full_path})
+						store.update_resource(resource.uid, {'cluster_path': full_path})
+					db.session.commit()
 
 	if full_path == None or full_path.split("/")[-2] == 'root': # cannot switch from the current resource, go to top of hierarchy
 		table = db.session.query(Resource).filter(Resource.rtype == 'Cluster').all()
@@ -471,7 +612,7 @@ def switch_cluster_mode(uid):
 
 	parent = full_path.split("/")[-2]
 
-	data = requests.get('http://127.0.0.1:5000/mode/cluster/{}'.format(parent)).json()
+	data = table_by_resource('cluster', parent)
 	siblings = data['table_items']
 
 	# get index of resource within siblings
@@ -498,20 +639,34 @@ def get_errors():
 	table_rows, pods = eb.get_unhealthy_pods()
 
 	# write anomalous pods the db
+	resources = []
 	for pod in pods:
-		pod_cluster = pod.metadata.cluster_name
-		pod_ns = pod.metadata.namespace
-		skipper_uid = pod_cluster + "_" + pod.metadata.uid
-		created_at = pod.metadata.creation_timestamp
+		md = pod["metadata"]
+		pod_cluster = md["cluster_name"]
+		pod_ns = md["namespace"]
+		skipper_uid = pod_cluster + "_" + md["uid"]
+		created_at = md.get("creationTimestamp")
 		# write pods to db
 		resource_data = {'uid': skipper_uid, "created_at": created_at, "rtype": 'Pod',
-						 "name": pod.metadata.name, "cluster": pod_cluster, "namespace": pod_ns,
-						 "sev_measure": 1, "sev_reason": pod.metadata.sev_reason, "info": to_json(pod)}
-		requests.post('http://127.0.0.1:5000/resource/{}'.format(skipper_uid), data=resource_data)
+						 "name": md["name"], "cluster": pod_cluster, "namespace": pod_ns,
+						 "sev_measure": 1, "sev_reason": md["sev_reason"], "info": to_json(pod)}
+		resources.append(resource_data)
+	store.save(resources, [])
 
 	anomalies = db.session.query(Resource).filter(Resource.sev_measure == 1).all()
 	return jsonify(table_items=[row_to_dict(a) for a in anomalies])
 
+def ilike(column, value: str):
+	"""
+	:param column: Resource column
+	:param (str) value: pattern to match, case-insensitively
+	:return: condition the same as column.ilike(value), but as an equality of lower() when the value has no wildcards,
+			so that the lower() indexes of the column can be used (see models.py)
+	"""
+	if "%" in value or "_" in value:
+		return column.ilike(value)
+	return sqlalchemy.func.lower(column) == sqlalchemy.func.lower(value)
+
 @app.route('/search/<query>')
 def search(query: str):
 	"""
@@ -531,13 +686,13 @@ def search(query: str):
 			field = query_part.split(':')[0].lower()
 			value = ":".join(query_part.split(':')[1:])
 			if field == 'app':
-				results = results.filter(Resource.application.ilike(value))
+				results = results.filter(ilike(Resource.application, value))
 			elif field == 'kind':
-				results = results.filter(Resource.rtype.ilike(value))
+				results = results.filter(ilike(Resource.rtype, value))
 			elif field == 'cluster':
-				results = results.filter(Resource.cluster.ilike(value))
+				results = results.filter(ilike(Resource.cluster, value))
 			elif field == 'ns':
-				results = results.filter(Resource.namespace.ilike(value))
+				results = results.filter(ilike(Resource.namespace, value))
 			else:
 				results = results.filter(Resource.name.ilike("%" + query_part + "%"))
 		else: # regular fuzzy search
@@ -0,0 +1,254 @@
+import datetime
+import sqlalchemy
+from typing import Dict, List, Tuple
+from dateutil.parser import parse
+from app import app, db
+from app.models import Resource, Edge
+
+# Reads and writes of the db shared by the routes, so that a request handler never has to call the webserver
+# over http to get something done. Write helpers only add to the session unless they say otherwise,
+# the caller commits (once per request, or per BULK_CHUNK_SIZE items in /bulk).
+
+# columns a resource can't be inserted without, rows lacking any of them can only update a resource
+REQUIRED_COLUMNS = ('uid', 'rtype', 'name', 'cluster')
+
+def upsert_statement(columns: Tuple[str, ...]):
+	"""
+	:param (Tuple[str, ...]) columns: resource columns the rows set, including the uid
+	:return: statement inserting a row with these columns, or updating them if the uid is already in the db when the row
+			has every REQUIRED_COLUMNS (INSERT ... ON CONFLICT needs them, sqlite checks NOT NULL before the conflict),
+			and only updating them otherwise
+	"""
+	table = Resource.__table__
+	columns = columns + ('last_updated',)
+	updates = ", ".join("{0} = excluded.{0}".format(column) for column in columns if column != 'uid')
+	if all(column in columns for column in REQUIRED_COLUMNS):
+		sql = "INSERT INTO resource ({}) VALUES ({}) ON CONFLICT (uid) DO UPDATE SET {}".format(
+				", ".join(columns), ", ".join(":" + column for column in columns), updates)
+	else:
+		sql = "UPDATE resource SET {} WHERE uid = :uid".format(
+				", ".join("{0} = :{0}".format(column) for column in columns if column != 'uid'))
+	# typed parameters, so that dates are stored the way the orm stores them
+	return sqlalchemy.text(sql).bindparams(*[ sqlalchemy.bindparam(column, type_=table.c[column].type) for column in columns ])
+
+def upsert_resources(rows: List[Dict]) -> int:
+	"""
+	Inserts the given resources, updating the ones that are already in the db, with one INSERT ... ON CONFLICT DO UPDATE
+	executed for all rows that set the same columns. Does not commit.
+	Rows with the same uid are merged in order. Partial rows (e.g. just uid and app_path) for resources
+	that aren't in the db yet are dropped, same as they would be by POST /resource/<uid>.
+	:param (List[Dict]) rows: resource column values, each including the uid
+	:return: (int) number of resources added or updated
+	"""
+	merged = {}
+	for row in rows:
+		row = dict(row)
+		# make sure all dates are datetimes
+		if row.get('created_at') is not None and not isinstance(row['created_at'], datetime.datetime):
+			row['created_at'] = parse(row['created_at'])
+		merged.setdefault(row['uid'], {}).update(row)
+
+	now = datetime.datetime.utcnow()
+	by_columns = {}		# columns set : rows setting them
+	for row in merged.values():
+		# the NOT NULL columns can't be set to None anyway, leaving them out makes the row a partial one
+		row = { column: value for column, value in row.items() if value is not None or column not in REQUIRED_COLUMNS }
+		by_columns.setdefault(tuple(sorted(row)), []).append(dict(row, last_updated=now))
+	n_written = 0
+	for columns, group in by_columns.items():
+		n_written += db.session.execute(upsert_statement(columns), group).rowcount
+	return n_written
+
+def insert_edges(rows: List[Dict]) -> int:
+	"""
+	Inserts the given edges, skipping the ones already in the db (see the unique index on edges in models.py). Does not commit.
+	:param (List[Dict]) rows: edge column values (start_uid, end_uid, relation)
+	:return: (int) number of edges added
+	"""
+	if len(rows) == 0:
+		return 0
+	now = datetime.datetime.utcnow()
+	insert = sqlalchemy.text("INSERT INTO edge (start_uid, end_uid, relation, last_updated) "
+								"VALUES (:start_uid, :end_uid, :relation, :last_updated) "
+								"ON CONFLICT (start_uid, end_uid, relation) DO NOTHING") \
+						.bindparams(sqlalchemy.bindparam('last_updated', type_=Edge.__table__.c.last_updated.type))
+	return db.session.execute(insert, [ { "start_uid": row["start_uid"], "end_uid": row["end_uid"], "relation": row["relation"],
+											"last_updated": now } for row in rows ]).rowcount
+
+def delete_resources(uids: List[str]) -> int:
+	"""
+	Removes the given resources and every edge that starts or ends at them from the session. Does not commit.
+	Unlike DELETE /resource/<uid>, descendants are left alone.
+	:param (List[str]) uids: skipper uids of the resources
+	:return: (int) number of resources removed
+	"""
+	if len(uids) == 0:
+		return 0
+	n_deleted = db.session.query(Resource).filter(Resource.uid.in_(uids)).delete(synchronize_session=False)
+	db.session.query(Edge).filter(Edge.start_uid.in_(uids)).delete(synchronize_session=False)
+	db.session.query(Edge).filter(Edge.end_uid.in_(uids)).delete(synchronize_session=False)
+	return n_deleted
+
+def delete_edges(edges: List[List[str]]) -> int:
+	"""
+	Removes the given edges. The resources at either end are left alone. Does not commit.
+	:param (List[List[str]]) edges: (start_uid, end_uid, relation) of each edge
+	:return: (int) number of edges removed
+	"""
+	if len(edges) == 0:
+		return 0
+	delete = sqlalchemy.text("DELETE FROM edge WHERE start_uid = :start_uid AND end_uid = :end_uid AND relation = :relation")
+	return db.session.execute(delete, [ { "start_uid": start_uid, "end_uid": end_uid, "relation": relation }
+										for start_uid, end_uid, relation in edges ]).rowcount
+
+def touch_resources(uids: List[str], generation: int) -> int:
+	"""
+	Marks the given resources as seen in a crawl generation, so sweep_resources() keeps them. Does not commit.
+	:param (List[str]) uids: skipper uids of the resources
+	:param (int) generation: crawl generation
+	:return: (int) number of resources marked
+	"""
+	n_touched = 0
+	chunk_size = app.config['BULK_CHUNK_SIZE']
+	for i in range(0, len(uids), chunk_size):
+		n_touched += db.session.query(Resource).filter(Resource.uid.in_(uids[i:i + chunk_size])) \
+						.update({Resource.generation: generation}, synchronize_session=False)
+	return n_touched
+
+def touch_edges(edges: List[List[str]], generation: int) -> int:
+	"""
+	Marks the given edges as seen in a crawl generation, so sweep_edges() keeps them, inserting the ones that aren't
+	in the db (e.g. swept while the crawler couldn't see them). Does not commit.
+	:param (List[List[str]]) edges: (start_uid, end_uid, relation) of each edge
+	:param (int) generation: crawl generation
+	:return: (int) number of edges marked or added
+	"""
+	if len(edges) == 0:
+		return 0
+	now = datetime.datetime.utcnow()
+	touch = sqlalchemy.text("INSERT INTO edge (start_uid, end_uid, relation, generation, last_updated) "
+								"VALUES (:start_uid, :end_uid, :relation, :generation, :last_updated) "
+								"ON CONFLICT (start_uid, end_uid, relation) DO UPDATE SET generation = excluded.generation") \
+						.bindparams(sqlalchemy.bindparam('last_updated', type_=Edge.__table__.c.last_updated.type))
+	return db.session.execute(touch, [ { "start_uid": start_uid, "end_uid": end_uid, "relation": relation,
+											"generation": generation, "last_updated": now }
+										for start_uid, end_uid, relation in edges ]).rowcount
+
+def sweep_edges(generation: int, relations: List[str], clusters: List[str] = None) -> int:
+	"""
+	Removes the edges of the given relations that weren't seen in a crawl generation (see touch_edges()),
+	e.g. from a service to a pod it doesn't select anymore. The resources at either end are left alone. Does not commit.
+	:param (int) generation: crawl generation
+	:param (List[str]) relations: relations to sweep, e.g. "Namespace<-Deployment"
+	:param (List[str]) clusters: only sweep edges to resources in these clusters, defaults to all clusters
+	:return: (int) number of edges removed
+	"""
+	where = "relation IN :relations AND generation IS NOT :generation"
+	params = { "relations": relations, "generation": generation }
+	expanding = [ "relations" ]
+	if clusters is not None:
+		if len(clusters) == 0:
+			return 0
+		where += " AND end_uid IN (SELECT uid FROM resource WHERE cluster IN :clusters)"
+		params["clusters"] = clusters
+		expanding.append("clusters")
+	sweep = sqlalchemy.text("DELETE FROM edge WHERE " + where) \
+						.bindparams(*[ sqlalchemy.bindparam(name, expanding=True) for name in expanding ])
+	return db.session.execute(sweep, params).rowcount
+
+# edges from a deployable to the resource it deploys. That resource (and what is under it) belongs to cluster mode, where
+# cluster crawls and watches write and remove it, so subtrees are never followed through these edges
+DEPLOYED_RELATIONS = "Deployable<-%"
+
+def delete_subtrees(roots: str, params: Dict, keep_generation: int = None) -> int:
+	"""
+	Removes the given resources, their descendants, and every edge that starts or ends at them from the session,
+	using a recursive query over the edges instead of loading rows. Does not commit.
+	Descendants are not followed past a deployable (see DEPLOYED_RELATIONS): only the edges to what it deploys go.
+	:param (str) roots: sql condition on the resource table selecting the resources to remove
+	:param (Dict) params: values of the condition's parameters; lists are expanded for IN clauses
+	:param (int) keep_generation: if given, descendants seen in this crawl generation are kept (only their edges to removed parents go)
+	:return: (int) number of resources removed
+	"""
+	keep = "WHERE resource.generation IS NOT :keep_generation" if keep_generation is not None else ""
+	select_doomed = sqlalchemy.text("""
+		INSERT OR IGNORE INTO doomed (uid)
+		WITH RECURSIVE tree(uid) AS (
+			SELECT uid FROM resource WHERE {}
+			UNION
+			SELECT edge.end_uid FROM edge
+				JOIN tree ON edge.start_uid = tree.uid AND edge.relation NOT LIKE :deployed_relations
+				JOIN resource ON resource.uid = edge.end_uid {}
+		)
+		SELECT uid FROM tree""".format(roots, keep))
+	select_doomed = select_doomed.bindparams(*[ sqlalchemy.bindparam(name, expanding=True)
+												for name, value in params.items() if isinstance(value, list) ])
+	params = dict(params, deployed_relations=DEPLOYED_RELATIONS)
+	if keep_generation is not None:
+		params["keep_generation"] = keep_generation
+
+	# collect the uids in a temporary table, since the edges they are found through get deleted too
+	db.session.execute("CREATE TEMP TABLE IF NOT EXISTS doomed (uid VARCHAR PRIMARY KEY)")
+	db.session.execute("DELETE FROM doomed")
+	db.session.execute(select_doomed, params)
+	db.session.execute("DELETE FROM edge WHERE start_uid IN (SELECT uid FROM doomed) OR end_uid IN (SELECT uid FROM doomed)")
+	n_deleted = db.session.execute("DELETE FROM resource WHERE uid IN (SELECT uid FROM doomed)").rowcount
+	db.session.execute("DELETE FROM doomed")
+	return n_deleted
+
+def sweep_resources(generation: int, rtypes: List[str], clusters: List[str] = None, except_clusters: List[str] = None) -> int:
+	"""
+	Removes the resources of the given rtypes that weren't seen in a crawl generation (see touch_resources()),
+	along with their descendants that weren't seen either, and every edge touching them. Does not commit.
+	:param (int) generation: crawl generation
+	:param (List[str]) rtypes: rtypes to sweep
+	:param (List[str]) clusters: only sweep resources in these clusters, defaults to all clusters
+	:param (List[str]) except_clusters: don't sweep resources in these clusters
+	:return: (int) number of resources removed
+	"""
+	roots = "rtype IN :rtypes AND generation IS NOT :generation"
+	params = { "rtypes": rtypes, "generation": generation }
+	if clusters is not None:
+		if len(clusters) == 0:
+			return 0
+		roots += " AND cluster IN :clusters"
+		params["clusters"] = clusters
+	if except_clusters:
+		roots += " AND cluster NOT IN :except_clusters"
+		params["except_clusters"] = except_clusters
+	return delete_subtrees(roots, params, keep_generation=generation)
+
+def save(resources: List[Dict], edges: List[Dict]) -> None:
+	"""
+	Writes resources and edges found by a lazy load, in one transaction per BULK_CHUNK_SIZE rows. Commits.
+	None values are left out, so they don't clear what the db already knows about a resource.
+	:param (List[Dict]) resources: resource column values, each including the uid
+	:param (List[Dict]) edges: edge column values (start_uid, end_uid, relation)
+	"""
+	resources = [ { column: value for column, value in row.items() if value is not None } for row in resources ]
+	chunk_size = app.config['BULK_CHUNK_SIZE']
+	for i in range(0, max(len(resources), len(edges)), chunk_size):
+		upsert_resources(resources[i:i + chunk_size])
+		insert_edges(edges[i:i + chunk_size])
+		db.session.commit()
+
+def update_resource(uid: str, data: Dict) -> int:
+	"""
+	Updates columns of a resource. Does not commit.
+	:param (str) uid: skipper uid of the resource
+	:param (Dict) data: column : new value
+	:return: (int) number of resources updated, 0 if it isn't in the db
+	"""
+	return db.session.query(Resource).filter(Resource.uid == uid).update(data, synchronize_session=False)
+
+def names_and_rtypes(uids: List[str]) -> Dict[str, Tuple[str, str]]:
+	"""
+	:param (List[str]) uids: skipper uids of resources, e.g. the ones in a path
+	:return: (Dict[str, Tuple[str, str]]) skipper uid : (name, rtype), for the ones in the db
+	"""
+	found = {}
+	chunk_size = app.config['BULK_CHUNK_SIZE']
+	for i in range(0, len(uids), chunk_size):
+		for uid, name, rtype in db.session.query(Resource.uid, Resource.name, Resource.rtype).filter(Resource.uid.in_(uids[i:i + chunk_size])):
+			found[uid] = (name, rtype)
+	return found
@@ -4,4 +4,5 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config(object):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO=False	# set this to false if you don't want verbose SQL terminal output
\ No newline at end of file
+    SQLALCHEMY_ECHO=False	# set this to false if you don't want verbose SQL terminal output
+    BULK_CHUNK_SIZE = 500	# items applied per transaction by /bulk (keep under sqlite's 999 bound variable limit)
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""compact duplicate edges
+
+Revision ID: 5c45e1408c4b
+Revises: edb612603d16
+Create Date: 2026-10-18 17:12:08.402716
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5c45e1408c4b'
+down_revision = 'edb612603d16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # every crawl used to insert another copy of every edge. Every copy of an edge but the newest goes,
+    # which also lets the next revision make edges unique
+    op.execute("DELETE FROM edge WHERE id NOT IN (SELECT max(id) FROM edge GROUP BY start_uid, end_uid, relation)")
+
+
+def downgrade():
+    # the copies that were removed are gone for good, and nothing relies on them
+    pass
@@ -0,0 +1,28 @@
+"""make edges unique
+
+Revision ID: 79da50f0aee7
+Revises: 5c45e1408c4b
+Create Date: 2026-10-18 14:37:21.604818
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '79da50f0aee7'
+down_revision = '5c45e1408c4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # duplicate edges were compacted by the previous revision, so the unique index can be created.
+    # the unique index is what INSERT ... ON CONFLICT in store.insert_edges() goes by, and it serves the lookups
+    # by start_uid (and start_uid, end_uid) of the index it replaces
+    op.drop_index('ix_edge_start_uid_end_uid', table_name='edge')
+    op.create_index('ix_edge_start_uid_end_uid_relation', 'edge', ['start_uid', 'end_uid', 'relation'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_edge_start_uid_end_uid_relation', table_name='edge')
+    op.create_index('ix_edge_start_uid_end_uid', 'edge', ['start_uid', 'end_uid'], unique=False)
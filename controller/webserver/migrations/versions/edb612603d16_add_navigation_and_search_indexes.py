@@ -0,0 +1,41 @@
+"""add navigation and search indexes
+
+Revision ID: edb612603d16
+Revises: 2797314418aa
+Create Date: 2026-10-18 11:02:47.519364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'edb612603d16'
+down_revision = '2797314418aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # children of a resource, has_children() and the recursive walks of delete_subtrees() go by start_uid,
+    # deletes of a resource's edges by end_uid
+    op.create_index('ix_edge_start_uid_end_uid', 'edge', ['start_uid', 'end_uid'], unique=False)
+    op.create_index('ix_edge_end_uid', 'edge', ['end_uid'], unique=False)
+    # top level tables (rtype) and sweeps (rtype, cluster)
+    op.create_index('ix_resource_rtype_cluster', 'resource', ['rtype', 'cluster'], unique=False)
+    # /errors and the order of /search results
+    op.create_index('ix_resource_sev_measure', 'resource', ['sev_measure'], unique=False)
+    # /search's cluster:, ns: and app: filters, which compare case-insensitively
+    op.create_index('ix_resource_lower_cluster_namespace', 'resource', [sa.text('lower(cluster)'), sa.text('lower(namespace)')], unique=False)
+    op.create_index('ix_resource_lower_namespace', 'resource', [sa.text('lower(namespace)')], unique=False)
+    op.create_index('ix_resource_lower_application', 'resource', [sa.text('lower(application)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_resource_lower_application', table_name='resource')
+    op.drop_index('ix_resource_lower_namespace', table_name='resource')
+    op.drop_index('ix_resource_lower_cluster_namespace', table_name='resource')
+    op.drop_index('ix_resource_sev_measure', table_name='resource')
+    op.drop_index('ix_resource_rtype_cluster', table_name='resource')
+    op.drop_index('ix_edge_end_uid', table_name='edge')
+    op.drop_index('ix_edge_start_uid_end_uid', table_name='edge')
@@ -1,4 +1,4 @@
-import curses, requests, datetime, json, sys, math
+import curses, requests, datetime, json, sys, math, re
 from dateutil.parser import parse
 import tabulate
 tabulate.PRESERVE_WHITESPACE = True
@@ -260,20 +260,20 @@ def draw_work(resource_data):
 		labels = info["metadata"]["labels"] if info["metadata"].get("labels") else None
 		status = info["status"] if info.get("status") else {}
 		if (resource_data['rtype'] == 'Deployment'):
-			updated = str(status["updated_replicas"]) if status.get("updated_replicas") else "0"
-			available = str(status["available_replicas"]) if status.get("available_replicas") else "0"
-			ready = str(status["ready_replicas"]) if status.get("ready_replicas") else "0"
+			updated = str(info_field(status, "updatedReplicas")) if info_field(status, "updatedReplicas") else "0"
+			available = str(info_field(status, "availableReplicas")) if info_field(status, "availableReplicas") else "0"
+			ready = str(info_field(status, "readyReplicas")) if info_field(status, "readyReplicas") else "0"
 			reps = str(status["replicas"]) if status.get("replicas")  else "0"
 
 		elif (resource_data['rtype'] == 'DaemonSet'):
-			updated = str(status["updated_number_scheduled"]) if status.get("updated_number_scheduled") else "0"
-			available = str(status["number_available"]) if status.get("number_available")else "0"
-			ready = str(status["number_ready"]) if status.get("number_ready") else "0"
-			reps = str(status["desired_number_scheduled"]) if status.get("desired_number_scheduled")  else "0"
+			updated = str(info_field(status, "updatedNumberScheduled")) if info_field(status, "updatedNumberScheduled") else "0"
+			available = str(info_field(status, "numberAvailable")) if info_field(status, "numberAvailable")else "0"
+			ready = str(info_field(status, "numberReady")) if info_field(status, "numberReady") else "0"
+			reps = str(info_field(status, "desiredNumberScheduled")) if info_field(status, "desiredNumberScheduled")  else "0"
 
 		elif (resource_data['rtype'] == 'StatefulSet'):
 			reps = str(status["replicas"]) if status.get("replicas")  else "0"
-			ready = str(status["ready_replicas"]) if status.get("ready_replicas")  else "0"
+			ready = str(info_field(status, "readyReplicas")) if info_field(status, "readyReplicas")  else "0"
 
 	ready_reps = ready + '/' + reps
 	lfields = ["Cluster: " + resource_data["cluster"], "Namespace: " + resource_data["namespace"], "UID: " + resource_data["uid"]]
@@ -363,7 +363,7 @@ def draw_pod(resource_data):
 		info = json.loads(resource_data["info"])
 		if info.get("metadata") is not None:
 			labels = info["metadata"]["labels"] if info["metadata"].get("labels") else None
-			owner_refs = info["metadata"]["owner_references"][0] if info["metadata"].get("owner_references") else None
+			owner_refs = info_field(info["metadata"], "ownerReferences")[0] if info_field(info["metadata"], "ownerReferences") else None
 
 	status = resource_data['sev_reason']
 	lfields = ["Cluster: " + resource_data["cluster"], "Namespace: " + resource_data["namespace"], "UID: " + resource_data["uid"], "PodIP: " + pod_ip, "Node/HostIP: " + host_ip]
@@ -421,15 +421,15 @@ def parse_pod_status(pod_dict):
 		info = json.loads(pod_dict["info"])
 		if info.get("status") is not None:
 			status = info.get("status")
-			host_ip = status["host_ip"] if status.get("host_ip") else "None"
-			pod_ip = status["pod_ip"] if status.get("pod_ip") else "None"
-			container_statuses = status.get("container_statuses")
+			host_ip = info_field(status, "hostIP") if info_field(status, "hostIP") else "None"
+			pod_ip = info_field(status, "podIP") if info_field(status, "podIP") else "None"
+			container_statuses = info_field(status, "containerStatuses")
 			if container_statuses is not None:
 				ready, restarts = 0, 0
 				container_count = len(container_statuses)
 				for c in container_statuses:
 					ready += c["ready"]
-					restarts += c["restart_count"]
+					restarts += info_field(c, "restartCount")
 				ready = str(ready)
 				restarts = str(restarts)
 				container_count = str(container_count)
@@ -469,6 +469,18 @@ def draw_cluster(resource_data):
 			lefty = draw_str(win, lefty, INDENT_AMT, line, width-2*INDENT_AMT)+1
 	return max(lefty, righty)
 
+def info_field(d, key):
+	"""
+	Reads a field of a resource's info. Rows written before the crawler stored objects the way the api serves them
+	hold to_dict() of the client models instead, whose keys are snake_case, so those are read too
+	:param (Dict) d: part of the info, e.g. info["status"]
+	:param (str) key: camelCase key, as the api serves it
+	:return: value under the key, or under its snake_case spelling, None if there is neither
+	"""
+	if d.get(key) is not None:
+		return d[key]
+	return d.get(re.sub("([a-z])([A-Z])", r"\1_\2", key).lower())
+
 def calc_age(time):
 	"""
 	Turns datetime or timedelta object into an age string
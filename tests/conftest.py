@@ -0,0 +1,59 @@
+import os, sys, tempfile
+import pytest
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CONTROLLER = os.path.join(ROOT, 'controller')
+WEBSERVER = os.path.join(ROOT, 'controller', 'webserver')
+BACKEND = os.path.join(ROOT, 'backend')
+
+def write_kubeconfig(path: str) -> str:
+	"""
+	Writes a kube-config with one cluster, which refuses connections so that nothing waits on it.
+	:param (str) path: file to write
+	:return: (str) path
+	"""
+	with open(path, "w") as f:
+		yaml.dump({ "apiVersion": "v1", "kind": "Config", "preferences": {},
+					"clusters": [ { "name": "down", "cluster": { "server": "http://127.0.0.1:1" } } ],
+					"users": [ { "name": "user", "user": { "token": "token" } } ],
+					"contexts": [ { "name": "down", "context": { "cluster": "down", "user": "user" } } ],
+					"current-context": "down" }, f)
+	return path
+
+def pytest_configure(config):
+	# the kubernetes client reads KUBECONFIG when it is imported, so it has to be set before any test imports it
+	os.environ["KUBECONFIG"] = write_kubeconfig(os.path.join(tempfile.mkdtemp(), "kubeconfig"))
+
+@pytest.fixture(scope="session")
+def webserver(tmp_path_factory):
+	"""
+	The webserver app, on a db of its own (migrated to the latest revision), imported the way flask run imports it.
+	"""
+	for module in ("flask_sqlalchemy", "flask_migrate", "kubernetes", "dateutil"):
+		pytest.importorskip(module)
+	sys.path.insert(0, WEBSERVER)
+	sys.path.insert(0, BACKEND)
+	from config import Config
+	Config.SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(tmp_path_factory.mktemp("db") / "test.db")
+	# the webserver finds the backend relative to its own directory
+	cwd = os.getcwd()
+	os.chdir(WEBSERVER)
+	try:
+		from app import app
+	finally:
+		os.chdir(cwd)
+	return app
+
+@pytest.fixture
+def db(webserver):
+	"""
+	The webserver's db, emptied after the test.
+	"""
+	from app import db
+	with webserver.app_context():
+		yield db
+		db.session.rollback()
+		db.session.execute("DELETE FROM edge")
+		db.session.execute("DELETE FROM resource")
+		db.session.commit()
@@ -0,0 +1,17 @@
+import os, subprocess, sys
+import pytest
+from conftest import ROOT, write_kubeconfig
+
+# The crawler is started as ./skipper starts it (python3 ./controller/crawler.py), so only controller/ is on sys.path
+# when it is imported, and it has to find backend/ on its own.
+
+def test_crawler_imports_like_the_launcher(tmp_path):
+	for module in ("kubernetes", "dateutil", "requests"):
+		pytest.importorskip(module)
+
+	env = { key: value for key, value in os.environ.items() if key != "PYTHONPATH" }
+	env["KUBECONFIG"] = write_kubeconfig(str(tmp_path / "kubeconfig"))
+
+	result = subprocess.run([ sys.executable, "-c", "import sys; sys.path[0] = 'controller'; import crawler" ],
+							cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=120)
+	assert result.returncode == 0, result.stdout.decode()
@@ -0,0 +1,51 @@
+import sys, threading, time
+import pytest
+from conftest import CONTROLLER
+
+# rounds of crawls in crawler.py (load_all()), with crawl_cluster() replaced by one that runs until it is let go
+
+@pytest.fixture
+def crawler(monkeypatch):
+	for module in ("kubernetes", "dateutil", "requests"):
+		pytest.importorskip(module)
+	sys.path.insert(0, CONTROLLER)
+	import crawler
+	release = threading.Event()
+	def crawl_cluster(writer, generation, cname, due):
+		release.wait()
+		return { "anomalous": False }
+	monkeypatch.setattr(crawler, "crawl_cluster", crawl_cluster)
+	monkeypatch.setattr(crawler, "record_crawl", lambda cname, due, found=None, error=None: error is None)
+	yield crawler, release
+	release.set()
+
+def test_timed_out_crawls_are_not_started_again_while_running(crawler):
+	crawler, release = crawler
+	due = { "c": [ "pods" ] }
+
+	futures = crawler.start_crawls(None, 1, due)
+	assert crawler.collect_crawls(futures, due, 0) == []
+
+	# the next round finds the crawl of the first one still running, and leaves the cluster alone
+	assert crawler.start_crawls(None, 2, due) == {}
+	assert crawler.collect_crawls({}, due, 0) == []
+
+	release.set()
+	deadline = time.time() + 5
+	while "c" in crawler.running_crawls and time.time() < deadline:
+		time.sleep(0.01)
+	futures = crawler.start_crawls(None, 3, due)
+	assert crawler.collect_crawls(futures, due, 5) == [ "c" ]
+
+def test_checkpoints_are_saved_at_most_once_per_interval(crawler, monkeypatch, tmp_path):
+	crawler, _ = crawler
+	monkeypatch.setattr(crawler.CrawlerConfig, "CHECKPOINT_PATH", str(tmp_path / "crawler.checkpoint"))
+	monkeypatch.setattr(crawler.CrawlerConfig, "CHECKPOINT_INTERVAL", 60)
+	monkeypatch.setattr(crawler, "checkpoint_saved_at", 0.0)
+
+	assert crawler.checkpoint_due()
+	crawler.save_checkpoint(crawler.checkpoint_state(1))
+	assert not crawler.checkpoint_due()
+
+	monkeypatch.setattr(crawler, "checkpoint_saved_at", time.time() - 61)
+	assert crawler.checkpoint_due()
@@ -0,0 +1,39 @@
+import sys
+import pytest
+from conftest import BACKEND
+
+# what backend/k8s_api.py labels api requests with
+
+@pytest.fixture
+def k8s_api():
+	pytest.importorskip("kubernetes")
+	sys.path.insert(0, BACKEND)
+	import k8s_api
+	return k8s_api
+
+def test_request_verb_kind(k8s_api):
+	assert k8s_api.request_verb_kind("GET", "https://c:6443/api/v1/namespaces/default/pods", []) == ("list", "pods")
+	assert k8s_api.request_verb_kind("GET", "https://c:6443/api/v1/pods", [ ("watch", True) ]) == ("watch", "pods")
+	assert k8s_api.request_verb_kind("GET", "https://c:6443/apis/apps/v1/namespaces/ns/deployments/d", []) == ("get", "deployments")
+	assert k8s_api.request_verb_kind("DELETE", "https://c:6443/api/v1/namespaces/ns", []) == ("delete", "namespaces")
+
+def test_request_verb_kind_behind_a_path_prefix(k8s_api):
+	url = "https://proxy/clusters/dev/apis/app.k8s.io/v1beta1/namespaces/ns/applications"
+	assert k8s_api.request_verb_kind("GET", url, [], "/clusters/dev") == ("list", "applications")
+	assert k8s_api.request_verb_kind("GET", url, [], "/clusters/dev/") == ("list", "applications")
+	assert k8s_api.request_verb_kind("GET", "https://proxy/clusters/dev/api/v1/pods", [], "/clusters/dev") == ("list", "pods")
+
+def test_instrumented_client_behind_a_path_prefix(k8s_api):
+	import kubernetes as k8s
+
+	configuration = k8s.client.Configuration()
+	configuration.host = "https://proxy/clusters/dev"
+	api_client = k8s.client.ApiClient(configuration)
+	class Response:
+		status = 200
+		data = b"{}"
+	api_client.request = lambda method, url, *args, **kwargs: Response()
+	k8s_api.instrument(api_client, "prefixed")
+
+	api_client.request("GET", configuration.host + "/apis/app.k8s.io/v1beta1/namespaces/ns/applications", query_params=[])
+	assert k8s_api.API_REQUESTS.values[("prefixed", "list", "applications", "200")] == 1
@@ -0,0 +1,49 @@
+import json
+from test_store import edges
+
+# the webserver's app mode lookups of what a Deployable deploys, against rows the crawler would have written
+
+def deployable(dpb_uid, kind, namespace, name):
+	"""
+	:return: (Dict) Deployable row deploying the given resource, under application "hub_app"
+	"""
+	info = { "spec": { "deployer": { "kind": kind, "kube": { "namespace": namespace, "template": { "metadata": { "name": name } } } } } }
+	return { "uid": dpb_uid, "rtype": "Deployable", "name": dpb_uid, "cluster": "hub", "app_path": "/root/hub_app/",
+			"info": json.dumps(info), "generation": 1 }
+
+def add_rows(db, rows):
+	from app import store
+	store.upsert_resources(rows)
+	db.session.commit()
+
+def test_switching_to_app_mode_finds_the_deployable(webserver, db):
+	from app.routes import deployer_cache
+	deployer_cache.clear()
+	add_rows(db, [ { "uid": "hub_app", "rtype": "Application", "name": "app", "cluster": "hub", "app_path": "/root/", "generation": 1 },
+					deployable("hub_dpb", "Deployment", "ns", "d"),
+					{ "uid": "c_d", "rtype": "Deployment", "name": "d", "cluster": "c", "namespace": "ns",
+						"cluster_path": "/root/c/c_ns/", "generation": 1 } ])
+
+	response = webserver.test_client().get("/mode/app/switch/c_d").get_json()
+	assert response["path_uids"] == [ "hub_app", "hub_dpb" ]
+
+	# a deployable of a newer crawl generation is found without restarting the webserver
+	add_rows(db, [ deployable("hub_dpb-2", "Service", "ns", "s"),
+					{ "uid": "c_s", "rtype": "Service", "name": "s", "cluster": "c", "namespace": "ns",
+						"cluster_path": "/root/c/c_ns/", "generation": 2 } ])
+	response = webserver.test_client().get("/mode/app/switch/c_s").get_json()
+	assert response["path_uids"] == [ "hub_app", "hub_dpb-2" ]
+
+def test_deployers_are_looked_up_in_the_db(webserver, db):
+	from app.models import Resource
+	from app.routes import deployer_cache
+	deployer_cache.clear()
+	add_rows(db, [ { "uid": "hub_app", "rtype": "Application", "name": "app", "cluster": "hub", "app_path": "/root/", "generation": 1 },
+					deployable("hub_dpb", "Deployment", "ns", "d"),
+					{ "uid": "c_d", "rtype": "Deployment", "name": "d", "cluster": "c", "namespace": "ns",
+						"cluster_path": "/root/c/c_ns/", "generation": 1 } ])
+
+	response = webserver.test_client().get("/mode/app/hub_dpb").get_json()
+	assert [ item["uid"] for item in response["table_items"] ] == [ "c_d" ]
+	assert ("hub_dpb", "c_d") in edges(db)
+	assert db.session.query(Resource.app_path).filter(Resource.uid == "c_d").scalar() == "/root/hub_app/hub_dpb/"
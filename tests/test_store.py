@@ -0,0 +1,49 @@
+# db helpers of the webserver (controller/webserver/app/store.py), on a db of their own
+
+def add(db, resources, edges, generation=None):
+	"""
+	Writes resources, given as (uid, rtype, cluster), and edges, given as (start_uid, end_uid, relation).
+	"""
+	from app import store
+	store.upsert_resources([ { "uid": uid, "rtype": rtype, "name": uid, "cluster": cluster, "generation": generation }
+								for uid, rtype, cluster in resources ])
+	store.insert_edges([ { "start_uid": start, "end_uid": end, "relation": relation } for start, end, relation in edges ])
+	db.session.commit()
+
+def uids(db):
+	from app.models import Resource
+	return { uid for (uid,) in db.session.query(Resource.uid) }
+
+def edges(db):
+	from app.models import Edge
+	return { (start, end) for start, end in db.session.query(Edge.start_uid, Edge.end_uid) }
+
+def test_sweeping_a_deployable_leaves_what_it_deploys(db):
+	from app import store
+	# the deployment and its pods were written by a cluster crawl of an earlier round, or a watch, and are still there
+	add(db, [ ("c", "Cluster", "c"), ("c_ns", "Namespace", "c"), ("c_deploy", "Deployment", "c"),
+				("c_pod-1", "Pod", "c"), ("c_pod-2", "Pod", "c") ],
+			[ ("c", "c_ns", "Cluster<-Namespace"), ("c_ns", "c_deploy", "Namespace<-Deployment"),
+				("c_deploy", "c_pod-1", "Deployment<-Pod"), ("c_deploy", "c_pod-2", "Deployment<-Pod") ], generation=1)
+	# the deployable that deployed it is gone this round
+	add(db, [ ("hub_app", "Application", "hub"), ("hub_dpb", "Deployable", "hub") ],
+			[ ("hub_app", "hub_dpb", "Application<-Deployable"), ("hub_dpb", "c_deploy", "Deployable<-Deployment") ], generation=1)
+	add(db, [ ("hub_app", "Application", "hub") ], [], generation=2)
+
+	assert store.sweep_resources(2, [ "Deployable" ]) == 1
+	db.session.commit()
+
+	assert uids(db) == { "c", "c_ns", "c_deploy", "c_pod-1", "c_pod-2", "hub_app" }
+	assert edges(db) == { ("c", "c_ns"), ("c_ns", "c_deploy"), ("c_deploy", "c_pod-1"), ("c_deploy", "c_pod-2") }
+
+def test_sweeping_a_cluster_removes_what_is_in_it(db):
+	from app import store
+	add(db, [ ("c", "Cluster", "c"), ("c_ns", "Namespace", "c"), ("c_deploy", "Deployment", "c"), ("c_pod", "Pod", "c") ],
+			[ ("c", "c_ns", "Cluster<-Namespace"), ("c_ns", "c_deploy", "Namespace<-Deployment"),
+				("c_deploy", "c_pod", "Deployment<-Pod") ], generation=1)
+
+	assert store.sweep_resources(2, [ "Cluster" ]) == 4
+	db.session.commit()
+
+	assert uids(db) == set()
+	assert edges(db) == set()
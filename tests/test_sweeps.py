@@ -0,0 +1,92 @@
+import sys
+import pytest
+from conftest import CONTROLLER
+from test_store import add, uids
+
+# the end of a crawl round (crawler.sweep_round()), its writes going through the webserver's /bulk into a db of its own
+
+class FailedResponse:
+	status_code = 500
+
+@pytest.fixture
+def writer(webserver, db, monkeypatch):
+	"""
+	A BulkWriter posting to the webserver in-process, one item per chunk. Chunks whose body contains a string
+	added to writer.lose are answered with a 500 instead of being written.
+	"""
+	for module in ("kubernetes", "requests"):
+		pytest.importorskip(module)
+	sys.path.insert(0, CONTROLLER)
+	import bulk_writer
+
+	client = webserver.test_client()
+	writer = bulk_writer.BulkWriter("http://127.0.0.1:5000/bulk", 1)
+	writer.lose = []
+	def post(url, data, headers):
+		if any(lost in data for lost in writer.lose):
+			return FailedResponse()
+		return client.post("/bulk", data=data, content_type=headers["Content-Type"])
+	monkeypatch.setattr(bulk_writer.requests, "post", post)
+	return writer
+
+def test_nothing_is_swept_after_a_lost_chunk(writer, db):
+	import crawler
+	add(db, [ ("c", "Cluster", "c"), ("c_ns", "Namespace", "c"), ("c_pod", "Pod", "c") ],
+			[ ("c", "c_ns", "Cluster<-Namespace"), ("c_ns", "c_pod", "Namespace<-Pod") ], generation=1)
+
+	# the namespace and pod are seen again, but the chunk marking the pod doesn't make it
+	writer.lose.append("c_pod")
+	writer.touch_resources([ "c" ], 2)
+	writer.touch_resources([ "c_ns" ], 2)
+	writer.touch_resources([ "c_pod" ], 2)
+	crawler.sweep_round(writer, 2, [], [ "c" ])
+
+	assert uids(db) == { "c", "c_ns", "c_pod" }
+	assert writer.pop_failures() == 1
+
+def test_everything_unseen_is_swept_after_a_clean_round(writer, db):
+	import crawler
+	add(db, [ ("c", "Cluster", "c"), ("c_ns", "Namespace", "c"), ("c_pod", "Pod", "c") ],
+			[ ("c", "c_ns", "Cluster<-Namespace"), ("c_ns", "c_pod", "Namespace<-Pod") ], generation=1)
+
+	writer.touch_resources([ "c", "c_ns" ], 2)
+	crawler.sweep_round(writer, 2, [], [ "c" ])
+
+	assert uids(db) == { "c", "c_ns" }
+
+def test_applications_of_clusters_never_listed_are_kept(writer, db, monkeypatch):
+	import crawler
+	# c-1's applications are due, c-2's aren't and were never listed by this process (no checkpoint)
+	add(db, [ ("c-1", "Cluster", "c-1"), ("c-2", "Cluster", "c-2"), ("c-2_app", "Application", "c-2"),
+				("c-2_dpb", "Deployable", "c-2") ], [ ("c-2_app", "c-2_dpb", "Application<-Deployable") ], generation=1)
+	monkeypatch.setattr(crawler, "app_cache", {})
+	monkeypatch.setattr(crawler, "list_applications", lambda cluster_names: [ [] for _ in cluster_names ])
+
+	writer.touch_resources([ "c-1", "c-2" ], 2)
+	_, app_failures = crawler.load_apps(writer, 2, [ "c-1", "c-2" ], [ "c-1" ])
+	crawler.sweep_round(writer, 2, app_failures, [])
+
+	assert app_failures == [ "c-2" ]
+	assert uids(db) == { "c-1", "c-2", "c-2_app", "c-2_dpb" }
+
+def test_pods_no_workload_owns_are_kept_under_their_namespace(writer, db, monkeypatch):
+	import crawler
+	from test_store import edges
+	add(db, [ ("c", "Cluster", "c"), ("c_ns", "Namespace", "c"), ("c_svc", "Service", "c") ],
+			[ ("c", "c_ns", "Cluster<-Namespace"), ("c_ns", "c_svc", "Namespace<-Service") ], generation=2)
+	def pod(uid, labels=None, owner=None):
+		md = { "uid": uid, "name": uid, "namespace": "ns", "labels": labels }
+		if owner is not None:
+			md["ownerReferences"] = [ { "kind": owner[0], "uid": owner[1], "controller": True } ]
+		return { "metadata": md, "spec": {}, "status": {} }
+	# a bare pod, a pod of a job, a pod only a service selects, and a pod of a replicaset created after it was listed
+	page = [ pod("bare"), pod("job-pod", owner=("Job", "job")), pod("svc-pod", labels={ "app": "a" }), pod("new", owner=("ReplicaSet", "rs")) ]
+	monkeypatch.setitem(crawler.LISTERS, "pods", lambda cname, page_size, raw: [ page ])
+	listed = { "rsets": [], "svcs": [ { "metadata": { "uid": "svc", "namespace": "ns" }, "spec": { "selector": { "app": "a" } } } ] }
+	crawler.tracker.clear()
+
+	crawler.write_pods(writer, 2, "c", listed, { "ns": "c_ns" }, set())
+	crawler.sweep_round(writer, 2, [], [ "c" ])
+
+	assert uids(db) == { "c", "c_ns", "c_svc", "c_bare", "c_job-pod", "c_svc-pod" }
+	assert { ("c_ns", "c_bare"), ("c_ns", "c_job-pod"), ("c_ns", "c_svc-pod"), ("c_svc", "c_svc-pod") } <= edges(db)
@@ -0,0 +1,99 @@
+import sys
+import pytest
+from conftest import CONTROLLER
+
+# ClusterWatcher (controller/watcher.py) fed events by hand, its writes going through the webserver's /bulk into a db of its own
+
+@pytest.fixture
+def watcher(webserver, db):
+	"""
+	A watcher of cluster "c" whose writer posts to the webserver's /bulk in-process.
+	"""
+	sys.path.insert(0, CONTROLLER)
+	from bulk_writer import BulkWriter
+	from watcher import ClusterWatcher
+
+	client = webserver.test_client()
+	class TestClientWriter(BulkWriter):
+		def send(self, body, counts):
+			assert client.post("/bulk", data=body, content_type="application/x-ndjson").status_code == 200
+
+	return ClusterWatcher("c", TestClientWriter(None, 1000), generation=7)
+
+def obj(uid, name=None, namespace="ns", labels=None, owner=None, selector=None):
+	"""
+	:return: k8s object as the api serves it, owned by owner, given as (kind, uid)
+	"""
+	md = { "uid": uid, "name": name or uid, "namespace": namespace, "labels": labels }
+	if owner is not None:
+		md["ownerReferences"] = [ { "kind": owner[0], "uid": owner[1], "controller": True } ]
+	return { "metadata": md, "spec": { "selector": selector }, "status": {} }
+
+def edges(db):
+	from app.models import Edge
+	return { (start[2:], end[2:], generation) for start, end, generation in db.session.query(Edge.start_uid, Edge.end_uid, Edge.generation) }
+
+def resources(db):
+	from app.models import Resource
+	return { uid[2:]: cluster_path for uid, cluster_path in db.session.query(Resource.uid, Resource.cluster_path) }
+
+def test_edges_follow_labels_and_selectors(watcher, db):
+	watcher.apply("Namespace", { "metadata": { "uid": "ns", "name": "ns" } })
+	watcher.apply("Deployment", obj("deploy"))
+	watcher.apply("Service", obj("svc", selector={ "app": "a" }))
+	watcher.apply("ReplicaSet", obj("rs", owner=("Deployment", "deploy")))
+	watcher.apply("Pod", obj("pod", labels={ "app": "a" }, owner=("ReplicaSet", "rs")))
+	watcher.writer.flush()
+	assert ("svc", "pod", 7) in edges(db)
+
+	# the pod's labels change, the service doesn't select it anymore
+	watcher.apply("Pod", obj("pod", labels={ "app": "b" }, owner=("ReplicaSet", "rs")))
+	watcher.writer.flush()
+	assert ("svc", "pod", 7) not in edges(db)
+
+	# the service's selector changes, it selects the pod again
+	watcher.apply("Service", obj("svc", selector={ "app": "b" }))
+	watcher.writer.flush()
+	assert ("svc", "pod", 7) in edges(db)
+	assert ("deploy", "pod", 7) in edges(db)
+
+def test_pods_without_known_owner(watcher, db):
+	watcher.apply("Namespace", { "metadata": { "uid": "ns", "name": "ns" } })
+	watcher.apply("Pod", obj("bare"))
+	# the replicaset (and its deployment) come after their pod
+	watcher.apply("Pod", obj("pod", owner=("ReplicaSet", "rs")))
+	watcher.writer.flush()
+	assert resources(db)["bare"] == "/root/c/c_ns/"
+	assert ("ns", "bare", 7) in edges(db)
+	assert "pod" not in resources(db)
+
+	watcher.apply("ReplicaSet", obj("rs", owner=("Deployment", "deploy")))
+	watcher.writer.flush()
+	assert "pod" not in resources(db)
+
+	watcher.apply("Deployment", obj("deploy"))
+	watcher.writer.flush()
+	assert resources(db)["pod"] == "/root/c/c_ns/c_deploy/"
+	assert ("deploy", "pod", 7) in edges(db)
+	assert watcher.waiting == {}
+
+def test_relist_pages_and_watches_from_the_last_page(watcher, db, monkeypatch):
+	import json
+	pages = { None: ([ obj("a") ], "2", "next"), "next": ([ obj("b") ], "3", None) }
+	calls = []
+	class Response:
+		def __init__(self, page):
+			items, resource_version, token = page
+			self.data = json.dumps({ "items": items, "metadata": { "resourceVersion": resource_version, "continue": token } })
+	def list_function(limit, _preload_content, _continue=None):
+		calls.append((limit, _continue))
+		return Response(pages[_continue])
+	monkeypatch.setattr(watcher, "list_function", lambda kind: list_function)
+
+	watcher.known["Deployment"].add("c_gone")
+	watcher.apply("Namespace", { "metadata": { "uid": "ns", "name": "ns" } })
+	assert watcher.relist("Deployment") == "3"
+	watcher.writer.flush()
+	assert len(calls) == 2 and calls[1][1] == "next"
+	assert watcher.known["Deployment"] == { "c_a", "c_b" }
+	assert watcher.checkpoint()["resource_versions"]["Deployment"] == "3"